@@ -0,0 +1,132 @@
+from concurrent.futures import ProcessPoolExecutor
+from Crypto.Cipher import AES
+from eth_account.hdaccount import seed_from_mnemonic
+from eth_account.hdaccount.deterministic import SoftNode, Node, derive_child_key, hmac_sha512
+from eth_keys import keys
+from eth_utils import keccak
+
+import collections
+import hashlib
+import json
+import os
+
+
+HDAccount = collections.namedtuple('HDAccount', ['index', 'address', 'key'])  # key: 32 raw bytes
+
+BASE_ACCOUNT_PATH = "m/44'/60'/0'/0"
+SECP256K1_N = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141
+
+PARALLEL_DERIVATION_THRESHOLD = 1000  # accounts, below that a process pool is not worth starting
+DERIVATION_CHUNK_SIZE = 250
+CACHE_KDF_ITERATIONS = 2 ** 17
+CACHE_PASSWORD_ENV = 'ACCOUNTS_CACHE_PASSWORD'
+
+
+def _derive_accounts(parent_key, parent_chain_code, indices):
+    # Non-hardened BIP32 children of the same parent share its public key, so it is computed once:
+    parent_public_key = keys.PrivateKey(parent_key).public_key.to_compressed_bytes()
+    parent_key_int = int.from_bytes(parent_key, 'big')
+    accounts = []
+    for index in indices:
+        child = hmac_sha512(parent_chain_code, parent_public_key + index.to_bytes(4, 'big'))
+        child_key_int = (int.from_bytes(child[:32], 'big') + parent_key_int) % SECP256K1_N
+        if int.from_bytes(child[:32], 'big') >= SECP256K1_N or child_key_int == 0:
+            # Invalid key (< 2**-127 probability), use the reference implementation:
+            (key, _) = derive_child_key(parent_key, parent_chain_code, SoftNode(index))
+        else:
+            key = child_key_int.to_bytes(32, 'big')
+        address = keys.PrivateKey(key).public_key.to_checksum_address()
+        accounts.append(HDAccount(index, address, key))
+    return accounts
+
+
+def _derive_accounts_chunk(job):
+    return _derive_accounts(*job)
+
+
+class AccountProvider:
+    def __init__(self, mnemonic, passphrase='', cache_dir='cache/accounts', password=None):
+        self.mnemonic = mnemonic.strip()
+        self.passphrase = passphrase
+        self.cache_dir = cache_dir
+        self.password = password or os.environ.get(CACHE_PASSWORD_ENV) or self.mnemonic
+        self._parent_node = None
+
+    def get_accounts(self, start, count, processes=None):
+        indices = list(range(start, start + count))
+        cached = self._load_cache() if self.cache_dir else {}
+        missing_indices = [index for index in indices if index not in cached]
+        if missing_indices:
+            derived = self._derive(missing_indices, processes)
+            cached.update({account.index: account for account in derived})
+            if self.cache_dir:
+                self._store_cache(cached)
+        return [cached[index] for index in indices]
+
+    def _get_parent_node(self):
+        # The expensive PBKDF2 seed stretch and the hardened part of the path are done only once:
+        if self._parent_node is None:
+            seed = seed_from_mnemonic(self.mnemonic, self.passphrase)
+            master_node = hmac_sha512(b"Bitcoin seed", seed)
+            (key, chain_code) = (master_node[:32], master_node[32:])
+            for node in BASE_ACCOUNT_PATH.split('/')[1:]:
+                (key, chain_code) = derive_child_key(key, chain_code, Node.decode(node))
+            self._parent_node = (key, chain_code)
+        return self._parent_node
+
+    def _derive(self, indices, processes):
+        (parent_key, parent_chain_code) = self._get_parent_node()
+        processes = processes or os.cpu_count() or 1
+        if len(indices) < PARALLEL_DERIVATION_THRESHOLD or processes <= 1:
+            return _derive_accounts(parent_key, parent_chain_code, indices)
+        chunks = [
+            (parent_key, parent_chain_code, indices[start:start + DERIVATION_CHUNK_SIZE])
+            for start in range(0, len(indices), DERIVATION_CHUNK_SIZE)
+        ]
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            return [account for accounts in executor.map(_derive_accounts_chunk, chunks) for account in accounts]
+
+    def _cache_path(self):
+        # Addressed by a hash of the mnemonic, so the cache never reveals which wallet it belongs to:
+        wallet_id = keccak(text=f"{self.mnemonic}|{self.passphrase}|{BASE_ACCOUNT_PATH}").hex()[:16]
+        return os.path.join(self.cache_dir, f"{wallet_id}.json")
+
+    def _cipher_key(self, salt):
+        return hashlib.pbkdf2_hmac('sha256', self.password.encode(), salt, CACHE_KDF_ITERATIONS)
+
+    def _load_cache(self):
+        path = self._cache_path()
+        if not os.path.exists(path):
+            return {}
+        try:
+            entries = json.loads(open(path, 'r').read())
+            cipher = AES.new(self._cipher_key(bytes.fromhex(entries['salt'])), AES.MODE_GCM, nonce=bytes.fromhex(entries['nonce']))
+            keys_blob = cipher.decrypt_and_verify(bytes.fromhex(entries['ciphertext']), bytes.fromhex(entries['tag']))
+        except (ValueError, KeyError):
+            # Corrupted cache or another password, accounts are derived again:
+            return {}
+        return {
+            index: HDAccount(index, address, keys_blob[32 * i:32 * (i + 1)])
+            for (i, (index, address)) in enumerate(zip(entries['indices'], entries['addresses']))
+        }
+
+    def _store_cache(self, accounts_by_index):
+        accounts = [accounts_by_index[index] for index in sorted(accounts_by_index)]
+        salt = os.urandom(16)
+        cipher = AES.new(self._cipher_key(salt), AES.MODE_GCM)
+        (ciphertext, tag) = cipher.encrypt_and_digest(b''.join(account.key for account in accounts))
+        entries = {
+            'indices': [account.index for account in accounts],
+            'addresses': [account.address for account in accounts],
+            'salt': salt.hex(),
+            'nonce': cipher.nonce.hex(),
+            'ciphertext': ciphertext.hex(),
+            'tag': tag.hex(),
+        }
+        path = self._cache_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(json.dumps(entries))
+        os.chmod(tmp_path, 0o600)
+        os.replace(tmp_path, path)
@@ -0,0 +1,117 @@
+from eth_account import Account
+from eth_keys.backends import get_backend
+from web3 import Web3
+
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import rlp
+import time
+
+from accounts import AccountProvider
+from blockchain import BlockchainData, ChainId
+from mock_node import MockNodeConfig, serve
+from signing import SignedTx, sign_nonces, sign_transactions
+from tps_test import SenderConfig, Trader, fetch_start_state, logger as tps_logger, request_to_json, run_traders_async
+from tx_slots import TxSlots
+
+
+BENCH_MNEMONIC = 'test test test test test test test test test test test junk'
+
+
+def report(name, count, elapsed_secs, unit):
+    print(f"{name:<48} {count:>8} {unit} in {elapsed_secs:7.3f}s | {count / elapsed_secs:>10.1f} {unit}/s")
+
+
+def synthetic_signed_txs(start_nonce, count):
+    # Well-formed legacy txs with random signatures, for a mock node that does not recover senders:
+    signed_txs = {}
+    for nonce in range(start_nonce, start_nonce + count):
+        raw_tx = rlp.encode([nonce, 10 ** 9, 250000, b'\x01' * 20, 0, b'\x00' * 228, 27, os.urandom(32), os.urandom(32)])
+        signed_txs[nonce] = SignedTx('0x' + raw_tx.hex(), Web3.keccak(raw_tx).hex())
+    return signed_txs
+
+
+def bench_signing(count):
+    account = Account.create()
+    txs = [{'value': 0, 'chainId': 324, 'gas': 250000, 'gasPrice': 10 ** 9, 'nonce': nonce, 'to': '0x' + '01' * 20, 'data': '0x' + '00' * 228} for nonce in range(count)]
+    # Without coincurve eth_keys signs in pure Python, sign_transactions is ~2x faster than Account.sign_transaction then:
+    backend = type(get_backend()).__name__
+    print(f"eth_keys backend: {backend}" + ('' if backend == 'CoinCurveECCBackend' else ' (pip install coincurve for libsecp256k1)'))
+    started_at = time.perf_counter()
+    expected = [Account.sign_transaction(tx, account.key) for tx in txs]
+    report('Account.sign_transaction', count, time.perf_counter() - started_at, 'txs')
+    started_at = time.perf_counter()
+    sign_transactions(account.key, txs)
+    report('sign_transactions', count, time.perf_counter() - started_at, 'txs')
+    started_at = time.perf_counter()
+    signed_txs = sign_nonces(account.key, txs[0], range(count))
+    report('sign_nonces (template)', count, time.perf_counter() - started_at, 'txs')
+    # The template encoder must produce exactly the same txs:
+    for (signed_tx, expected_tx) in zip(signed_txs, expected):
+        assert bytes.fromhex(signed_tx.raw_tx[2:]) == bytes(expected_tx.rawTransaction), f"template mismatch: {signed_tx.raw_tx}"
+
+
+def bench_derivation(count):
+    started_at = time.perf_counter()
+    AccountProvider(BENCH_MNEMONIC, cache_dir=None).get_accounts(0, count, processes=1)
+    report('AccountProvider.get_accounts (no cache)', count, time.perf_counter() - started_at, 'accounts')
+
+
+def bench_serialization(count):
+    raw_tx = synthetic_signed_txs(0, 1)[0].raw_tx
+    started_at = time.perf_counter()
+    for request_id in range(count):
+        json.dumps(request_to_json("eth_sendRawTransaction", [raw_tx], request_id=request_id))
+    report('eth_sendRawTransaction request serialization', count, time.perf_counter() - started_at, 'txs')
+
+
+def bench_sending(accounts_count, swaps_count, config):
+    # End-to-end send rate of the harness against the local mock node (acks are immediate):
+    accounts = [Account.create() for _ in range(accounts_count)]
+    (gas_price, nonce_by_address) = fetch_start_state(BlockchainData(ChainId.LOCAL_MOCK).ws_rpc_url(), [account.address for account in accounts])
+    traders = [Trader(ChainId.LOCAL_MOCK, account, nonce_by_address[account.address], gas_price, swap_txs_count=swaps_count) for account in accounts]
+    for trader in traders:
+        trader.slots = TxSlots.from_signed_txs(trader.nonce, synthetic_signed_txs(trader.nonce, swaps_count).values())
+    started_at = time.perf_counter()
+    asyncio.run(run_traders_async(traders, BlockchainData(ChainId.LOCAL_MOCK).ws_endpoints(), config))
+    elapsed_secs = time.perf_counter() - started_at
+    not_acked = sum(trader.slots.pending_count for trader in traders)
+    name = f"send+ack conns={config.connections_count} batch={config.batch_size} window={config.max_in_flight}"
+    report(name + (f" ({not_acked} not acked)" if not_acked else ''), accounts_count * swaps_count, elapsed_secs, 'txs')
+
+
+def run_mock_node():
+    config = MockNodeConfig(chain_id=ChainId.LOCAL_MOCK.value, block_time=1.0, mempool_capacity=10 ** 7, recover_senders=False)
+    asyncio.run(serve(config, '127.0.0.1', 8545))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--accounts', type=int, default=100)
+    parser.add_argument('--swaps', type=int, default=100, help='swaps per account')
+    parser.add_argument('--sign-count', type=int, default=500)
+    parser.add_argument('--derive-count', type=int, default=500)
+    args = parser.parse_args()
+    tps_logger.setLevel(logging.WARNING)
+    # 1. Client-side CPU costs:
+    bench_signing(args.sign_count)
+    bench_derivation(args.derive_count)
+    bench_serialization(100_000)
+    # 2. Max send rate of the harness, with the mock node in its own process:
+    mock_node = multiprocessing.get_context('fork').Process(target=run_mock_node, daemon=True)
+    mock_node.start()
+    time.sleep(1)
+    try:
+        for config in [
+            SenderConfig(connections_count=1, max_in_flight=100),
+            SenderConfig(connections_count=10, max_in_flight=100),
+            SenderConfig(connections_count=10, max_in_flight=1000, max_in_flight_per_endpoint=10000),
+            SenderConfig(connections_count=10, max_in_flight=1000, max_in_flight_per_endpoint=10000, batch_size=50),
+        ]:
+            bench_sending(args.accounts, args.swaps, config)
+    finally:
+        mock_node.terminate()
@@ -1,5 +1,6 @@
 import enum
-from typing import Dict, Union
+import math
+from typing import Dict, List, Optional, Union
 
 
 DRPC_API_KEY = '<DRPC_API_KEY>'
@@ -9,6 +10,7 @@ class ChainId(enum.Enum):
     OPTIMISM_MAINNET = 10
     POLYGON_ZKEVM_MAINNET = 1101
     ZKSYNC_ERA_MAINNET = 324
+    LOCAL_MOCK = 31337  # mock_node.py
 
 
 class Contract(enum.Enum):
@@ -20,6 +22,103 @@ class Token(enum.Enum):
     WETH = 'weth'
 
 
+class RpcEndpoint:
+    def __init__(
+        self,
+        ws_url: str,
+        max_rps: Optional[float] = None,
+        max_in_flight: Optional[int] = None,
+        local_addr: Optional[str] = None,
+    ):
+        self.ws_url = ws_url
+        self.max_rps = max_rps  # requests per second allowed by the provider, None is unlimited
+        self.max_in_flight = max_in_flight  # None: --max-in-flight-per-endpoint
+        self.local_addr = local_addr  # source address of the connections, None: --source-address or the default route
+
+    def scaled(self, factor):
+        # Limits of the endpoint shared by several worker processes:
+        return RpcEndpoint(
+            self.ws_url,
+            max_rps=self.max_rps * factor if self.max_rps is not None else None,
+            max_in_flight=max(1, math.ceil(self.max_in_flight * factor)) if self.max_in_flight is not None else None,
+            local_addr=self.local_addr,
+        )
+
+
+class Workload:
+    SWAP = 'swap'
+    TRANSFER = 'transfer'
+
+    def __init__(
+        self,
+        kind: str,
+        name: Optional[str] = None,
+        weight: float = 1.0,
+        router: Union[Contract, str] = Contract.PANCAKE_SMART_ROUTER,
+        path: Optional[List[Union[Token, str]]] = None,
+        amount: Optional[int] = None,
+        to: Optional[str] = None,
+        gas: Optional[int] = None,
+    ):
+        if kind not in (Workload.SWAP, Workload.TRANSFER):
+            raise ValueError(f"Unknown workload kind: {kind}")
+        self.kind = kind
+        self.path = path or [Token.WETH, Token.CAKE]  # swaps only: tokens (or addresses) from the one sold to the one bought
+        self.name = name or (kind if kind == Workload.TRANSFER else '-'.join(_entity_name(token) for token in self.path))
+        self.weight = weight  # share of the txs of every account (relative to the other workloads)
+        self.router = router  # swaps only: a V2-style router with swapExactTokensForTokens(amountIn, amountOutMin, path, to)
+        self.amount = amount if amount is not None else (10 ** 9 if kind == Workload.SWAP else 0)  # wei of path[0] or of ETH
+        self.to = to  # transfers only: recipient, None sends to the sender itself (touches no shared state)
+        self.gas = gas or (250000 if kind == Workload.SWAP else 21000)
+
+
+def _entity_name(entity):
+    return entity.value if isinstance(entity, (Contract, Token)) else entity[:10]
+
+
+def _parse_entity(value, enum_type):
+    # Contract/Token value (e.g. 'weth') or a plain address:
+    return value if value.startswith('0x') else enum_type(value)
+
+
+def parse_workload(spec):
+    # '<swap|transfer>[,name=<name>][,weight=<w>][,router=<contract|0x..>][,path=<token|0x..>-<token|0x..>[-...]][,amount=<wei>][,to=<0x..>][,gas=<n>]'
+    (kind, *options) = spec.split(',')
+    kwargs = {}
+    for option in options:
+        (key, value) = option.split('=', 1)
+        if key in ('name', 'to'):
+            kwargs[key] = value
+        elif key == 'weight':
+            kwargs[key] = float(value)
+        elif key in ('amount', 'gas'):
+            kwargs[key] = int(value)
+        elif key == 'router':
+            kwargs[key] = _parse_entity(value, Contract)
+        elif key == 'path':
+            kwargs[key] = [_parse_entity(token, Token) for token in value.split('-')]
+        else:
+            raise ValueError(f"Unknown workload option: {key}")
+    return Workload(kind, **kwargs)
+
+
+def parse_endpoint(spec):
+    # 'wss://host/path[,max_rps=<n>][,max_in_flight=<n>][,local_addr=<ip>]'
+    (ws_url, *options) = spec.split(',')
+    kwargs = {}
+    for option in options:
+        (key, value) = option.split('=', 1)
+        if key == 'max_rps':
+            kwargs[key] = float(value)
+        elif key == 'max_in_flight':
+            kwargs[key] = int(value)
+        elif key == 'local_addr':
+            kwargs[key] = value
+        else:
+            raise ValueError(f"Unknown endpoint option: {key}")
+    return RpcEndpoint(ws_url, **kwargs)
+
+
 class NetworkData:
     def __init__(
         self,
@@ -27,11 +126,17 @@ class NetworkData:
         http_rpc_url: str,
         ws_rpc_url: str,
         addresses: Dict[Union[Contract, Token], str],
+        ws_endpoints: Optional[List[RpcEndpoint]] = None,
+        workloads: Optional[List[Workload]] = None,
     ):
         self.chain_id = chain_id
         self.http_rpc_url = http_rpc_url
         self.ws_rpc_url = ws_rpc_url
         self.addresses = addresses
+        # Endpoints the txs are sent to (all of them are used at once), ws_rpc_url by default:
+        self.ws_endpoints = ws_endpoints or [RpcEndpoint(ws_rpc_url)]
+        # Txs mix of every account (--workload), the WETH -> CAKE swap by default:
+        self.workloads = workloads or [Workload(Workload.SWAP)]
 
 
 class BlockchainData:
@@ -66,6 +171,17 @@ class BlockchainData:
                 Token.WETH: '0x5AEa5775959fBC2557Cc8789bC1bf90A239D9a91'
             },
         ),
+        ChainId.LOCAL_MOCK: NetworkData(
+            chain_id=ChainId.LOCAL_MOCK.value,
+            http_rpc_url='http://127.0.0.1:8545',
+            ws_rpc_url='ws://127.0.0.1:8545',
+            addresses={
+                # The mock node does not execute txs, any addresses work:
+                Contract.PANCAKE_SMART_ROUTER: '0x0000000000000000000000000000000000000001',
+                Token.CAKE: '0x0000000000000000000000000000000000000002',
+                Token.WETH: '0x0000000000000000000000000000000000000003',
+            },
+        ),
     }
 
     def __init__(self, chain_id: ChainId):
@@ -82,5 +198,14 @@ class BlockchainData:
     def ws_rpc_url(self) -> str:
         return self.data.ws_rpc_url
 
+    def ws_endpoints(self) -> List[RpcEndpoint]:
+        return self.data.ws_endpoints
+
+    def workloads(self) -> List[Workload]:
+        return self.data.workloads
+
     def get_address(self, entity: Union[Contract, Token]) -> str:
         return self.data.addresses[entity]
+
+    def resolve_address(self, entity: Union[Contract, Token, str]) -> str:
+        return self.get_address(entity) if isinstance(entity, (Contract, Token)) else entity
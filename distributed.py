@@ -0,0 +1,502 @@
+import argparse
+import asyncio
+import collections
+import glob
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from accounts import AccountProvider
+from blockchain import BlockchainData, ChainId, parse_endpoint, parse_workload
+from events import FLUSH_INTERVAL_SECS, Event, EventTail
+from inclusion import INCLUSION_TIMEOUT_SECS, InclusionTracker
+from load_profiles import parse_profile
+from tps_test import SenderConfig, run_sharded
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+
+DEFAULT_PORT = 7070
+STREAM_LIMIT = 1 << 24  # max message size (newline-delimited JSON)
+MAX_EVENTS_PER_MESSAGE = 5000
+SYNC_SAMPLES = 16  # clock samples per agent before the start
+CLOCK_WINDOW = 32  # the offset is taken from the best of the last samples
+PING_TIMEOUT_SECS = 2.0
+RESYNC_SECS = 5.0  # during the run: one clock sample per agent and a progress line
+START_DELAY_SECS = 3.0
+
+
+def encode(message):
+    return (json.dumps(message, separators=(',', ':')) + '\n').encode()
+
+
+async def read_message(reader):
+    # None once the peer has closed the connection:
+    line = await reader.readline()
+    return json.loads(line) if line.endswith(b'\n') else None
+
+
+class ClockEstimate:
+    # NTP-style estimate of the offset of a remote clock (remote - local). Queuing delays only make the RTT
+    # of a sample longer, so the sample with the lowest recent RTT is the most accurate: its error is within +-RTT/2.
+    def __init__(self, window=CLOCK_WINDOW):
+        self.samples = collections.deque(maxlen=window)  # (rtt, offset)
+
+    def add(self, t0, t1, t2, t3):
+        # t0/t3: local send/receive times of a ping, t1/t2: remote receive/send times of its pong
+        rtt = (t3 - t0) - (t2 - t1)
+        self.samples.append((rtt, ((t1 - t0) + (t2 - t3)) / 2))
+
+    @property
+    def rtt(self):
+        return min(self.samples)[0] if self.samples else float('nan')
+
+    @property
+    def offset(self):
+        return min(self.samples)[1] if self.samples else 0.0
+
+
+class AgentLink:
+    # Coordinator side of the connection of an agent:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.peer = '%s:%s' % writer.get_extra_info('peername')[:2]
+        self.name = None
+        self.index = None
+        self.clock = ClockEstimate()
+        self.pongs = {}  # ping id -> future of (t1, t2, t3)
+        self.next_ping_id = 0
+        self.hello = asyncio.Event()
+        self.ready = asyncio.Event()
+        self.done = asyncio.Event()
+        self.lost = False
+        self.accepted_count = 0
+
+    def send(self, message):
+        self.writer.write(encode(message))
+
+    async def ping(self):
+        self.next_ping_id += 1
+        ping_id = self.next_ping_id
+        future = asyncio.get_running_loop().create_future()
+        self.pongs[ping_id] = future
+        t0 = time.time()
+        self.send({'type': 'ping', 'id': ping_id})
+        await self.writer.drain()
+        try:
+            (t1, t2, t3) = await asyncio.wait_for(future, PING_TIMEOUT_SECS)
+        except asyncio.TimeoutError:
+            return
+        finally:
+            self.pongs.pop(ping_id, None)
+        self.clock.add(t0, t1, t2, t3)
+
+    async def sync_clock(self, samples=SYNC_SAMPLES):
+        for _ in range(samples):
+            await self.ping()
+
+    def on_pong(self, message):
+        t3 = time.time()
+        future = self.pongs.get(message['id'])
+        if future is not None and not future.done():
+            future.set_result((message['t1'], message['t2'], t3))
+
+    def on_lost(self):
+        self.lost = True
+        for event in (self.hello, self.ready, self.done):
+            event.set()
+
+
+class Coordinator:
+    # Runs a test across agents on several servers: measures the clock offset and RTT of every agent, assigns
+    # account ranges, issues one start time and merges the tx events streamed by the agents into a single log.
+    # Timestamps of the merged log are in the coordinator's clock (agent clock - offset), so latencies of txs
+    # sent by different servers compare with each other and with the head arrival times of --track-inclusion.
+    def __init__(self, agents_count, run_config, accounts_per_agent, first_account=0, merged_events_path='logs/events-merged.jsonl',
+                 start_delay=START_DELAY_SECS, track_inclusion=False, inclusion_timeout=INCLUSION_TIMEOUT_SECS, inclusion_ws_url=None):
+        self.agents_count = agents_count
+        self.run_config = run_config  # SenderConfig options, swaps, chain and workloads sent to every agent
+        self.accounts_per_agent = accounts_per_agent
+        self.first_account = first_account
+        self.merged_events_path = merged_events_path
+        self.start_delay = start_delay
+        self.track_inclusion = track_inclusion
+        self.inclusion_timeout = inclusion_timeout
+        self.inclusion_ws_url = inclusion_ws_url  # node under test, the first endpoint of the chain by default
+        self.links = []
+        self.handlers = set()  # connection tasks
+        self.connected = asyncio.Event()
+        self.server = None
+        self.file = None
+
+    async def listen(self, host, port):
+        self.server = await asyncio.start_server(self._on_connection, host, port, limit=STREAM_LIMIT)
+        port = self.server.sockets[0].getsockname()[1]
+        logger.info(f"Coordinator listening on {host}:{port}, waiting for {self.agents_count} agents")
+        return port
+
+    async def _on_connection(self, reader, writer):
+        self.handlers.add(asyncio.current_task())
+        link = AgentLink(reader, writer)
+        if len(self.links) >= self.agents_count:
+            logger.warning(f"Unexpected agent connection from {link.peer}, closing it")
+            writer.close()
+            return
+        self.links.append(link)
+        try:
+            while (message := await read_message(reader)) is not None:
+                if message['type'] == 'pong':
+                    link.on_pong(message)
+                elif message['type'] == 'events':
+                    self._on_events(link, message['records'])
+                elif message['type'] == 'hello':
+                    if any(other.name == message['name'] for other in self.links):
+                        # Account ranges are assigned in name order, which must not depend on the order of connection:
+                        logger.warning(f"Agent {message['name']} connected again from {link.peer}, closing it")
+                        link.send({'type': 'error', 'message': f"another agent is named {message['name']}, every agent needs a unique --name"})
+                        self.links.remove(link)
+                        await link.writer.drain()
+                        link.writer.close()
+                        return
+                    link.name = message['name']
+                    link.hello.set()
+                    logger.info(f"Agent {link.name} connected from {link.peer}")
+                    if sum(link.hello.is_set() for link in self.links) == self.agents_count:
+                        self.connected.set()
+                elif message['type'] == 'ready':
+                    link.ready.set()
+                elif message['type'] == 'done' and not link.ready.is_set():
+                    # Its run ended before pre-signing completed (a failed worker), the others must not wait for it:
+                    logger.warning(f"Agent {link.name or link.peer} failed before start")
+                    link.on_lost()
+                elif message['type'] == 'done':
+                    link.done.set()
+        except (ConnectionError, ValueError) as e:
+            logger.warning(f"Agent {link.name or link.peer}: {e}")
+        if not link.done.is_set() and self.server.is_serving():  # not closed by close()
+            logger.warning(f"Agent {link.name or link.peer} disconnected before the end of the run")
+            link.on_lost()
+        if link.lost and not self.connected.is_set():
+            self.links.remove(link)  # its slot is free for a reconnection
+
+    def _on_events(self, link, records):
+        # Agent wall clock secs -> coordinator wall clock ns, with the current offset estimate of the agent:
+        offset = link.clock.offset
+        lines = []
+        for record in records:
+            if record['e'] in (Event.RUN_START, Event.RUN_END):
+                continue  # the merged log has a single run
+            if record['e'] == Event.ACCEPTED:
+                link.accepted_count += 1
+            lines.append(json.dumps({'t': round((record.pop('ts') - offset) * 1e9), **record, 'ag': link.index}, separators=(',', ':')))
+        if lines and self.file is not None:
+            self.file.write('\n'.join(lines) + '\n')
+            self.file.flush()
+
+    def _emit(self, event_type, ts):
+        self.file.write(json.dumps({'t': round(ts * 1e9), 'e': event_type}) + '\n')
+        self.file.flush()
+
+    async def run(self):
+        await self.connected.wait()
+        links = sorted(self.links, key=lambda link: link.name)
+        # 1. Clock offsets and RTTs:
+        await asyncio.gather(*(link.sync_clock() for link in links))
+        # 2. Account ranges, in the order of agent names so that reruns reuse the signed txs cache of every server:
+        for (index, link) in enumerate(links):
+            link.index = index
+            start_index = self.first_account + index * self.accounts_per_agent
+            logger.info(f"Agent {link.name} ({link.peer}): clock offset {link.clock.offset:+.6f}s, rtt {1000 * link.clock.rtt:.3f}ms, "
+                        f"accounts {start_index}..{start_index + self.accounts_per_agent - 1}")
+            link.send({'type': 'assign', 'index': index, 'start_index': start_index, 'accounts': self.accounts_per_agent,
+                       'load_share': 1.0 / len(links), **self.run_config})
+        # 3. One start time once every agent has pre-signed its txs, sent in the clock of every agent:
+        await asyncio.gather(*(link.ready.wait() for link in links))
+        if any(link.lost for link in links):
+            logger.info("An agent failed before start. Aborting...")
+            for link in links:
+                if not link.lost:
+                    link.send({'type': 'start', 'start_at': None})
+            return False
+        start_at = time.time() + self.start_delay + max(link.clock.rtt for link in links)
+        os.makedirs(os.path.dirname(self.merged_events_path) or '.', exist_ok=True)
+        self.file = open(self.merged_events_path, 'w')
+        # 't' of the merged log is wall clock ns already:
+        self.file.write(json.dumps({'e': Event.CLOCK, 'wall_ns': 0, 'mono_ns': 0, 'pid': os.getpid()}) + '\n')
+        self._emit(Event.RUN_START, start_at)
+        for link in links:
+            link.send({'type': 'start', 'start_at': start_at + link.clock.offset})
+        logger.info(f"Start time: {start_at}, merged events: {self.merged_events_path}")
+        tracker = None
+        if self.track_inclusion:
+            ws_url = self.inclusion_ws_url or BlockchainData(ChainId[self.run_config['chain']]).ws_endpoints()[0].ws_url
+            tracker = InclusionTracker(ws_url, [self.merged_events_path], timeout=self.inclusion_timeout)
+            tracker.start()
+        # 4. Merge the streamed events until every agent is done, the clocks keep being sampled meanwhile:
+        monitor = asyncio.create_task(self._monitor(links))
+        await asyncio.gather(*(link.done.wait() for link in links))
+        monitor.cancel()
+        self._emit(Event.RUN_END, time.time())
+        self.file.close()
+        self.file = None
+        self._log_progress(links)
+        if tracker is not None:
+            await asyncio.to_thread(tracker.join)
+        return not any(link.lost for link in links)
+
+    async def _monitor(self, links):
+        while True:
+            await asyncio.sleep(RESYNC_SECS)
+            await asyncio.gather(*(link.ping() for link in links if not link.lost))
+            self._log_progress(links)
+
+    def _log_progress(self, links):
+        accepted = ', '.join(f"{link.name}={link.accepted_count}" for link in links)
+        offsets = ', '.join(f"{link.name}={link.clock.offset:+.6f}s/{1000 * link.clock.rtt:.3f}ms" for link in links)
+        logger.info(f"Accepted txs: {sum(link.accepted_count for link in links)} ({accepted}) | clock offsets/rtt: {offsets}")
+
+    async def close(self):
+        # Agents still connected (aborted runs) are disconnected, their connection tasks end on EOF:
+        if self.server is not None:
+            self.server.close()
+        for link in self.links:
+            link.writer.close()
+        await asyncio.gather(*self.handlers, return_exceptions=True)
+
+
+class Agent:
+    # Connection to the coordinator in an event loop of its own thread: pings are answered and events streamed
+    # while the main thread runs the test (run_sharded). simulated_clock_skew (secs) is added to every time the
+    # agent reports and subtracted from the start time, as if the clock of the server was off by that much.
+    def __init__(self, host, port, name, simulated_clock_skew=0.0):
+        self.host = host
+        self.port = port
+        self.name = name
+        self.clock_skew = simulated_clock_skew
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        self.reader = None
+        self.writer = None
+        self.assignment = None
+        self.start_at = None
+        self.streamer = None
+        self.tails = {}
+        self.finished = False
+
+    def call(self, coroutine):
+        # From the main thread:
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def now(self):
+        return time.time() + self.clock_skew
+
+    def send(self, message):
+        self.writer.write(encode(message))
+
+    async def connect(self):
+        # Returns the assignment of the coordinator, once it has sampled the clock:
+        (self.reader, self.writer) = await asyncio.open_connection(self.host, self.port, limit=STREAM_LIMIT)
+        self.assignment = self.loop.create_future()
+        self.start_at = self.loop.create_future()
+        self.send({'type': 'hello', 'name': self.name})
+        self.loop.create_task(self._read())
+        return await self.assignment
+
+    async def _read(self):
+        while (message := await read_message(self.reader)) is not None:
+            if message['type'] == 'ping':
+                t1 = self.now()
+                self.send({'type': 'pong', 'id': message['id'], 't1': t1, 't2': self.now()})
+            elif message['type'] == 'assign':
+                self.assignment.set_result(message)
+            elif message['type'] == 'start':
+                self.start_at.set_result(message['start_at'])
+            elif message['type'] == 'error':
+                logger.error(f"Rejected by the coordinator: {message['message']}")
+                if not self.assignment.done():
+                    self.assignment.set_exception(ConnectionError(message['message']))
+        if self.finished:
+            return
+        logger.warning("Coordinator disconnected")
+        if not self.assignment.done():
+            self.assignment.set_exception(ConnectionError('coordinator disconnected'))
+        if not self.start_at.done():
+            self.start_at.set_result(None)
+
+    async def wait_for_start(self, events_pattern):
+        # Called once every worker has pre-signed its txs, returns the start time in the clock of the agent (None aborts):
+        self.send({'type': 'ready'})
+        self.streamer = self.loop.create_task(self._stream_events(events_pattern))
+        return await self.start_at
+
+    async def _stream_events(self, events_pattern):
+        # The worker logs are removed by run_sharded before the workers start, so only this run's events are tailed:
+        while True:
+            self._send_events(events_pattern)
+            await self.writer.drain()
+            await asyncio.sleep(FLUSH_INTERVAL_SECS)
+
+    def _send_events(self, events_pattern):
+        for path in sorted(glob.glob(events_pattern)):
+            if path not in self.tails:
+                self.tails[path] = EventTail(path)
+        records = [record for tail in self.tails.values() for record in tail.read()]
+        for record in records:
+            record['ts'] += self.clock_skew
+        for i in range(0, len(records), MAX_EVENTS_PER_MESSAGE):
+            self.send({'type': 'events', 'records': records[i:i + MAX_EVENTS_PER_MESSAGE]})
+
+    async def finish(self, events_pattern):
+        self.finished = True
+        if self.streamer is not None:
+            self.streamer.cancel()
+            self._send_events(events_pattern)
+        if not self.writer.is_closing():
+            self.send({'type': 'done'})
+            await self.writer.drain()
+            self.writer.close()
+        for tail in self.tails.values():
+            tail.close()
+
+
+def run_agent(host, port, name, processes_count, mnemonic, cache_dir=None, events_dir='logs', rpc_endpoints=None, source_addresses=None,
+              simulated_clock_skew=0.0):
+    agent = Agent(host, port, name, simulated_clock_skew)
+    assignment = agent.call(agent.connect())
+    index = assignment['index']
+    logger.info(f"Agent {name}: instance {index}, accounts {assignment['start_index']}..{assignment['start_index'] + assignment['accounts'] - 1}")
+    chain_id = ChainId[assignment['chain']]
+    accounts = AccountProvider(mnemonic).get_accounts(assignment['start_index'], assignment['accounts'])
+    load_profile = assignment['load_profile']
+    config = SenderConfig(
+        connections_count=assignment['connections'],
+        max_in_flight=assignment['max_in_flight'],
+        max_in_flight_per_endpoint=assignment['max_in_flight_per_endpoint'],
+        batch_size=assignment['batch_size'],
+        load_profile=parse_profile(load_profile).scaled(assignment['load_share']) if load_profile else None,
+        stuck_tx_secs=assignment['stuck_tx_secs'],
+        source_addresses=source_addresses,
+    )
+    workloads = [parse_workload(spec) for spec in assignment['workloads']] or None
+    events_pattern = os.path.join(events_dir, f"events-{index:02}-*.jsonl")
+
+    def start_time_fn():
+        start_at = agent.call(agent.wait_for_start(events_pattern))
+        return start_at - agent.clock_skew if start_at is not None else None
+
+    run_sharded(chain_id, accounts, assignment['swaps'], config, processes_count, cache_dir=cache_dir, events_dir=events_dir, instance_index=index,
+                rpc_endpoints=rpc_endpoints, workloads=workloads, start_time_fn=start_time_fn)
+    agent.call(agent.finish(events_pattern))
+
+
+async def run_coordinator(coordinator, host, port, agent_commands=None):
+    # agent_commands (local mode): argv of agents to spawn once the port is known, '{port}' is substituted
+    port = await coordinator.listen(host, port)
+    agents = [subprocess.Popen([part.replace('{port}', str(port)) for part in command]) for command in agent_commands or []]
+    try:
+        succeeded = await coordinator.run()
+    finally:
+        await coordinator.close()
+    for agent in agents:
+        await asyncio.to_thread(agent.wait)
+    return succeeded
+
+
+def add_run_arguments(parser):
+    parser.add_argument('--chain', choices=[chain.name for chain in ChainId], default=ChainId.ZKSYNC_ERA_MAINNET.name)
+    parser.add_argument('--accounts', type=int, default=10, help='number of accounts per agent')
+    parser.add_argument('--first-account', type=int, default=0, help='index of the first account of the first agent')
+    parser.add_argument('--swaps', type=int, default=20, help='number of swaps per account')
+    parser.add_argument('--connections', type=int, default=10, help='number of websocket connections per agent')
+    parser.add_argument('--max-in-flight', type=int, default=100, help='max unacknowledged requests per connection')
+    parser.add_argument('--max-in-flight-per-endpoint', type=int, default=1000, help='max unacknowledged requests per RPC endpoint (per agent)')
+    parser.add_argument('--batch-size', type=int, default=1, help='txs per JSON-RPC batch request (1 disables batching)')
+    parser.add_argument('--load-profile', default=None, help='open-loop target TPS of all agents together, see tps_test.py')
+    parser.add_argument('--replace-stuck-after', type=float, default=None, help='see tps_test.py')
+    parser.add_argument('--workload', action='append', default=[], help='tx kind of the mix (repeatable), see tps_test.py')
+    parser.add_argument('--start-delay', type=float, default=START_DELAY_SECS, help='secs between the last agent being ready and the start')
+    parser.add_argument('--merged-events', default='logs/events-merged.jsonl', help='tx events of all agents, in the coordinator\'s clock')
+    parser.add_argument('--track-inclusion', action='store_true', help='log per-block TPS and inclusion latency of all agents live')
+    parser.add_argument('--inclusion-timeout', type=float, default=INCLUSION_TIMEOUT_SECS, help='secs to wait for the inclusion of the last txs')
+    parser.add_argument('--endpoint', default=None, help='RPC endpoint --track-inclusion subscribes to, the agents\' first --endpoint (default: the chain\'s); local agents send to it')
+
+
+def make_coordinator(args, agents_count):
+    # Specs are checked here, agents get them as strings:
+    if args.load_profile:
+        parse_profile(args.load_profile)
+    for spec in args.workload:
+        parse_workload(spec)
+    inclusion_ws_url = parse_endpoint(args.endpoint).ws_url if args.endpoint else None
+    run_config = {
+        'chain': args.chain,
+        'swaps': args.swaps,
+        'connections': args.connections,
+        'max_in_flight': args.max_in_flight,
+        'max_in_flight_per_endpoint': args.max_in_flight_per_endpoint,
+        'batch_size': args.batch_size,
+        'load_profile': args.load_profile,
+        'stuck_tx_secs': args.replace_stuck_after,
+        'workloads': args.workload,
+    }
+    return Coordinator(agents_count, run_config, args.accounts, first_account=args.first_account, merged_events_path=args.merged_events,
+                       start_delay=args.start_delay, track_inclusion=args.track_inclusion, inclusion_timeout=args.inclusion_timeout,
+                       inclusion_ws_url=inclusion_ws_url)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    # 1. On one server (any of them or a separate one):
+    # python3 distributed.py coordinator --agents 10 --accounts 10 --swaps 20
+    coordinator_parser = subparsers.add_parser('coordinator', help='wait for the agents, start them together and merge their tx events')
+    coordinator_parser.add_argument('--agents', type=int, required=True, help='number of agents to wait for')
+    coordinator_parser.add_argument('--host', default='0.0.0.0')
+    coordinator_parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    add_run_arguments(coordinator_parser)
+    # 2. On every sending server:
+    # python3 distributed.py agent --coordinator <host>:7070
+    agent_parser = subparsers.add_parser('agent', help='run the share of the test assigned by the coordinator')
+    agent_parser.add_argument('--coordinator', required=True, help='<host>:<port>')
+    agent_parser.add_argument('--name', default=socket.gethostname(), help='unique name of the agent (account ranges are assigned in name order)')
+    agent_parser.add_argument('--processes', type=int, default=os.cpu_count(), help='number of worker processes')
+    agent_parser.add_argument('--endpoint', action='append', type=parse_endpoint, help='RPC endpoint to send txs to (repeatable), see tps_test.py')
+    agent_parser.add_argument('--source-address', action='append', help='local IP to open connections from (repeatable)')
+    agent_parser.add_argument('--mnemonic', default='mnemonic.txt', help='file with the mnemonic of the accounts')
+    agent_parser.add_argument('--signed-txs-cache', default='cache/signed_txs', help='directory of pre-signed txs cache ("" to disable)')
+    agent_parser.add_argument('--events-dir', default='logs', help='directory of the local per-worker tx event logs')
+    agent_parser.add_argument('--simulate-clock-skew', type=float, default=0.0, help='secs (testing only): pretend that the local clock is off')
+    # 3. Coordinator and agents on this machine, e.g. against the mock node:
+    # python3 distributed.py local --agents 3 --chain LOCAL_MOCK --simulate-clock-skew 0.5
+    local_parser = subparsers.add_parser('local', help='coordinator plus agents on localhost')
+    local_parser.add_argument('--agents', type=int, default=2)
+    local_parser.add_argument('--processes', type=int, default=1, help='number of worker processes per agent')
+    local_parser.add_argument('--simulate-clock-skew', type=float, default=0.0, help='secs, agent i pretends its clock is off by i times this')
+    local_parser.add_argument('--events-dir', default='logs', help='agent i logs to <events-dir>/agent<i>')
+    add_run_arguments(local_parser)
+    args = parser.parse_args()
+    if args.command == 'coordinator':
+        succeeded = asyncio.run(run_coordinator(make_coordinator(args, args.agents), args.host, args.port))
+        sys.exit(0 if succeeded else 1)
+    elif args.command == 'agent':
+        (host, port) = args.coordinator.rsplit(':', 1)
+        mnemonic = open(args.mnemonic, 'r').read()
+        run_agent(host, int(port), args.name, args.processes, mnemonic, cache_dir=args.signed_txs_cache, events_dir=args.events_dir,
+                  rpc_endpoints=args.endpoint, source_addresses=args.source_address, simulated_clock_skew=args.simulate_clock_skew)
+    elif args.command == 'local':
+        agent_commands = [
+            [sys.executable, os.path.abspath(__file__), 'agent', '--coordinator', '127.0.0.1:{port}', '--name', f"agent{i}", '--processes', str(args.processes),
+             '--events-dir', os.path.join(args.events_dir, f"agent{i}"), '--simulate-clock-skew', str(i * args.simulate_clock_skew),
+             *(['--endpoint', args.endpoint] if args.endpoint else [])]
+            for i in range(args.agents)
+        ]
+        succeeded = asyncio.run(run_coordinator(make_coordinator(args, args.agents), '127.0.0.1', 0, agent_commands))
+        sys.exit(0 if succeeded else 1)
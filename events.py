@@ -0,0 +1,128 @@
+import collections
+import json
+import os
+import threading
+import time
+
+
+class Event:
+    SENT = 'sent'  # request written to the websocket
+    ACCEPTED = 'accepted'  # RPC acknowledged the tx (result or "known transaction"), or its nonce is taken already ("nonce too low")
+    REJECTED = 'rejected'  # RPC returned an error, tx will be resent
+    ABORTED = 'aborted'  # RPC returned an error, tx is dropped
+    REPLACED = 'replaced'  # tx re-signed with a higher gas price (same nonce), either hash may be the one included
+    RUN_START = 'run_start'
+    RUN_END = 'run_end'
+    CLOCK = 'clock'  # first record of every file: wall clock <-> monotonic clock anchor
+
+
+FLUSH_INTERVAL_SECS = 0.2
+
+
+def endpoint_name(url):
+    # Only the host is recorded, RPC urls may contain API keys:
+    return url.split('://')[-1].split('/')[0].split('?')[0]
+
+
+class EventSink:
+    # Per-tx events with monotonic nanosecond timestamps. emit() only appends a tuple to a deque,
+    # a background thread serializes the records to JSONL and writes them off the hot path.
+    def __init__(self, path, flush_interval=FLUSH_INTERVAL_SECS):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.buffer = collections.deque()
+        self.stopped = threading.Event()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.file = open(path, 'w')
+        self.file.write(json.dumps({'e': Event.CLOCK, 'wall_ns': time.time_ns(), 'mono_ns': time.monotonic_ns(), 'pid': os.getpid()}) + '\n')
+        self.thread = threading.Thread(target=self._writer, daemon=True)
+        self.thread.start()
+
+    def emit(self, event_type, account=None, nonce=None, request_id=None, tx_hash=None, endpoint=None, error=None, workload=None):
+        self.buffer.append((time.monotonic_ns(), event_type, account, nonce, request_id, tx_hash, endpoint, error, workload))
+
+    def close(self):
+        self.stopped.set()
+        self.thread.join()
+        self.file.close()
+
+    def _drain(self):
+        lines = []
+        while self.buffer:
+            (mono_ns, event_type, account, nonce, request_id, tx_hash, endpoint, error, workload) = self.buffer.popleft()
+            record = {'t': mono_ns, 'e': event_type}
+            if account is not None:
+                record['a'] = account
+            if nonce is not None:
+                record['n'] = nonce
+            if request_id is not None:
+                record['id'] = request_id
+            if tx_hash is not None:
+                record['h'] = tx_hash
+            if endpoint is not None:
+                record['ep'] = endpoint
+            if error is not None:
+                record['err'] = error
+            if workload is not None:
+                record['w'] = workload
+            lines.append(json.dumps(record, separators=(',', ':')))
+        if lines:
+            self.file.write('\n'.join(lines) + '\n')
+            self.file.flush()
+
+    def _writer(self):
+        while not self.stopped.wait(self.flush_interval):
+            self._drain()
+        self._drain()
+
+
+def parse_events(lines):
+    # Yields event dicts with 'ts' (wall clock secs, ns resolution) instead of the monotonic 't':
+    offset_ns = 0
+    for line in lines:
+        if not line.endswith('\n'):
+            break  # partially written record
+        record = json.loads(line)
+        if record['e'] == Event.CLOCK:
+            offset_ns = record['wall_ns'] - record['mono_ns']
+            continue
+        record['ts'] = (record.pop('t') + offset_ns) / 1e9
+        yield record
+
+
+def load_events(path):
+    with open(path, 'r') as f:
+        yield from parse_events(f)
+
+
+class EventTail:
+    # Incremental reader of an event log that is still being written (it may not exist yet):
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.partial_line = ''
+        self.offset_ns = 0
+
+    def read(self):
+        # Complete records appended since the last call, with 'ts' as in parse_events:
+        if self.file is None:
+            if not os.path.exists(self.path):
+                return []
+            self.file = open(self.path, 'r')
+        records = []
+        for line in iter(self.file.readline, ''):
+            self.partial_line += line
+            if not self.partial_line.endswith('\n'):
+                continue
+            record = json.loads(self.partial_line)
+            self.partial_line = ''
+            if record['e'] == Event.CLOCK:
+                self.offset_ns = record['wall_ns'] - record['mono_ns']
+                continue
+            record['ts'] = (record.pop('t') + self.offset_ns) / 1e9
+            records.append(record)
+        return records
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
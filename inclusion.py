@@ -0,0 +1,204 @@
+import asyncio
+import collections
+import logging
+import threading
+import time
+
+from events import FLUSH_INTERVAL_SECS, Event, EventTail
+from logs_parser import latency_percentiles
+from rpc import RpcClient
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+
+INCLUSION_TIMEOUT_SECS = 120.0
+EVENTS_POLL_SECS = 0.2
+RECENT_BLOCKS_SECS = 30.0  # unmatched txs of recent blocks are kept this long: acks may be logged after inclusion
+
+
+def format_latencies(sorted_latencies):
+    # The percentiles of the analysis, from the same helper:
+    return ' '.join(f"{name}={value:.2f}s" for (name, value) in latency_percentiles(sorted_latencies).items()) or '-'
+
+
+class InclusionTracker:
+    # Live TPS during the run: tails the event logs of the workers for accepted txs and matches them
+    # against the blocks announced by a newHeads subscription. Latency is measured from the last send
+    # of a tx to the arrival of the head of the block including it.
+    def __init__(self, ws_url, events_paths, timeout=INCLUSION_TIMEOUT_SECS):
+        self.ws_url = ws_url
+        self.tails = [EventTail(path) for path in events_paths]
+        self.timeout = timeout
+        self.senders_done = threading.Event()
+        self.thread = None
+        self.last_sent_at = {}  # sent, not acknowledged yet: tx hash -> sent_at
+        self.pending = {}  # accepted, not included yet: tx hash -> sent_at
+        # Nonces with replacements: (account, nonce) -> accepted hashes of the nonce, None once one of them is included.
+        # Every hash is a candidate until then, the nonce is counted once:
+        self.candidates_by_nonce = {}
+        self.nonce_by_candidate = {}  # tx hash -> (account, nonce), pending candidates only
+        self.recent_block_by_tx_hash = {}  # txs of recent blocks not matched yet: tx hash -> head arrival time
+        self.recent_tx_hashes = collections.deque()  # (head arrival time, tx hashes) of recent blocks
+        self.latencies = []
+        self.accepted_count = 0
+        self.first_block_ts = None
+        self.last_block_ts = None  # of the last block including our txs
+        self.prev_block_ts = None
+        self.next_number = None
+        self.last_progress_at = time.time()
+
+    def start(self):
+        self.thread = threading.Thread(target=asyncio.run, args=(self.run(),), daemon=True)
+        self.thread.start()
+
+    def join(self):
+        # Called once the senders have finished, returns when all txs are included or after the timeout:
+        self.senders_done.set()
+        self.thread.join()
+
+    def _read_events(self):
+        for tail in self.tails:
+            for event in tail.read():
+                tx_hash = event.get('h')
+                if tx_hash is None:
+                    continue
+                if event['e'] == Event.SENT:
+                    self.last_sent_at[tx_hash] = event['ts']
+                elif event['e'] == Event.ACCEPTED:
+                    sent_at = self.last_sent_at.pop(tx_hash, None)
+                    if sent_at is None:
+                        continue
+                    nonce_key = (event.get('a'), event.get('n'))
+                    if nonce_key in self.candidates_by_nonce:
+                        candidates = self.candidates_by_nonce[nonce_key]
+                        if candidates is None:
+                            continue  # another tx of the nonce is included already
+                        if not candidates:
+                            self.accepted_count += 1
+                        candidates.add(tx_hash)
+                        self.nonce_by_candidate[tx_hash] = nonce_key
+                    else:
+                        self.accepted_count += 1
+                    seen_at = self.recent_block_by_tx_hash.pop(tx_hash, None)
+                    if seen_at is not None:
+                        self.latencies.append(seen_at - sent_at)
+                        self._on_included(tx_hash)
+                    else:
+                        self.pending[tx_hash] = sent_at
+                elif event['e'] == Event.ABORTED:
+                    self.last_sent_at.pop(tx_hash, None)
+                elif event['e'] == Event.REPLACED:
+                    # The replaced tx stays pending: either tx of the nonce may be included
+                    self.last_sent_at.pop(tx_hash, None)
+                    nonce_key = (event.get('a'), event.get('n'))
+                    if nonce_key in self.candidates_by_nonce:
+                        continue
+                    if tx_hash in self.pending:
+                        self.candidates_by_nonce[nonce_key] = {tx_hash}
+                        self.nonce_by_candidate[tx_hash] = nonce_key
+                    else:
+                        # Rejected as underpriced (never accepted), or a stuck tx that has been included meanwhile:
+                        self.candidates_by_nonce[nonce_key] = set() if 'err' in event else None
+
+    def _on_included(self, tx_hash):
+        # The other candidates of the nonce of an included tx can no longer be included:
+        nonce_key = self.nonce_by_candidate.pop(tx_hash, None)
+        if nonce_key is None:
+            return
+        for other_hash in self.candidates_by_nonce[nonce_key] - {tx_hash}:
+            self.pending.pop(other_hash, None)
+            self.nonce_by_candidate.pop(other_hash, None)
+        self.candidates_by_nonce[nonce_key] = None
+
+    def _on_block(self, number, block, seen_at):
+        block_ts = int(block['timestamp'], 16)
+        latencies = []
+        unmatched_tx_hashes = []
+        for tx_hash in block['transactions']:
+            sent_at = self.pending.pop(tx_hash, None)
+            if sent_at is None:
+                unmatched_tx_hashes.append(tx_hash)
+            else:
+                latencies.append(seen_at - sent_at)
+                self._on_included(tx_hash)
+        for tx_hash in unmatched_tx_hashes:
+            self.recent_block_by_tx_hash[tx_hash] = seen_at
+        self.recent_tx_hashes.append((seen_at, unmatched_tx_hashes))
+        while self.recent_tx_hashes and self.recent_tx_hashes[0][0] < seen_at - RECENT_BLOCKS_SECS:
+            for tx_hash in self.recent_tx_hashes.popleft()[1]:
+                self.recent_block_by_tx_hash.pop(tx_hash, None)
+        block_secs = block_ts - self.prev_block_ts if self.prev_block_ts is not None else 0
+        self.prev_block_ts = block_ts
+        if not latencies and not self.pending:
+            return
+        if latencies:
+            self.last_progress_at = seen_at
+            if self.first_block_ts is None:
+                self.first_block_ts = block_ts
+            self.last_block_ts = block_ts
+        self.latencies += latencies
+        latencies.sort()
+        elapsed_secs = block_ts - self.first_block_ts if self.first_block_ts is not None else 0
+        logger.info(
+            f"Block #{number} ts={block_ts} | all_txs_in_block={len(block['transactions']):4}, our_txs_in_block={len(latencies):4}, "
+            f"block_tps={'-' if block_secs <= 0 else f'{len(latencies) / block_secs:.2f}'}, "
+            f"cum_txs_confirmed={len(self.latencies)}/{self.accepted_count}, "
+            f"cum_tps={'-' if elapsed_secs <= 0 else f'{len(self.latencies) / elapsed_secs:.2f}'} | "
+            f"latency {format_latencies(latencies)}"
+        )
+
+    def _finished(self, senders_done_at):
+        if senders_done_at is None:
+            return False
+        if not self.pending:
+            logger.info(f"All {self.accepted_count} accepted txs are included")
+            return True
+        if time.time() - max(self.last_progress_at, senders_done_at) > self.timeout:
+            # Counted by nonce, as the accepted txs:
+            pending_count = len(self.pending) - len(self.nonce_by_candidate) + len(set(self.nonce_by_candidate.values()))
+            logger.info(f"{pending_count} of {self.accepted_count} accepted txs not included after {self.timeout:.0f}s")
+            return True
+        return False
+
+    def log_summary(self):
+        latencies = sorted(self.latencies)
+        elapsed_secs = self.last_block_ts - self.first_block_ts if self.first_block_ts is not None else 0
+        logger.info(
+            f"Included: {len(latencies)}/{self.accepted_count} txs | "
+            f"TPS: {'-' if elapsed_secs <= 0 else f'{len(latencies) / elapsed_secs:.2f}'} | "
+            f"latency {format_latencies(latencies)}"
+        )
+
+    async def run(self):
+        async with RpcClient(self.ws_url) as client:
+            heads = await client.subscribe('newHeads')
+            senders_done_at = None
+            while True:
+                # Checked before reading the events, so that the last ones of the senders are not missed:
+                if senders_done_at is None and self.senders_done.is_set():
+                    senders_done_at = time.time()
+                try:
+                    head = await asyncio.wait_for(heads.get(), EVENTS_POLL_SECS)
+                except asyncio.TimeoutError:
+                    head = None
+                if head is not None:
+                    seen_at = time.time()
+                    # Acks that arrived just before the head may still be buffered by the event sinks:
+                    await asyncio.sleep(FLUSH_INTERVAL_SECS)
+                    self._read_events()
+                    number = int(head['number'], 16)
+                    # Heads can be skipped by the subscription, the missed blocks are fetched as well:
+                    numbers = range(self.next_number if self.next_number is not None else number, number + 1)
+                    blocks = await asyncio.gather(*[client.request('eth_getBlockByNumber', [hex(n), False]) for n in numbers])
+                    for (n, block) in zip(numbers, blocks):
+                        if block is not None:
+                            self._on_block(n, block, seen_at)
+                    self.next_number = max(self.next_number or 0, number + 1)
+                else:
+                    self._read_events()
+                if self._finished(senders_done_at):
+                    break
+        for tail in self.tails:
+            tail.close()
+        self.log_summary()
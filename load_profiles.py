@@ -0,0 +1,109 @@
+import asyncio
+import collections
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+
+MIN_RATE = 0.01  # txs/s, keeps the schedule finite when a profile starts at 0
+
+
+class ConstantProfile:
+    def __init__(self, rate):
+        self.rate = rate
+
+    def rate_at(self, _elapsed_secs):
+        return self.rate
+
+    def scaled(self, factor):
+        return ConstantProfile(self.rate * factor)
+
+    def __str__(self):
+        return f"constant:{self.rate:g}"
+
+
+class RampProfile:
+    # Linear ramp from start_rate to end_rate over duration_secs, then end_rate:
+    def __init__(self, start_rate, end_rate, duration_secs):
+        self.start_rate = start_rate
+        self.end_rate = end_rate
+        self.duration_secs = duration_secs
+
+    def rate_at(self, elapsed_secs):
+        progress = min(1.0, elapsed_secs / self.duration_secs) if self.duration_secs > 0 else 1.0
+        return self.start_rate + (self.end_rate - self.start_rate) * progress
+
+    def scaled(self, factor):
+        return RampProfile(self.start_rate * factor, self.end_rate * factor, self.duration_secs)
+
+    def __str__(self):
+        return f"ramp:{self.start_rate:g}:{self.end_rate:g}:{self.duration_secs:g}"
+
+
+class StepProfile:
+    # Starts at start_rate and adds step_rate every step_secs (up to max_rate, if given):
+    def __init__(self, start_rate, step_rate, step_secs, max_rate=None):
+        self.start_rate = start_rate
+        self.step_rate = step_rate
+        self.step_secs = step_secs
+        self.max_rate = max_rate
+
+    def rate_at(self, elapsed_secs):
+        rate = self.start_rate + self.step_rate * int(elapsed_secs // self.step_secs)
+        return min(rate, self.max_rate) if self.max_rate is not None else rate
+
+    def scaled(self, factor):
+        max_rate = self.max_rate * factor if self.max_rate is not None else None
+        return StepProfile(self.start_rate * factor, self.step_rate * factor, self.step_secs, max_rate)
+
+    def __str__(self):
+        max_rate = f":{self.max_rate:g}" if self.max_rate is not None else ""
+        return f"step:{self.start_rate:g}:{self.step_rate:g}:{self.step_secs:g}{max_rate}"
+
+
+def parse_profile(spec):
+    # constant:<tps> | ramp:<start_tps>:<end_tps>:<secs> | step:<start_tps>:<step_tps>:<step_secs>[:<max_tps>]
+    (kind, *values) = spec.split(':')
+    values = [float(value) for value in values]
+    if kind == 'constant' and len(values) == 1:
+        return ConstantProfile(*values)
+    if kind == 'ramp' and len(values) == 3:
+        return RampProfile(*values)
+    if kind == 'step' and len(values) in (3, 4):
+        return StepProfile(*values)
+    raise ValueError(f"Unknown load profile: {spec}")
+
+
+class TokenBucket:
+    # Open-loop scheduler: every acquire() reserves the next release slot of the profile, so txs
+    # are offered at the target rate regardless of how fast the chain (or the RPC) acknowledges them.
+    def __init__(self, profile, burst=1):
+        self.profile = profile
+        self.burst = burst
+        self.started_at = None
+        self.next_slot = None
+        self.offered_by_second = collections.Counter()
+
+    def start(self):
+        self.started_at = time.time()
+        self.next_slot = self.started_at
+
+    async def acquire(self):
+        if self.started_at is None:
+            self.start()
+        now = time.time()
+        # Do not accumulate more than `burst` tokens while nobody is asking for them:
+        rate = max(MIN_RATE, self.profile.rate_at(now - self.started_at))
+        self.next_slot = max(self.next_slot, now - (self.burst - 1) / rate)
+        slot = self.next_slot
+        self.next_slot += 1.0 / max(MIN_RATE, self.profile.rate_at(slot - self.started_at))
+        if slot > now:
+            await asyncio.sleep(slot - now)
+        self.offered_by_second[int(slot - self.started_at)] += 1
+
+    def log_summary(self):
+        for second in sorted(self.offered_by_second):
+            target = self.profile.rate_at(second)
+            logger.info(f"Offered rate: second={second} target_tps={target:.2f} offered_txs={self.offered_by_second[second]}")
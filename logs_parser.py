@@ -1,149 +1,619 @@
 from datetime import datetime
-from web3 import Web3
+import numpy as np
+import argparse
+import array
 import asyncio
+import glob
+import heapq
 import json
-import random
+import operator
+import os
+import re
+import sys
 import time
-import websockets
 
 from blockchain import BlockchainData, ChainId
+from events import Event, parse_events
+from rpc import RpcClient, RpcError
+from rpc_cache import CONFIRMATIONS, RpcCache
 
 
-def request_to_json(method, params, request_id=None):
-    if request_id is None:
-        request_id = random.randint(0, int(1e9))
-    return {
-        'jsonrpc': '2.0',
-        'id': request_id,
-        'method': method,
-        'params': params,
-    }
+FOLLOW_POLL_SECS = 0.2
+FOLLOW_IDLE_TIMEOUT_SECS = 30.0
+BLOCK_FETCH_CONCURRENCY = 16
+BLOCK_TIMESTAMP_SLACK_SECS = 10  # a block timestamp may precede the send time of its txs
+INCLUSION_TIMEOUT_SECS = 120.0
+HEAD_POLL_SECS = 1.0
+RECEIPT_BATCH_SIZE = 100
+CACHE_LOOKUP_CHUNK_SIZE = 10000  # tx hashes looked up in the RPC cache at once
+RECEIPT_FIELDS = ('blockNumber', 'status', 'gasUsed', 'effectiveGasPrice')  # cached receipts are trimmed to these
+
+
+async def get_blocks(client, numbers, latest_number, cache=None):
+    # Blocks with tx hashes only, from the cache if possible. Blocks deep enough below the head are cached:
+    blocks = {number: cache.get_block(number) if cache is not None else None for number in numbers}
+    missing_numbers = [number for (number, block) in blocks.items() if block is None]
+    fetched_blocks = await asyncio.gather(*[client.request("eth_getBlockByNumber", [hex(number), False]) for number in missing_numbers])
+    blocks.update(zip(missing_numbers, fetched_blocks))
+    if cache is not None:
+        cache.put_blocks({
+            number: block for (number, block) in zip(missing_numbers, fetched_blocks)
+            if block is not None and number <= latest_number - CONFIRMATIONS
+        })
+    return [blocks[number] for number in numbers]
+
+
+async def find_block_by_timestamp(client, timestamp, latest_number, cache=None):
+    # First block with block.timestamp >= timestamp, log2(latest_number) requests:
+    (low, high) = (0, latest_number)
+    while low < high:
+        middle = (low + high) // 2
+        (block,) = await get_blocks(client, [middle], latest_number, cache)
+        if block is None or int(block['timestamp'], 16) < timestamp:  # None: pruned by the node
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+def _block_info(block):
+    return (int(block['timestamp'], 16), len(block['transactions']), int(block['gasUsed'], 16), int(block['gasLimit'], 16))
+
+
+async def _resolve_inclusion(sent_txs, ws_url, timeout=INCLUSION_TIMEOUT_SECS, concurrency=BLOCK_FETCH_CONCURRENCY, cache=None):
+    # Scans the blocks produced since the first tx was sent and looks their tx hashes up among ours by binary search
+    # over the compact hashes of sent_txs, i.e. O(blocks) requests instead of O(txs) and no per-tx Python objects.
+    # Returns the block number of every tx of sent_txs, -1 for txs not included within `timeout` secs of the last
+    # inclusion (or of the last send), and the blocks with our txs.
+    block_nums = np.full(len(sent_txs), -1, np.int64)
+    blocks = {}  # block number -> (timestamp, all txs count, gas used, gas limit), blocks with our txs only
+    sent_at = np.frombuffer(sent_txs.sent_at, np.float64)
+    (first_sent_at, last_progress_ts) = (float(sent_at.min()), float(sent_at.max()))
+    if cache is not None:
+        # Txs resolved by an earlier (possibly interrupted) run need no requests at all:
+        for start in range(0, len(sent_txs), CACHE_LOOKUP_CHUNK_SIZE):
+            tx_hashes = [sent_txs.tx_hash(i) for i in range(start, min(start + CACHE_LOOKUP_CHUNK_SIZE, len(sent_txs)))]
+            block_num_by_tx_hash = cache.get_block_numbers(tx_hashes)
+            block_nums[start:start + len(tx_hashes)] = [block_num_by_tx_hash.get(tx_hash, -1) for tx_hash in tx_hashes]
+        for number in np.unique(block_nums[block_nums >= 0]).tolist():
+            blocks[number] = _block_info(cache.get_block(number))
+            last_progress_ts = max(last_progress_ts, blocks[number][0])
+    left_count = int((block_nums < 0).sum())
+    if not left_count:
+        print(f"All {len(sent_txs)} txs resolved from the RPC cache", file=sys.stderr)
+        return (block_nums, blocks)
+    index = TxHashIndex(sent_txs.hashes)
+    async with RpcClient(ws_url) as client:
+        latest_number = int(await client.request("eth_blockNumber"), 16)
+        next_number = await find_block_by_timestamp(client, first_sent_at - BLOCK_TIMESTAMP_SLACK_SECS, latest_number, cache)
+        (first_number, idle_since) = (next_number, time.time())
+        timed_out = False
+        while left_count and not timed_out:
+            if next_number > latest_number:
+                timed_out = time.time() - idle_since > timeout
+                await asyncio.sleep(HEAD_POLL_SECS)
+                latest_number = int(await client.request("eth_blockNumber"), 16)
+                continue
+            numbers = range(next_number, min(next_number + concurrency, latest_number + 1))
+            for block in await get_blocks(client, numbers, latest_number, cache):
+                if block is None:  # behind a load balancer the head may differ between nodes
+                    latest_number = next_number - 1
+                    break
+                block_timestamp = int(block['timestamp'], 16)
+                indices = index.find(block['transactions'])
+                indices = indices[block_nums[indices] < 0]
+                if len(indices):
+                    left_count -= len(indices)
+                    block_nums[indices] = next_number
+                    blocks[next_number] = _block_info(block)
+                    last_progress_ts = max(last_progress_ts, block_timestamp)
+                next_number += 1
+                idle_since = time.time()
+                if block_timestamp > last_progress_ts + timeout:
+                    timed_out = True
+                    break
+    print(f"Scanned blocks #{first_number}..#{next_number - 1}: {len(sent_txs) - left_count} of {len(sent_txs)} txs included", file=sys.stderr)
+    return (block_nums, blocks)
+
+
+def resolve_inclusion(sent_txs, ws_url, timeout=INCLUSION_TIMEOUT_SECS, cache=None):
+    return asyncio.run(_resolve_inclusion(sent_txs, ws_url, timeout=timeout, cache=cache))
+
+
+async def get_block_receipts(client, numbers, tx_hashes, concurrency=BLOCK_FETCH_CONCURRENCY):
+    # Receipts of `tx_hashes` with one eth_getBlockReceipts per block, i.e. O(blocks) requests;
+    # raises RpcError if the node does not support the method:
+    receipts = {}
+    for i in range(0, len(numbers), concurrency):
+        chunk = numbers[i:i + concurrency]
+        for block_receipts in await asyncio.gather(*[client.request("eth_getBlockReceipts", [hex(number)]) for number in chunk]):
+            for receipt in block_receipts or []:
+                if receipt['transactionHash'] in tx_hashes:
+                    receipts[receipt['transactionHash']] = receipt
+    return receipts
+
+
+async def get_tx_receipts(client, tx_hashes, concurrency=BLOCK_FETCH_CONCURRENCY, batch_size=RECEIPT_BATCH_SIZE):
+    # JSON-RPC batches of eth_getTransactionReceipt, `concurrency` batches in flight:
+    tx_hashes = list(tx_hashes)
+    batches = [tx_hashes[i:i + batch_size] for i in range(0, len(tx_hashes), batch_size)]
+    receipts = {}
+    for i in range(0, len(batches), concurrency):
+        chunk = batches[i:i + concurrency]
+        results = await asyncio.gather(*[
+            client.batch([("eth_getTransactionReceipt", [tx_hash]) for tx_hash in batch], raise_errors=False) for batch in chunk
+        ])
+        for (batch, batch_receipts) in zip(chunk, results):
+            receipts.update(
+                (tx_hash, receipt) for (tx_hash, receipt) in zip(batch, batch_receipts)
+                if receipt is not None and not isinstance(receipt, RpcError)
+            )
+    return receipts
+
 
+async def _fetch_receipts(sent_txs, block_nums, ws_url, concurrency=BLOCK_FETCH_CONCURRENCY, cache=None):
+    # Status and gas used of every tx of sent_txs (-1: no receipt): block-level where the node supports
+    # eth_getBlockReceipts, concurrent per-tx batches otherwise. `concurrency` blocks at a time, so only the
+    # hashes of those blocks are held as strings. Receipts of blocks deep enough below the head are cached.
+    (statuses, gas_used) = (np.full(len(sent_txs), -1, np.int64), np.full(len(sent_txs), -1, np.int64))
+    included = np.flatnonzero(block_nums >= 0)
+    included = included[np.argsort(block_nums[included], kind='stable')]
+    (numbers, starts) = np.unique(block_nums[included], return_index=True)
+    starts = np.append(starts, len(included))
+    (client, latest_number, block_receipts) = (None, None, True)
+    (fetched_count, fetched_blocks_count, receipts_count) = (0, 0, 0)
+    try:
+        for first in range(0, len(numbers), concurrency):
+            last = min(first + concurrency, len(numbers))
+            index_by_tx_hash = {sent_txs.tx_hash(i): i for i in included[starts[first]:starts[last]].tolist()}
+            receipts = cache.get_receipts(index_by_tx_hash) if cache is not None else {}
+            tx_hashes_left = index_by_tx_hash.keys() - receipts.keys()
+            if tx_hashes_left:
+                if client is None:
+                    client = RpcClient(ws_url)
+                    await client.connect()
+                    latest_number = int(await client.request("eth_blockNumber"), 16)
+                chunk_numbers = sorted({int(block_nums[index_by_tx_hash[tx_hash]]) for tx_hash in tx_hashes_left})
+                fetched_blocks_count += len(chunk_numbers)
+                fetched = {}
+                if block_receipts:
+                    try:
+                        fetched = await get_block_receipts(client, chunk_numbers, tx_hashes_left, concurrency)
+                    except RpcError as e:
+                        print(f"No block receipts ({e.message}), fetching receipts in batches", file=sys.stderr)
+                        block_receipts = False
+                fetched.update(await get_tx_receipts(client, tx_hashes_left - fetched.keys(), concurrency))
+                fetched = {tx_hash: {field: receipt.get(field) for field in RECEIPT_FIELDS} for (tx_hash, receipt) in fetched.items()}
+                if cache is not None:
+                    cache.put_receipts({
+                        tx_hash: receipt for (tx_hash, receipt) in fetched.items()
+                        if int(receipt['blockNumber'], 16) <= latest_number - CONFIRMATIONS
+                    })
+                fetched_count += len(fetched)
+                receipts.update(fetched)
+            receipts_count += len(receipts)
+            for (tx_hash, receipt) in receipts.items():
+                if receipt['status'] is not None:
+                    statuses[index_by_tx_hash[tx_hash]] = int(receipt['status'], 16)
+                    gas_used[index_by_tx_hash[tx_hash]] = int(receipt['gasUsed'], 16)
+    finally:
+        if client is not None:
+            await client.close()
+    if client is not None:
+        print(f"Fetched {fetched_count} receipts of {fetched_blocks_count} blocks: {receipts_count} of {len(included)} included txs", file=sys.stderr)
+    return (statuses, gas_used)
 
-async def _get_block_numbers_by_tx_hash(tx_hashes, ws_url):
-    block_num_by_tx_hash = {}
-    tx_hash_by_request_id = {}
-    tx_hashes_left = set(tx_hashes)
-    request_id = 1
-    while len(block_num_by_tx_hash) != len(tx_hashes):
-        async with websockets.connect(ws_url) as ws:
-            while len(block_num_by_tx_hash) != len(tx_hashes):
-                txs_in_batch = min(80, len(tx_hashes_left))
-                # Send requests in batch:
-                requests_left = txs_in_batch
-                for tx_hash in tx_hashes_left:
-                    json_request = request_to_json("eth_getTransactionByHash", [tx_hash], request_id=request_id)
-                    await ws.send(json.dumps(json_request))
-                    tx_hash_by_request_id[request_id] = tx_hash
-                    request_id += 1
-                    requests_left -= 1
-                    if requests_left == 0:
-                        break
-                    time.sleep(0.01)
-                # Recv responses in batch:
-                for _ in range(txs_in_batch):
-                    message = await ws.recv()
-                    json_response = json.loads(message)
-                    if "result" in json_response:
-                        result = json_response["result"]
-                        tx_hash = tx_hash_by_request_id[json_response["id"]]
-                        tx_hashes_left.remove(tx_hash)
-                        block_num_by_tx_hash[tx_hash] = int(result["blockNumber"], 16)
-                time.sleep(1)
-            time.sleep(1)
-    return block_num_by_tx_hash
-
-
-def get_block_numbers_by_tx_hash(tx_hashes, ws_url):
-    return asyncio.run(_get_block_numbers_by_tx_hash(tx_hashes, ws_url))
-
-
-def parse_combined_logs(filename, chain_id):
-    blockchain = BlockchainData(chain_id)
-    http_rpc_url = blockchain.http_rpc_url()
-    ws_rpc_url = blockchain.ws_rpc_url()
-    w3 = Web3(Web3.HTTPProvider(http_rpc_url))
-    lines = open(filename, 'r').readlines()
-    tx_last_sent_at = {}
-    tx_sent_at = {}
-    blocks = {}
+
+def fetch_receipts(sent_txs, block_nums, ws_url, cache=None):
+    return asyncio.run(_fetch_receipts(sent_txs, block_nums, ws_url, cache=cache))
+
+
+def _read_lines(filename, follow=False, idle_timeout=FOLLOW_IDLE_TIMEOUT_SECS):
+    # Complete lines only; in follow mode waits for new ones until the file stays idle for idle_timeout:
+    idle_since = time.time()
+    while follow and not os.path.exists(filename):
+        if time.time() - idle_since > idle_timeout:
+            return
+        time.sleep(FOLLOW_POLL_SECS)
+    with open(filename, 'r') as f:
+        partial_line = ''
+        while True:
+            line = f.readline()
+            if line:
+                partial_line += line
+                if partial_line.endswith('\n'):
+                    yield partial_line
+                    partial_line = ''
+                    idle_since = time.time()
+                continue
+            if not follow or time.time() - idle_since > idle_timeout:
+                return
+            time.sleep(FOLLOW_POLL_SECS)
+
+
+def read_shard(filename, shard, follow=False, idle_timeout=FOLLOW_IDLE_TIMEOUT_SECS):
+    # Tx events of one worker as (ts, event type, tx hash, account, shard, workload, nonce), in time order:
+    lines = _read_lines(filename, follow, idle_timeout)
+    if filename.endswith('.jsonl'):
+        for event in parse_events(lines):
+            if event['e'] == Event.RUN_END:
+                return
+            if 'h' in event:
+                # Merged logs of distributed runs (distributed.py) tell the agent of every event instead:
+                yield (event['ts'], event['e'], event['h'], event['a'], event.get('ag', shard), event.get('w'), event.get('n'))
+        return
+    # Text logs of older runs:
     for line in lines:
         if "Tx request accepted (swap): " in line:
-            tx_hash = line.split(" |")[0].split("Tx request accepted (swap): ")[1]
-            tx_sent_at[tx_hash] = tx_last_sent_at[tx_hash]
+            (event_type, marker) = (Event.ACCEPTED, "Tx request accepted (swap): ")
         elif "Tx request sent (swap): " in line:
-            tx_hash = line.split(" |")[0].split("Tx request sent (swap): ")[1]
-            dt_str = line.split("]")[0][1:]
-            dt_obj = datetime.strptime(dt_str, "%Y-%m-%d %H:%M:%S,%f")
-            timestamp = dt_obj.timestamp()
-            tx_last_sent_at[tx_hash] = timestamp
-    our_txs = [tx for (tx, ts) in sorted(tx_sent_at.items(), key=lambda x: x[1])]
-    block_num_by_tx_hash = get_block_numbers_by_tx_hash(our_txs, ws_rpc_url)
-    for tx_hash in our_txs:
-        block_number = block_num_by_tx_hash[tx_hash]
-        if block_number is not None and block_number not in blocks:
-            blocks[block_number] = w3.eth.get_block(block_number)
-        block = blocks[block_number] if block_number is not None else None
-        block_timestamp = block['timestamp'] if block_number is not None else None
-        block_txs_cnt = len(block['transactions'] if block_number is not None else [])
-        print(f"sent_at={tx_sent_at[tx_hash]} hash={tx_hash} block_num={block_number} block_timestamp={block_timestamp} block_all_txs={block_txs_cnt}")
-
-
-def parse_swaps(filename):
-    lines = open(filename, 'r').readlines()
-    # Fill tx_infos and blocks:
-    tx_infos = []
-    block_num_by_ts = {}
-    block_all_txs_by_ts = {}
-    block_our_txs_by_ts = {}  # block_ts -> # of our included txs in that block
-    for line in lines:
-        current_ts = float(line.split('sent_at=')[1].split(" ")[0])
-        tx_hash = line.split('hash=')[1].split(" ")[0]
-        block_ts_str = line.split('block_timestamp=')[1].split(" ")[0]
-        block_num_str = line.split('block_num=')[1].split(" ")[0]
-        block_all_txs_str = line.split('block_all_txs=')[1].split(" ")[0]
-        if "None" in block_ts_str:
+            (event_type, marker) = (Event.SENT, "Tx request sent (swap): ")
+        else:
             continue
-        block_ts = int(block_ts_str)
-        block_num_by_ts[block_ts] = block_num_str
-        block_all_txs_by_ts[block_ts] = int(block_all_txs_str)
-        block_our_txs_by_ts[block_ts] = (block_our_txs_by_ts.get(block_ts) or 0) + 1
-        tx_infos.append({
-            "tx_hash": tx_hash,
-            "sent_ts": current_ts,
-            "block_ts": block_ts,
-            "block_num": int(block_num_str),
-        })
-    # Sort blocks:
-    sorted_blocks = sorted(block_our_txs_by_ts.items(), key=lambda x: x[0])
+        tx_hash = line.split(" |")[0].split(marker)[1]
+        account = line.split("] [")[1].split("]")[0]
+        dt_str = line.split("]")[0][1:]
+        timestamp = datetime.strptime(dt_str, "%Y-%m-%d %H:%M:%S,%f").timestamp()
+        yield (timestamp, event_type, tx_hash, account, shard, None, None)
+
+
+class SentTxs:
+    # Accepted txs in compact form: 32-byte hashes in one buffer plus parallel typed arrays.
+    # Only txs sent but not acknowledged yet are kept in a dict, i.e. at most the in-flight window.
+    def __init__(self):
+        self.hashes = bytearray()
+        self.sent_at = array.array('d')
+        self.account_ids = array.array('I')
+        self.shards = array.array('H')
+        self.workload_ids = array.array('B')
+        self.nonces = array.array('q')  # -1: not logged (text logs of older runs)
+        self.accounts = []
+        self.account_id_by_address = {}
+        self.workloads = []
+        self.workload_id_by_name = {}
+        self.last_sent_at = {}
+
+    def __len__(self):
+        return len(self.sent_at)
+
+    def add_event(self, ts, event_type, tx_hash, account, shard, workload=None, nonce=None):
+        key = bytes.fromhex(tx_hash[2:])
+        if event_type == Event.SENT:
+            self.last_sent_at[key] = ts
+        elif event_type == Event.ACCEPTED:
+            sent_at = self.last_sent_at.pop(key, None)
+            if sent_at is None:
+                return
+            if account not in self.account_id_by_address:
+                self.account_id_by_address[account] = len(self.accounts)
+                self.accounts.append(account)
+            if workload not in self.workload_id_by_name:
+                self.workload_id_by_name[workload] = len(self.workloads)
+                self.workloads.append(workload)
+            self.hashes += key
+            self.sent_at.append(sent_at)
+            self.account_ids.append(self.account_id_by_address[account])
+            self.shards.append(shard)
+            self.workload_ids.append(self.workload_id_by_name[workload])
+            self.nonces.append(nonce if nonce is not None else -1)
+        elif event_type in (Event.ABORTED, Event.REPLACED):
+            # A replaced tx that was accepted stays a candidate for its nonce, see superseded():
+            self.last_sent_at.pop(key, None)
+
+    def tx_hash(self, index):
+        return '0x' + self.hashes[32 * index:32 * (index + 1)].hex()
+
+    def account(self, index):
+        return self.accounts[self.account_ids[index]]
+
+    def workload(self, index):
+        return self.workloads[self.workload_ids[index]]
+
+    def indices_by_sent_at(self):
+        return np.argsort(np.frombuffer(self.sent_at, np.float64), kind='stable')
+
+    def superseded(self, block_nums):
+        # Every accepted tx of a nonce (the original and its fee-bumped replacements) is a candidate until the
+        # inclusion is resolved: only the included one counts, or the last one sent if none was included.
+        # Returns the mask of the others:
+        (sent_at, nonces) = (np.frombuffer(self.sent_at, np.float64), np.frombuffer(self.nonces, np.int64))
+        included = block_nums >= 0
+        known = np.flatnonzero(nonces >= 0)
+        keys = (np.frombuffer(self.account_ids, np.uint32)[known].astype(np.int64) << 32) | nonces[known]
+        order = np.lexsort((sent_at[known], included[known], keys))
+        (known, keys) = (known[order], keys[order])
+        last_of_nonce = np.append(keys[1:] != keys[:-1], True)
+        superseded = np.zeros(len(self), bool)
+        superseded[known] = ~last_of_nonce & ~included[known]
+        return superseded
+
+
+class TxHashIndex:
+    # Lookups of hex tx hashes among the 32-byte hashes of SentTxs: binary search over a sorted copy of them
+    # instead of a dict with a Python object per tx.
+    def __init__(self, hashes):
+        keys = np.frombuffer(hashes, dtype='S32')
+        self.order = np.argsort(keys, kind='stable')
+        self.sorted_keys = keys[self.order]
+
+    def find(self, tx_hashes):
+        # Indices of ours among tx_hashes:
+        if not len(tx_hashes) or not len(self.order):
+            return np.empty(0, np.int64)
+        keys = np.array([bytes.fromhex(tx_hash[2:]) for tx_hash in tx_hashes], dtype='S32')
+        positions = np.minimum(np.searchsorted(self.sorted_keys, keys), len(self.sorted_keys) - 1)
+        return self.order[positions[self.sorted_keys[positions] == keys]]
+
+
+def load_sent_txs(filenames, follow=False, idle_timeout=FOLLOW_IDLE_TIMEOUT_SECS):
+    # Streaming k-way merge of all worker logs by timestamp:
+    shards = [read_shard(filename, shard, follow, idle_timeout) for (shard, filename) in enumerate(filenames)]
+    sent_txs = SentTxs()
+    for event in heapq.merge(*shards, key=operator.itemgetter(0)):
+        accepted_count = len(sent_txs)
+        sent_txs.add_event(*event)
+        if follow and len(sent_txs) > accepted_count and len(sent_txs) % 1000 == 0:
+            print(f"Accepted txs so far: {len(sent_txs)}", file=sys.stderr)
+    return sent_txs
+
+
+def parse_combined_logs(filenames, chain_id, follow=False, timeout=INCLUSION_TIMEOUT_SECS, cache_dir=None):
+    sent_txs = load_sent_txs(filenames, follow=follow)
+    if not len(sent_txs):
+        return
+    cache = RpcCache(cache_dir, chain_id.value) if cache_dir else None
+    ws_url = BlockchainData(chain_id).ws_rpc_url()
+    (block_nums, blocks) = resolve_inclusion(sent_txs, ws_url, timeout=timeout, cache=cache)
+    (statuses, gas_used) = fetch_receipts(sent_txs, block_nums, ws_url, cache=cache)
+    if cache is not None:
+        cache.close()
+    superseded = sent_txs.superseded(block_nums)
+    for i in sent_txs.indices_by_sent_at().tolist():
+        if superseded[i]:
+            continue
+        block_number = int(block_nums[i]) if block_nums[i] >= 0 else None
+        (block_timestamp, block_txs_cnt, block_gas_used, block_gas_limit) = blocks[block_number] if block_number is not None else (None, 0, None, None)
+        (status, tx_gas_used) = (int(statuses[i]), int(gas_used[i])) if statuses[i] >= 0 else (None, None)
+        print(f"sent_at={sent_txs.sent_at[i]} hash={sent_txs.tx_hash(i)} block_num={block_number} block_timestamp={block_timestamp} block_all_txs={block_txs_cnt} "
+              f"block_gas_used={block_gas_used} block_gas_limit={block_gas_limit} status={status} gas_used={tx_gas_used} "
+              f"account={sent_txs.account(i)} shard={sent_txs.shards[i]} workload={sent_txs.workload(i)}")
+
+
+BLOCK_TX_OFFSET_SECS = 1.5
+LATENCY_PERCENTILES = (0.5, 0.9, 0.99, 1.0)
+
+
+def _swaps_column(text, name, lines_count, dtype, missing='-1'):
+    # One field of every line (regex over the whole file, no per-line Python work); 'None' becomes `missing`:
+    separator = '\n' if name == 'sent_at' else ' '  # a literal prefix keeps the regex fast
+    values = re.findall(separator + name + r'=(\S*)', text)
+    if len(values) != lines_count:
+        values = [missing] * lines_count  # older swaps.log have no account/shard
+    if dtype is str:
+        return values
+    values = np.array(values)
+    return np.where(values == 'None', missing, values).astype(dtype)
+
+
+def read_swaps(filename):
+    # swaps.log as arrays, one entry per tx (block and receipt fields are -1 for txs that were not included):
+    text = '\n' + open(filename, 'r').read()
+    lines_count = text.count('\nsent_at=')
+    account_id_by_name = {}
+    accounts = _swaps_column(text, 'account', lines_count, str, missing='')
+    account_ids = np.fromiter((account_id_by_name.setdefault(account, len(account_id_by_name)) for account in accounts), np.int64, len(accounts))
+    workload_id_by_name = {}
+    workloads = _swaps_column(text, 'workload', lines_count, str, missing='None')  # older swaps.log have a single workload
+    workload_ids = np.fromiter((workload_id_by_name.setdefault(workload, len(workload_id_by_name)) for workload in workloads), np.int64, len(workloads))
+    return {
+        'sent_ts': _swaps_column(text, 'sent_at', lines_count, np.float64),
+        'block_ts': _swaps_column(text, 'block_timestamp', lines_count, np.int64),
+        'block_num': _swaps_column(text, 'block_num', lines_count, np.int64),
+        'block_all_txs': _swaps_column(text, 'block_all_txs', lines_count, np.int64),
+        'block_gas_used': _swaps_column(text, 'block_gas_used', lines_count, np.int64),
+        'block_gas_limit': _swaps_column(text, 'block_gas_limit', lines_count, np.int64),
+        'status': _swaps_column(text, 'status', lines_count, np.int64),  # -1: no receipt (older swaps.log)
+        'gas_used': _swaps_column(text, 'gas_used', lines_count, np.int64),
+        'account_ids': account_ids,
+        'account_names': list(account_id_by_name),
+        'shards': _swaps_column(text, 'shard', lines_count, np.int64, missing='0'),
+        'workload_ids': workload_ids,
+        'workload_names': list(workload_id_by_name),
+    }
+
+
+def latency_percentiles(sorted_latencies):
+    # Nearest-rank percentiles:
+    if len(sorted_latencies) == 0:
+        return {}
+    indices = np.minimum(len(sorted_latencies) - 1, (np.array(LATENCY_PERCENTILES) * len(sorted_latencies)).astype(np.int64))
+    return {('max' if share == 1.0 else f"p{share * 100:g}"): float(sorted_latencies[i]) for (share, i) in zip(LATENCY_PERCENTILES, indices)}
+
+
+def group_stats(group_ids, groups_count, sent_ts, block_ts, included):
+    # Per-group tx counts, latency percentiles and inclusion span, with one sort over all txs:
+    sent_counts = np.bincount(group_ids, minlength=groups_count)
+    included_counts = np.bincount(group_ids[included], minlength=groups_count)
+    latencies = (block_ts - sent_ts)[included]
+    order = np.lexsort((latencies, group_ids[included]))
+    (latencies, ids) = (latencies[order], group_ids[included][order])
+    starts = np.searchsorted(ids, np.arange(groups_count), side='left')
+    return [{
+        'sent_txs': int(sent_counts[group_id]),
+        'included_txs': int(included_counts[group_id]),
+        'latency_secs': latency_percentiles(latencies[starts[group_id]:starts[group_id] + included_counts[group_id]]),
+    } for group_id in range(groups_count)]
+
+
+def group_blocks(txs):
+    # Blocks with our txs in ASC order of timestamp (blocks sharing a timestamp are counted together):
+    included = txs['block_ts'] >= 0
+    block_ts = txs['block_ts'][included]
+    (blocks_ts, block_our_txs) = np.unique(block_ts, return_counts=True)
+    last_indices = len(block_ts) - 1 - np.unique(block_ts[::-1], return_index=True)[1]
+    return {
+        'block_ts': blocks_ts,
+        'block_num': txs['block_num'][included][last_indices],
+        'all_txs': txs['block_all_txs'][included][last_indices],
+        'our_txs': block_our_txs,
+    }
+
+
+def gas_stats(txs):
+    # Successful TPS, gas throughput and block gas utilization from the receipts and blocks in swaps.log
+    # (None for logs without receipts). The max TPS is what the chain could include if its blocks were
+    # full of our swaps: block gas limit / block time / median gas of a successful swap.
+    included = txs['block_ts'] >= 0
+    if not (included & (txs['status'] >= 0)).any():
+        return None
+    succeeded = included & (txs['status'] == 1)
+    (block_nums, indices) = np.unique(txs['block_num'][included], return_index=True)
+    (block_ts, block_gas_used, block_gas_limit) = (txs[column][included][indices] for column in ('block_ts', 'block_gas_used', 'block_gas_limit'))
+    total_secs = int(block_ts.max() - block_ts.min())
+    block_time = (block_ts.max() - block_ts.min()) / (block_nums[-1] - block_nums[0]) if block_nums[-1] > block_nums[0] else None
+    our_gas = int(txs['gas_used'][included & (txs['gas_used'] >= 0)].sum())
+    swap_gas = float(np.median(txs['gas_used'][succeeded])) if succeeded.any() else None
+    gas_limit = float(np.median(block_gas_limit))
+    return {
+        'succeeded_txs': int(succeeded.sum()),
+        'reverted_txs': int((included & (txs['status'] == 0)).sum()),
+        'success_tps': succeeded.sum() / total_secs if total_secs > 0 else None,
+        'mgas_per_sec': our_gas / total_secs / 1e6 if total_secs > 0 else None,
+        'block_gas_utilization': block_gas_used.sum() / block_gas_limit.sum(),  # all txs of the blocks with ours
+        'our_gas_share': our_gas / block_gas_limit.sum(),
+        'block_gas_limit': gas_limit,
+        'block_time_secs': block_time,
+        'median_swap_gas': swap_gas,
+        'max_tps': gas_limit / block_time / swap_gas if block_time and swap_gas else None,
+    }
+
+
+def workload_stats(txs, total_secs, gas=None):
+    # Per tx kind TPS: a kind with a much lower success TPS than its gas-bound max TPS is limited by contention
+    # (e.g. all swaps of one pool touch the same storage slots), not by the chain's ingest:
+    included = txs['block_ts'] >= 0
+    stats = group_stats(txs['workload_ids'], len(txs['workload_names']), txs['sent_ts'], txs['block_ts'], included)
+    for (workload_id, workload_stats) in enumerate(stats):
+        workload_stats['tps'] = workload_stats['included_txs'] / total_secs if total_secs > 0 else None
+        if gas is None:
+            continue
+        succeeded = (txs['workload_ids'] == workload_id) & included & (txs['status'] == 1)
+        median_gas = float(np.median(txs['gas_used'][succeeded])) if succeeded.any() else None
+        workload_stats['succeeded_txs'] = int(succeeded.sum())
+        workload_stats['success_tps'] = workload_stats['succeeded_txs'] / total_secs if total_secs > 0 else None
+        workload_stats['median_gas'] = median_gas
+        workload_stats['max_tps'] = gas['block_gas_limit'] / gas['block_time_secs'] / median_gas if gas['block_time_secs'] and median_gas else None
+    return stats
+
+
+def parse_swaps(filename, json_filename=None):
+    txs = read_swaps(filename)
+    included = txs['block_ts'] >= 0
+    (sent_ts, block_ts) = (txs['sent_ts'], txs['block_ts'])
+    grouped_blocks = group_blocks(txs)
+    (blocks_ts, blocks_num, blocks_all_txs, block_our_txs) = (grouped_blocks['block_ts'], grouped_blocks['block_num'], grouped_blocks['all_txs'], grouped_blocks['our_txs'])
+    tx_sent_by_that_time = np.searchsorted(np.sort(sent_ts[included]), blocks_ts + BLOCK_TX_OFFSET_SECS, side='left')  # approx
+    cum_txs = np.cumsum(block_our_txs)
     # TPS estimate:
-    BLOCK_TX_OFFSET_SECS = 1.5
-    (min_block_ts, max_block_ts) = (sorted_blocks[0][0], sorted_blocks[-1][0])
+    included_count = int(included.sum())
+    (min_block_ts, max_block_ts) = (int(blocks_ts[0]), int(blocks_ts[-1]))
     total_secs = (max_block_ts - min_block_ts)
-    tps_str = f"{len(tx_infos) / total_secs :.2f}" if total_secs > 0 else "∞"
-    print(f"TPS: {tps_str} txs/s ({len(tx_infos)} txs in {total_secs}s)")
+    tps_str = f"{included_count / total_secs :.2f}" if total_secs > 0 else "∞"
+    print(f"TPS: {tps_str} txs/s ({included_count} txs in {total_secs}s)")
+    gas = gas_stats(txs)
+    if gas is None:
+        print("Receipts: none in swaps.log, success rate and gas are not known (re-run `logs_parser.py swaps`)")
+    else:
+        success_tps_str = f"{gas['success_tps']:.2f}" if gas['success_tps'] is not None else "∞"
+        mgas_str = f"{gas['mgas_per_sec']:.2f}" if gas['mgas_per_sec'] is not None else "∞"
+        print(f"Successful TPS: {success_tps_str} txs/s ({gas['succeeded_txs']} succeeded, {gas['reverted_txs']} reverted of {included_count} included)")
+        print(f"Gas: {mgas_str} Mgas/s by our txs, block gas utilization {100 * gas['block_gas_utilization']:.1f}% "
+              f"(our txs {100 * gas['our_gas_share']:.1f}%) of the {gas['block_gas_limit'] / 1e6:g}M gas limit")
+        if gas['max_tps'] is not None:
+            print(f"Max TPS: {gas['max_tps']:.2f} txs/s = {gas['block_gas_limit'] / 1e6:g}M gas / {gas['block_time_secs']:.2f}s block time / {gas['median_swap_gas']:.0f} gas per swap")
+    latencies = latency_percentiles(np.sort((block_ts - sent_ts)[included]))
+    print(f"Latency (sent -> block timestamp): " + ", ".join(f"{name}={value:.2f}s" for (name, value) in latencies.items()))
     # For blocks in ASC order provide txs included and cumulative infromation
-    cum_txs = 0
-    for (block_ts, block_our_txs) in sorted_blocks:
-        block_num = block_num_by_ts[block_ts]
-        block_all_txs = block_all_txs_by_ts[block_ts]
-        tx_sent_by_that_time = len(list(filter(lambda tx: tx['sent_ts'] < block_ts + BLOCK_TX_OFFSET_SECS, tx_infos)))  # approx
-        cum_txs += block_our_txs
-        elapsed_secs = block_ts - min_block_ts
-        print(f"Block #{block_num} with ts={block_ts} | all_txs_in_block={block_all_txs:4}, our_txs_in_block={block_our_txs:4}, " + \
-              f"~tx_sent_by_that_time={tx_sent_by_that_time:4}, cum_txs_confirmed={cum_txs:4}, " + \
-              f"cum_elapsed_secs={elapsed_secs:3} | cum_tps={'-' if elapsed_secs == 0 else f'{cum_txs / elapsed_secs:.2f}'}")
+    blocks = []
+    for i in range(len(blocks_ts)):
+        elapsed_secs = int(blocks_ts[i]) - min_block_ts
+        print(f"Block #{blocks_num[i]} with ts={blocks_ts[i]} | all_txs_in_block={blocks_all_txs[i]:4}, our_txs_in_block={block_our_txs[i]:4}, " + \
+              f"~tx_sent_by_that_time={tx_sent_by_that_time[i]:4}, cum_txs_confirmed={cum_txs[i]:4}, " + \
+              f"cum_elapsed_secs={elapsed_secs:3} | cum_tps={'-' if elapsed_secs == 0 else f'{cum_txs[i] / elapsed_secs:.2f}'}")
+        blocks.append({
+            'block_num': int(blocks_num[i]),
+            'block_ts': int(blocks_ts[i]),
+            'all_txs': int(blocks_all_txs[i]),
+            'our_txs': int(block_our_txs[i]),
+            'sent_by_that_time': int(tx_sent_by_that_time[i]),
+            'cum_txs': int(cum_txs[i]),
+            'cum_tps': cum_txs[i] / elapsed_secs if elapsed_secs > 0 else None,
+        })
+    # Offered (all sent txs, included or not) vs achieved (included) rate for every second since the first tx was sent:
+    first_sent_ts = sent_ts.min()
+    offered_seconds = np.floor(sent_ts - first_sent_ts).astype(np.int64)
+    included_seconds = np.floor(block_ts[included] - first_sent_ts).astype(np.int64)
+    min_second = int(min(offered_seconds.min(), included_seconds.min()))
+    max_second = int(max(offered_seconds.max(), included_seconds.max()))
+    offered_by_second = np.bincount(offered_seconds - min_second, minlength=max_second - min_second + 1)
+    included_by_second = np.bincount(included_seconds - min_second, minlength=max_second - min_second + 1)
+    for (i, second) in enumerate(range(min_second, max_second + 1)):
+        print(f"Second {second:+4} | offered_txs={offered_by_second[i]:4}, included_txs={included_by_second[i]:4}")
+    # Per-shard and per-account breakdowns:
+    shard_ids = txs['shards']
+    shards_stats = group_stats(shard_ids, int(shard_ids.max()) + 1, sent_ts, block_ts, included)
+    if len(shards_stats) > 1:
+        for (shard, stats) in enumerate(shards_stats):
+            print(f"Shard {shard:3} | sent_txs={stats['sent_txs']:6}, included_txs={stats['included_txs']:6}, " +
+                  ", ".join(f"latency_{name}={value:.2f}s" for (name, value) in stats['latency_secs'].items()))
+    workloads_stats = workload_stats(txs, total_secs, gas)
+    if len(workloads_stats) > 1:
+        for (workload, stats) in zip(txs['workload_names'], workloads_stats):
+            rates = [f"{name}={'-' if stats[name] is None else f'{stats[name]:.2f}'}" for name in ('tps', 'success_tps', 'max_tps') if name in stats]
+            print(f"Workload {workload:>12} | sent_txs={stats['sent_txs']:6}, included_txs={stats['included_txs']:6}, " + ", ".join(rates) + ", " +
+                  ", ".join(f"latency_{name}={value:.2f}s" for (name, value) in stats['latency_secs'].items()))
+    accounts_stats = group_stats(txs['account_ids'], len(txs['account_names']), sent_ts, block_ts, included)
+    if json_filename:
+        with open(json_filename, 'w') as f:
+            json.dump({
+                'sent_txs': len(sent_ts),
+                'included_txs': included_count,
+                'first_block_ts': min_block_ts,
+                'last_block_ts': max_block_ts,
+                'total_secs': total_secs,
+                'tps': included_count / total_secs if total_secs > 0 else None,
+                'latency_secs': latencies,
+                'gas': gas,
+                'blocks': blocks,
+                'seconds': [
+                    {'second': second, 'offered_txs': int(offered_by_second[i]), 'included_txs': int(included_by_second[i])}
+                    for (i, second) in enumerate(range(min_second, max_second + 1))
+                ],
+                'shards': {str(shard): stats for (shard, stats) in enumerate(shards_stats) if stats['sent_txs'] > 0},
+                'workloads': dict(zip(txs['workload_names'], workloads_stats)),
+                'accounts': {str(account): stats for (account, stats) in zip(txs['account_names'], accounts_stats) if account},
+            }, f, indent=1)
 
 
 if __name__ == '__main__':
-    # 1. Combine all logs into one file:
-    # cat tps0{0..9}.log > tps.log
-
-    # 2. Create swaps.log: all swaps sorted by timestamp with block information
-    # python3 logs_parser.py > logs/swaps.log
-    parse_combined_logs('logs/tps.log', ChainId.ZKSYNC_ERA_MAINNET)
-
-    # 3. Create tps-results.log: all blocks sorted by timestamp with infromation of txs included
-    # python3 logs_parser.py > logs/tps-results.log
-    # parse_swaps('logs/swaps.log')
-    pass
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    # 1. Create swaps.log: all swaps sorted by timestamp with block information
+    # python3 logs_parser.py swaps logs/events-*.jsonl > logs/swaps.log
+    # (the logs of all servers are merged by timestamp, text logs of older runs work as well: logs/tps0*.log)
+    swaps_parser = subparsers.add_parser('swaps', help='merge worker logs and resolve blocks of all accepted txs')
+    swaps_parser.add_argument('logs', nargs='*', help='worker logs (default: logs/events-*.jsonl)')
+    swaps_parser.add_argument('--chain', choices=[chain.name for chain in ChainId], default=ChainId.ZKSYNC_ERA_MAINNET.name)
+    swaps_parser.add_argument('--follow', action='store_true', help='tail logs that are still being written')
+    swaps_parser.add_argument('--rpc-cache', default='cache/rpc', help='directory of the per-chain RPC cache ("" to disable)')
+    swaps_parser.add_argument('--timeout', type=float, default=INCLUSION_TIMEOUT_SECS, help='secs to wait for txs that are not included')
+    # 2. Create tps-results.log: all blocks sorted by timestamp with infromation of txs included
+    # python3 logs_parser.py tps logs/swaps.log > logs/tps-results.log
+    tps_parser = subparsers.add_parser('tps', help='per-block and overall TPS from swaps.log')
+    tps_parser.add_argument('swaps_log', nargs='?', default='logs/swaps.log')
+    tps_parser.add_argument('--json', help='machine-readable results (default: tps-results.json next to swaps_log, "" to disable)')
+    args = parser.parse_args()
+    if args.command == 'swaps':
+        parse_combined_logs(args.logs or sorted(glob.glob('logs/events-*.jsonl')), ChainId[args.chain], follow=args.follow, timeout=args.timeout, cache_dir=args.rpc_cache)
+    elif args.command == 'tps':
+        parse_swaps(args.swaps_log, os.path.join(os.path.dirname(args.swaps_log), 'tps-results.json') if args.json is None else args.json)
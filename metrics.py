@@ -0,0 +1,254 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import glob
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+
+class Stage:
+    SIGN = 'sign'  # signing of a tx (pre-signing and replacements)
+    QUEUE = 'queue'  # tx submitted -> written to the websocket
+    SERIALIZE = 'serialize'  # JSON encoding of a frame (per tx)
+    SEND = 'send'  # ws.send of a frame (per tx)
+    ACK = 'ack'  # request written -> RPC response
+    RETRY = 'retry'  # tx rejected by the RPC -> resent
+
+
+SUB_BUCKET_BITS = 5  # 32 linear sub-buckets per power of 2, i.e. ~3% precision
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+MAX_VALUE_US = (1 << 32) - 1  # ~71 min
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+SNAPSHOT_INTERVAL_SECS = 1.0
+
+
+def bucket_index(value_us):
+    if value_us < 2 * SUB_BUCKETS:
+        return value_us
+    shift = value_us.bit_length() - SUB_BUCKET_BITS - 1
+    return (shift + 1) * SUB_BUCKETS + (value_us >> shift) - SUB_BUCKETS
+
+
+def bucket_value(index):
+    # Upper bound of the bucket, in us:
+    if index < 2 * SUB_BUCKETS:
+        return index
+    shift = index // SUB_BUCKETS - 1
+    return ((index % SUB_BUCKETS + SUB_BUCKETS + 1) << shift) - 1
+
+
+class Histogram:
+    # HDR-style log-linear histogram of latencies in microseconds. Counts are kept sparse (bucket -> count),
+    # so the memory of a histogram is bounded by the number of buckets whatever the number of values:
+    # (32 - SUB_BUCKET_BITS + 1) * SUB_BUCKETS = 896 for values up to MAX_VALUE_US.
+    __slots__ = ('counts', 'count', 'total_us', 'max_us')
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total_us = 0
+        self.max_us = 0
+
+    def record(self, secs, count=1):
+        value_us = min(MAX_VALUE_US, max(0, int(secs * 1e6)))
+        self.add(bucket_index(value_us), value_us, count)
+
+    def add(self, index, value_us, count):
+        counts = self.counts
+        counts[index] = counts.get(index, 0) + count
+        self.count += count
+        self.total_us += value_us * count
+        if value_us > self.max_us:
+            self.max_us = value_us
+
+    def merge(self, other):
+        for (index, count) in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total_us += other.total_us
+        self.max_us = max(self.max_us, other.max_us)
+
+    def quantile(self, share):
+        # In secs, nearest rank:
+        if self.count == 0:
+            return float('nan')
+        rank = max(1, int(share * self.count + 0.5))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(bucket_value(index), self.max_us) / 1e6
+        return self.max_us / 1e6
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean': self.total_us / self.count / 1e6 if self.count else float('nan'),
+            **{f"p{100 * share:g}": self.quantile(share) for share in QUANTILES},
+            'max': self.max_us / 1e6,
+        }
+
+    def to_json(self):
+        return {'counts': dict(self.counts), 'count': self.count, 'sum_us': self.total_us, 'max_us': self.max_us}
+
+    @classmethod
+    def from_json(cls, data):
+        histogram = cls()
+        histogram.counts = {int(index): count for (index, count) in data['counts'].items()}
+        histogram.count = data['count']
+        histogram.total_us = data['sum_us']
+        histogram.max_us = data['max_us']
+        return histogram
+
+
+class Metrics:
+    # Per-stage latency histograms of a worker: in total, per endpoint and per account. record() is a few
+    # dict updates, the snapshots are serialized and written by a background thread (see start()).
+    def __init__(self, path=None, snapshot_interval=SNAPSHOT_INTERVAL_SECS):
+        self.path = path
+        self.snapshot_interval = snapshot_interval
+        self.histograms = {}  # (stage, scope, key) -> Histogram; scope: 'all', 'endpoint' or 'account'
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def _histogram(self, key):
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        return histogram
+
+    def record(self, stage, secs, account=None, endpoint=None, count=1):
+        # The bucket is computed once for all scopes:
+        value_us = min(MAX_VALUE_US, max(0, int(secs * 1e6)))
+        index = bucket_index(value_us)
+        self._histogram((stage, 'all', '')).add(index, value_us, count)
+        if endpoint is not None:
+            self._histogram((stage, 'endpoint', endpoint)).add(index, value_us, count)
+        if account is not None:
+            self._histogram((stage, 'account', account)).add(index, value_us, count)
+
+    def merge(self, other):
+        for (key, histogram) in other.histograms.items():
+            self._histogram(key).merge(histogram)
+
+    def to_json(self):
+        # list() and dict() copies are atomic, so this is safe while the event loop keeps recording:
+        return [[*key, histogram.to_json()] for (key, histogram) in list(self.histograms.items())]
+
+    @classmethod
+    def from_json(cls, data):
+        metrics = cls()
+        for (stage, scope, key, histogram) in data:
+            metrics.histograms[(stage, scope, key)] = Histogram.from_json(histogram)
+        return metrics
+
+    def summary(self):
+        # {stage: {'all': {...}, 'endpoint': {name: {...}}, 'account': {address: {...}}}}
+        summary = {}
+        for ((stage, scope, key), histogram) in sorted(self.histograms.items()):
+            stage_summary = summary.setdefault(stage, {})
+            if scope == 'all':
+                stage_summary['all'] = histogram.summary()
+            else:
+                stage_summary.setdefault(scope, {})[key] = histogram.summary()
+        return summary
+
+    def to_prometheus(self):
+        # Totals and per endpoint only, per-account series would explode the cardinality (they are in the JSON):
+        lines = ['# TYPE tps_stage_latency_seconds summary']
+        for ((stage, scope, key), histogram) in sorted(self.histograms.items()):
+            if scope == 'account':
+                continue
+            labels = f'stage="{stage}"' + (f',endpoint="{key}"' if scope == 'endpoint' else '')
+            for share in QUANTILES:
+                lines.append(f'tps_stage_latency_seconds{{{labels},quantile="{share}"}} {histogram.quantile(share)}')
+            lines.append(f'tps_stage_latency_seconds_sum{{{labels}}} {histogram.total_us / 1e6}')
+            lines.append(f'tps_stage_latency_seconds_count{{{labels}}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def log_summary(self):
+        endpoints = {key for (_, scope, key) in self.histograms if scope == 'endpoint'}
+        for ((stage, scope, key), histogram) in sorted(self.histograms.items()):
+            if scope == 'account' or (scope == 'endpoint' and len(endpoints) == 1):
+                continue
+            summary = histogram.summary()
+            logger.info(
+                f"Stage {stage}{f' [{key}]' if key else ''}: count={summary['count']} mean={1000 * summary['mean']:.3f}ms "
+                f"p50={1000 * summary['p50']:.3f}ms p99={1000 * summary['p99']:.3f}ms max={1000 * summary['max']:.3f}ms"
+            )
+
+    def start(self):
+        if self.path is not None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self.thread = threading.Thread(target=self._writer, daemon=True)
+            self.thread.start()
+
+    def close(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def write_snapshot(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(json.dumps(self.to_json(), separators=(',', ':')))
+        os.replace(tmp_path, self.path)
+
+    def _writer(self):
+        while not self.stopped.wait(self.snapshot_interval):
+            self.write_snapshot()
+        self.write_snapshot()
+
+
+def load_metrics(paths):
+    # Merged snapshots of all workers:
+    metrics = Metrics()
+    for path in paths:
+        try:
+            with open(path, 'r') as f:
+                metrics.merge(Metrics.from_json(json.load(f)))
+        except (OSError, ValueError):
+            continue  # not written yet
+    return metrics
+
+
+class MetricsServer:
+    # Live metrics of all workers of the instance on a local port: /metrics (Prometheus text) and
+    # /metrics.json (per-stage summaries in total, per endpoint and per account).
+    def __init__(self, snapshots_pattern, port, host='127.0.0.1'):
+        pattern = snapshots_pattern
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                metrics = load_metrics(glob.glob(pattern))
+                if self.path.startswith('/metrics.json'):
+                    (body, content_type) = (json.dumps(metrics.summary()), 'application/json')
+                elif self.path.startswith('/metrics'):
+                    (body, content_type) = (metrics.to_prometheus(), 'text/plain; version=0.0.4')
+                else:
+                    self.send_error(404)
+                    return
+                body = body.encode()
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *_args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        logger.info(f"Metrics on http://{self.server.server_address[0]}:{self.server.server_address[1]}/metrics (and /metrics.json)")
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,397 @@
+from aiohttp import web
+from eth_account import Account
+from web3 import Web3
+
+import argparse
+import asyncio
+import collections
+import itertools
+import json
+import logging
+import random
+import rlp
+import time
+
+from rpc import RpcError
+
+logging.basicConfig(format='[%(asctime)s] %(message)s')
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+
+class MockNodeConfig:
+    def __init__(
+        self,
+        chain_id=31337,
+        block_time=1.0,
+        block_gas_limit=30_000_000,
+        tx_gas_used=105_000,
+        mempool_capacity=100_000,
+        gas_price=1_000_000_000,
+        min_gas_price=0,
+        ack_latency=0.0,
+        known_tx_rate=0.0,
+        underpriced_rate=0.0,
+        drop_rate=0.0,
+        revert_rate=0.0,
+        idless_error_rate=0.0,
+        recover_senders=True,
+        block_receipts=True,
+    ):
+        self.chain_id = chain_id
+        self.block_time = block_time  # secs
+        self.block_gas_limit = block_gas_limit
+        self.tx_gas_used = tx_gas_used  # gas used by every tx (capped by its gas limit)
+        self.mempool_capacity = mempool_capacity  # max pending txs
+        self.gas_price = gas_price  # returned by eth_gasPrice
+        self.min_gas_price = min_gas_price  # txs below are rejected as underpriced
+        self.ack_latency = ack_latency  # secs before a request is answered
+        self.known_tx_rate = known_tx_rate  # share of accepted txs answered with "known transaction"
+        self.underpriced_rate = underpriced_rate  # share of txs rejected with "transaction underpriced"
+        self.drop_rate = drop_rate  # share of accepted txs silently evicted from the mempool (stalls the sender)
+        self.revert_rate = revert_rate  # share of included txs with a failed receipt (status 0x0)
+        self.idless_error_rate = idless_error_rate  # share of eth_sendRawTransaction messages answered with an error without id
+        self.recover_senders = recover_senders  # False skips ecrecover (and per-sender nonce ordering)
+        self.block_receipts = block_receipts  # False: eth_getBlockReceipts is not available, like on some L2 RPCs
+
+
+def to_hex(value):
+    return hex(value) if isinstance(value, int) else '0x' + value.hex()
+
+
+def decode_raw_transaction(raw_tx):
+    if raw_tx[0] == 2:
+        # EIP-1559: [chainId, nonce, maxPriorityFeePerGas, maxFeePerGas, gas, to, value, data, accessList, v, r, s]
+        fields = rlp.decode(raw_tx[1:])
+        (nonce, gas_price, gas, to, value, data) = (fields[1], fields[3], fields[4], fields[5], fields[6], fields[7])
+    elif raw_tx[0] >= 0xc0:
+        # Legacy: [nonce, gasPrice, gas, to, value, data, v, r, s]
+        (nonce, gas_price, gas, to, value, data) = rlp.decode(raw_tx)[:6]
+    else:
+        raise RpcError(-32602, f"transaction type not supported: {raw_tx[0]}")
+    return {
+        'nonce': int.from_bytes(nonce, 'big'),
+        'gasPrice': int.from_bytes(gas_price, 'big'),
+        'gas': int.from_bytes(gas, 'big'),
+        'to': Web3.to_checksum_address(to) if to else None,
+        'value': int.from_bytes(value, 'big'),
+        'input': data,
+    }
+
+
+class MockNode:
+    def __init__(self, config: MockNodeConfig):
+        self.config = config
+        self.blocks = []
+        self.txs_by_hash = {}
+        self.block_number_by_tx_hash = {}
+        self.pending_by_sender = collections.OrderedDict()  # sender -> {nonce: tx_hash}, in arrival order
+        self.pending_count = 0
+        self.nonce_by_sender = collections.defaultdict(int)  # next confirmed nonce
+        self.subscriptions = {}  # subscription id -> websocket
+        self.subscription_ids = itertools.count(1)
+        self.requests_count = 0
+        self._produce_block([])
+
+    # ===== Chain =====
+
+    def _produce_block(self, tx_hashes):
+        number = len(self.blocks)
+        parent_hash = self.blocks[-1]['hash'] if self.blocks else '0x' + '00' * 32
+        gas_used = sum(self.txs_by_hash[tx_hash]['gasUsed'] for tx_hash in tx_hashes)
+        block = {
+            'number': number,
+            'hash': Web3.keccak(number.to_bytes(32, 'big')).hex(),
+            'parentHash': parent_hash,
+            'timestamp': int(time.time()),
+            'gasLimit': self.config.block_gas_limit,
+            'gasUsed': gas_used,
+            'miner': '0x' + '00' * 20,
+            'transactions': tx_hashes,
+        }
+        for (index, tx_hash) in enumerate(tx_hashes):
+            self.block_number_by_tx_hash[tx_hash] = number
+            self.txs_by_hash[tx_hash]['transactionIndex'] = index
+        self.blocks.append(block)
+        return block
+
+    def _select_block_txs(self):
+        # Consecutive nonces of every sender, senders in order of arrival, until the block is full:
+        selected = []
+        gas_left = self.config.block_gas_limit
+        for (sender, pending) in list(self.pending_by_sender.items()):
+            while gas_left > 0:
+                tx_hash = pending.get(self.nonce_by_sender[sender])
+                if tx_hash is None:
+                    break
+                gas_used = self.txs_by_hash[tx_hash]['gasUsed']
+                if gas_used > gas_left:
+                    gas_left = 0
+                    break
+                gas_left -= gas_used
+                del pending[self.nonce_by_sender[sender]]
+                self.nonce_by_sender[sender] += 1
+                self.pending_count -= 1
+                selected.append(tx_hash)
+            if not pending:
+                del self.pending_by_sender[sender]
+                if not self.config.recover_senders:
+                    del self.nonce_by_sender[sender]
+            if gas_left <= 0:
+                break
+        return selected
+
+    async def produce_blocks(self):
+        while True:
+            await asyncio.sleep(self.config.block_time)
+            block = self._produce_block(self._select_block_txs())
+            header = {key: (to_hex(value) if isinstance(value, int) else value) for (key, value) in block.items() if key != 'transactions'}
+            for (subscription_id, ws) in list(self.subscriptions.items()):
+                notification = {'jsonrpc': '2.0', 'method': 'eth_subscription', 'params': {'subscription': subscription_id, 'result': header}}
+                try:
+                    await ws.send_str(json.dumps(notification))
+                except ConnectionResetError:
+                    del self.subscriptions[subscription_id]
+
+    def _add_transaction(self, raw_tx_hex):
+        raw_tx = bytes.fromhex(raw_tx_hex[2:] if raw_tx_hex.startswith('0x') else raw_tx_hex)
+        tx_hash = Web3.keccak(raw_tx).hex()
+        if tx_hash in self.txs_by_hash:
+            raise RpcError(-32000, f"known transaction: {tx_hash[2:]}")
+        if random.random() < self.config.underpriced_rate:
+            raise RpcError(-32000, "transaction underpriced")
+        try:
+            tx = decode_raw_transaction(raw_tx)
+        except rlp.DecodingError as e:
+            raise RpcError(-32602, f"rlp: {e}")
+        if tx['gasPrice'] < self.config.min_gas_price:
+            raise RpcError(-32000, "transaction underpriced")
+        if self.pending_count >= self.config.mempool_capacity:
+            raise RpcError(-32000, "txpool is full")
+        # Without sender recovery every tx is its own "sender", i.e. txs are not ordered by nonce:
+        sender = Account.recover_transaction(raw_tx) if self.config.recover_senders else tx_hash
+        if self.config.recover_senders and tx['nonce'] < self.nonce_by_sender[sender]:
+            raise RpcError(-32000, "nonce too low")
+        tx_nonce = tx['nonce'] if self.config.recover_senders else 0
+        self.txs_by_hash[tx_hash] = {
+            **tx,
+            'hash': tx_hash,
+            'from': sender if self.config.recover_senders else None,
+            'gasUsed': min(tx['gas'], self.config.tx_gas_used),
+            'status': 0 if random.random() < self.config.revert_rate else 1,
+        }
+        if random.random() < self.config.drop_rate:
+            return tx_hash
+        self.pending_by_sender.setdefault(sender, {})[tx_nonce] = tx_hash
+        self.pending_count += 1
+        if random.random() < self.config.known_tx_rate:
+            raise RpcError(-32000, f"known transaction: {tx_hash[2:]}")
+        return tx_hash
+
+    # ===== JSON-RPC =====
+
+    def _get_block(self, block_tag):
+        if block_tag in ('latest', 'pending', 'safe', 'finalized'):
+            return self.blocks[-1]
+        if block_tag == 'earliest':
+            return self.blocks[0]
+        number = int(block_tag, 16)
+        return self.blocks[number] if number < len(self.blocks) else None
+
+    def _format_tx(self, tx_hash):
+        tx = self.txs_by_hash[tx_hash]
+        block_number = self.block_number_by_tx_hash.get(tx_hash)
+        return {
+            'hash': tx_hash,
+            'nonce': to_hex(tx['nonce']),
+            'from': tx['from'],
+            'to': tx['to'],
+            'gas': to_hex(tx['gas']),
+            'gasPrice': to_hex(tx['gasPrice']),
+            'value': to_hex(tx['value']),
+            'input': to_hex(tx['input']),
+            'blockNumber': to_hex(block_number) if block_number is not None else None,
+            'blockHash': self.blocks[block_number]['hash'] if block_number is not None else None,
+            'transactionIndex': to_hex(tx['transactionIndex']) if block_number is not None else None,
+        }
+
+    def _format_block(self, block, full_transactions):
+        formatted = {key: (to_hex(value) if isinstance(value, int) else value) for (key, value) in block.items()}
+        if full_transactions:
+            formatted['transactions'] = [self._format_tx(tx_hash) for tx_hash in block['transactions']]
+        return formatted
+
+    def _format_receipt(self, tx_hash):
+        block_number = self.block_number_by_tx_hash.get(tx_hash)
+        if block_number is None:
+            return None
+        tx = self.txs_by_hash[tx_hash]
+        return {
+            'transactionHash': tx_hash,
+            'transactionIndex': to_hex(tx['transactionIndex']),
+            'blockNumber': to_hex(block_number),
+            'blockHash': self.blocks[block_number]['hash'],
+            'from': tx['from'],
+            'to': tx['to'],
+            'gasUsed': to_hex(tx['gasUsed']),
+            'cumulativeGasUsed': to_hex(tx['gasUsed']),
+            'effectiveGasPrice': to_hex(tx['gasPrice']),
+            'status': to_hex(tx['status']),
+            'logs': [],
+        }
+
+    def call(self, method, params, ws=None):
+        if method == 'eth_chainId':
+            return to_hex(self.config.chain_id)
+        if method == 'net_version':
+            return str(self.config.chain_id)
+        if method == 'eth_gasPrice':
+            return to_hex(self.config.gas_price)
+        if method == 'eth_blockNumber':
+            return to_hex(len(self.blocks) - 1)
+        if method == 'eth_getBalance':
+            return to_hex(10 ** 24)
+        if method == 'eth_call':
+            # Contracts are not executed: every view returns a large uint (balances and allowances are plenty)
+            return '0x' + f"{10 ** 24:064x}"
+        if method == 'eth_getTransactionCount':
+            sender = Web3.to_checksum_address(params[0])
+            nonce = self.nonce_by_sender[sender]
+            if len(params) > 1 and params[1] == 'pending':
+                while nonce in self.pending_by_sender.get(sender, {}):
+                    nonce += 1
+            return to_hex(nonce)
+        if method == 'eth_sendRawTransaction':
+            return self._add_transaction(params[0])
+        if method == 'eth_getTransactionByHash':
+            return self._format_tx(params[0]) if params[0] in self.txs_by_hash else None
+        if method == 'eth_getTransactionReceipt':
+            return self._format_receipt(params[0]) if params[0] in self.txs_by_hash else None
+        if method == 'eth_getBlockReceipts' and self.config.block_receipts:
+            block = self._get_block(params[0])
+            return [self._format_receipt(tx_hash) for tx_hash in block['transactions']] if block is not None else None
+        if method == 'eth_getBlockByNumber':
+            block = self._get_block(params[0])
+            return self._format_block(block, len(params) > 1 and params[1]) if block is not None else None
+        if method == 'eth_subscribe' and ws is not None:
+            if params[0] != 'newHeads':
+                raise RpcError(-32602, f"unsupported subscription: {params[0]}")
+            subscription_id = to_hex(next(self.subscription_ids))
+            self.subscriptions[subscription_id] = ws
+            return subscription_id
+        if method == 'eth_unsubscribe' and ws is not None:
+            return self.subscriptions.pop(params[0], None) is not None
+        raise RpcError(-32601, f"the method {method} does not exist/is not available")
+
+    def handle_request(self, request, ws=None):
+        self.requests_count += 1
+        response = {'jsonrpc': '2.0', 'id': request.get('id')}
+        try:
+            response['result'] = self.call(request.get('method'), request.get('params') or [], ws=ws)
+        except RpcError as e:
+            response['error'] = {'code': e.code, 'message': e.message}
+        except (ValueError, TypeError, IndexError, KeyError) as e:
+            response['error'] = {'code': -32602, 'message': f"invalid params: {e}"}
+        return response
+
+    def handle_message(self, message, ws=None):
+        try:
+            request = json.loads(message)
+        except ValueError:
+            return {'jsonrpc': '2.0', 'id': None, 'error': {'code': -32700, 'message': 'parse error'}}
+        first_request = request[0] if isinstance(request, list) and request else request
+        if isinstance(first_request, dict) and first_request.get('method') == 'eth_sendRawTransaction' and random.random() < self.config.idless_error_rate:
+            # Like a rate-limiting proxy in front of the node: the message is not processed at all
+            return {'jsonrpc': '2.0', 'id': None, 'error': {'code': -32005, 'message': 'rate limited'}}
+        if isinstance(request, list):
+            return [self.handle_request(item, ws=ws) for item in request]
+        return self.handle_request(request, ws=ws)
+
+    # ===== Transport =====
+
+    async def _respond_later(self, ws, message):
+        await asyncio.sleep(self.config.ack_latency)
+        await ws.send_str(json.dumps(self.handle_message(message, ws=ws)))
+
+    async def handle_http(self, request):
+        if request.headers.get('Upgrade', '').lower() == 'websocket':
+            return await self.handle_ws(request)
+        message = await request.text()
+        if self.config.ack_latency > 0:
+            await asyncio.sleep(self.config.ack_latency)
+        return web.json_response(self.handle_message(message))
+
+    async def handle_ws(self, request):
+        ws = web.WebSocketResponse(max_msg_size=0)
+        await ws.prepare(request)
+        async for message in ws:
+            if message.type not in (web.WSMsgType.TEXT, web.WSMsgType.BINARY):
+                continue
+            if self.config.ack_latency > 0:
+                asyncio.create_task(self._respond_later(ws, message.data))
+            else:
+                await ws.send_str(json.dumps(self.handle_message(message.data, ws=ws)))
+        for (subscription_id, subscription_ws) in list(self.subscriptions.items()):
+            if subscription_ws is ws:
+                del self.subscriptions[subscription_id]
+        return ws
+
+    async def start(self, host='127.0.0.1', port=8545):
+        app = web.Application(client_max_size=0)
+        app.router.add_route('*', '/{tail:.*}', self.handle_http)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, host, port).start()
+        self.block_task = asyncio.create_task(self.produce_blocks())
+        logger.info(f"Mock node listening on http://{host}:{port} and ws://{host}:{port} (chain id {self.config.chain_id})")
+
+    async def stop(self):
+        self.block_task.cancel()
+        await self.runner.cleanup()
+
+
+async def serve(config, host, port):
+    node = MockNode(config)
+    await node.start(host, port)
+    await asyncio.Event().wait()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8545)
+    parser.add_argument('--chain-id', type=int, default=31337)
+    parser.add_argument('--block-time', type=float, default=1.0, help='secs')
+    parser.add_argument('--block-gas-limit', type=int, default=30_000_000)
+    parser.add_argument('--tx-gas-used', type=int, default=105_000)
+    parser.add_argument('--mempool-capacity', type=int, default=100_000)
+    parser.add_argument('--min-gas-price', type=int, default=0, help='wei')
+    parser.add_argument('--ack-latency', type=float, default=0.0, help='secs')
+    parser.add_argument('--known-tx-rate', type=float, default=0.0)
+    parser.add_argument('--underpriced-rate', type=float, default=0.0)
+    parser.add_argument('--drop-rate', type=float, default=0.0, help='share of accepted txs evicted from the mempool')
+    parser.add_argument('--revert-rate', type=float, default=0.0, help='share of included txs that revert')
+    parser.add_argument('--idless-error-rate', type=float, default=0.0, help='share of eth_sendRawTransaction messages rejected with an error without id (rate-limiting proxy)')
+    parser.add_argument('--no-block-receipts', action='store_true', help='no eth_getBlockReceipts (receipts are fetched per tx)')
+    parser.add_argument('--no-sender-recovery', action='store_true', help='skip ecrecover (txs are not ordered by nonce)')
+    args = parser.parse_args()
+    config = MockNodeConfig(
+        chain_id=args.chain_id,
+        block_time=args.block_time,
+        block_gas_limit=args.block_gas_limit,
+        tx_gas_used=args.tx_gas_used,
+        mempool_capacity=args.mempool_capacity,
+        min_gas_price=args.min_gas_price,
+        ack_latency=args.ack_latency,
+        known_tx_rate=args.known_tx_rate,
+        underpriced_rate=args.underpriced_rate,
+        drop_rate=args.drop_rate,
+        revert_rate=args.revert_rate,
+        idless_error_rate=args.idless_error_rate,
+        recover_senders=not args.no_sender_recovery,
+        block_receipts=not args.no_block_receipts,
+    )
+    try:
+        asyncio.run(serve(config, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
@@ -1,15 +1,19 @@
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from eth_account import Account
 from web3 import Web3
 
-import json
+import argparse
+import asyncio
+import collections
 import logging
+import os
 import signal
 import sys
-import threading
 import time
 
-from blockchain import BlockchainData, ChainId, Contract, Token
+from accounts import AccountProvider
+from blockchain import BlockchainData, ChainId, Token, Workload, parse_workload
+from rpc import RpcClient, RpcError
+from signing import sign_in_parallel
 
 logging.basicConfig(format='[%(asctime)s] %(message)s')
 logger = logging.getLogger(__name__)
@@ -17,205 +21,250 @@ logger.setLevel(logging.DEBUG)
 
 
 NUM_ACCOUNTS = 100  # number of accounts to fund
+FUND_AMOUNT_ETH = 0.002
+WRAP_AMOUNT_ETH = 5e-8  # each swap requires 1e-9 WETH
+APPROVE_AMOUNT_ETH = 1
+MIN_ETH_BALANCE = 0.001  # readiness thresholds
+MIN_WETH_AMOUNT = 2e-8  # balance and allowance
+TRANSFER_GAS = 500000
+CONTRACT_CALL_GAS = 2000000
+FUNDER_KEY_ENV = 'FUNDER_PRIVATE_KEY'
 
-WETH_ABI = json.loads(open('abis/WETH9.abi', 'r').read())
+RPC_BATCH_SIZE = 100  # requests per JSON-RPC batch
+MAX_PENDING_FUNDING_TXS = 500  # unconfirmed txs of the funder, bounded by the mempool's per-sender limit
+RECEIPT_POLL_SECS = 1.0
+CONFIRMATION_TIMEOUT_SECS = 300
+
+
+AccountState = collections.namedtuple('AccountState', ['eth_balance', 'weth_balance', 'allowances'])  # in wei, allowances: one per approval
 
 
-EXECUTION_STARTED = False
 TERMINATION_REQUESTED = False
 def signal_handler(_sig, _frame):
     logger.info('===== Termination requested =====')
-    if not EXECUTION_STARTED:
-        sys.exit(0)
     global TERMINATION_REQUESTED
+    if TERMINATION_REQUESTED:
+        sys.exit(0)
     TERMINATION_REQUESTED = True
 
 
-def generate_ethereum_accounts(mnemonic, count):
-    Account.enable_unaudited_hdwallet_features()
-    accounts = []
-    for i in range(count):
-        account = Account.from_mnemonic(mnemonic, account_path=f"m/44'/60'/0'/0/{i}")
-        accounts.append(account)
-    return accounts
-
-
-def retriable(method):
-    def wrapper(self, *args, **kwargs):
-        retry_secs = 0.1
-        max_retries = 8
-        retry_count = 0
-        while not TERMINATION_REQUESTED:
-            try:
-                return method(self, *args, **kwargs)
-            except Exception as e:
-                retry_count += 1
-                if retry_count > max_retries:
-                    return False
-                logger.info(f"[{self.account.address}] Failed to execute {method.__name__}: {e}. Retry #{retry_count}")
-                time.sleep(retry_secs)
-                retry_secs *= 2
-        return False
-    return wrapper
+def selector(signature):
+    return Web3.keccak(text=signature)[:4].hex()[2:]
+
+
+def encode_address(address):
+    return address.lower()[2:].rjust(64, '0')
+
+
+def encode_uint(value):
+    return f"{value:064x}"
+
+
+def decode_uint(result):
+    # A failed read must not pass for a zero balance or allowance, that would re-send real funds:
+    if isinstance(result, RpcError):
+        raise result
+    if not isinstance(result, str):
+        raise RpcError(None, f"Unexpected RPC result: {result!r}")
+    return int(result, 16) if result != '0x' else 0
+
+
+def is_funded(state):
+    return state.eth_balance >= Web3.to_wei(MIN_ETH_BALANCE, 'ether')
+
+
+def is_ready(state):
+    min_weth = Web3.to_wei(MIN_WETH_AMOUNT, 'ether')
+    return is_funded(state) and state.weth_balance >= min_weth and all(allowance >= min_weth for allowance in state.allowances)
 
 
 class Preparer:
-    def __init__(self, chain_id: ChainId, account: Account):
-        self.account = account
-        # Initialize web3:
+    # Funds, wraps and approves for any number of accounts at once: the txs of all accounts are signed up
+    # front (over a process pool), sent as pipelined JSON-RPC batches over a single websocket and confirmed
+    # by batched receipt polling. Balances and allowances of all accounts are read in batches as well.
+    def __init__(self, chain_id: ChainId, client: RpcClient, workloads=None):
         self.blockchain = BlockchainData(chain_id)
         self.chain_id = chain_id.value
-        self.w3 = Web3(Web3.HTTPProvider(self.blockchain.http_rpc_url()))
-        self.nonce = self.w3.eth.get_transaction_count(account.address)
-        weth_address = self.blockchain.get_address(Token.WETH)
-        self.weth = self.w3.eth.contract(address=weth_address, abi=WETH_ABI)
-        # Initialize variables:
-        self.done_sending = False
-        self.pending_tx_hashes = []
-        # Thread to wait until all transactions are confirmed:
-        self.waiting_thread = threading.Thread(target=self._wait)
-        self.waiting_thread.start()
-
-    @retriable
-    def transfer_eth(self, to_address, amount_in_eth):
-        tx = {
+        self.client = client
+        self.weth_address = self.blockchain.get_address(Token.WETH)
+        # (token, router) pairs every account approves: the first token of the path of every swap workload
+        self.approvals = sorted({
+            (self.blockchain.resolve_address(workload.path[0]), self.blockchain.resolve_address(workload.router))
+            for workload in workloads or self.blockchain.workloads() if workload.kind == Workload.SWAP
+        })
+        self.gas_price = None
+        self.signing_processes = os.cpu_count() or 1
+
+    async def _batched(self, calls):
+        # All calls as concurrent batches, results (or RpcErrors) in the same order:
+        chunks = [calls[i:i + RPC_BATCH_SIZE] for i in range(0, len(calls), RPC_BATCH_SIZE)]
+        results = await asyncio.gather(*[self.client.batch(chunk, raise_errors=False) for chunk in chunks])
+        return [result for chunk_results in results for result in chunk_results]
+
+    async def get_nonces(self, addresses, block='pending'):
+        nonces = await self._batched([("eth_getTransactionCount", [address, block]) for address in addresses])
+        return [decode_uint(nonce) for nonce in nonces]
+
+    async def get_states(self, addresses):
+        # 2 reads per account plus one per approval, all of them in a few batch round trips:
+        calls = []
+        for address in addresses:
+            calls.append(("eth_getBalance", [address, 'latest']))
+            calls.append(("eth_call", [{'to': self.weth_address, 'data': '0x' + selector('balanceOf(address)') + encode_address(address)}, 'latest']))
+            for (token_address, router_address) in self.approvals:
+                calls.append(("eth_call", [{
+                    'to': token_address,
+                    'data': '0x' + selector('allowance(address,address)') + encode_address(address) + encode_address(router_address),
+                }, 'latest']))
+        results = await self._batched(calls)
+        values = [decode_uint(result) for result in results]
+        reads_count = 2 + len(self.approvals)
+        return [AccountState(values[i], values[i + 1], tuple(values[i + 2:i + reads_count])) for i in range(0, len(values), reads_count)]
+
+    async def send(self, signed_txs):
+        # Returns the hashes of the accepted txs:
+        results = await self._batched([("eth_sendRawTransaction", [signed_tx.raw_tx]) for signed_tx in signed_txs])
+        tx_hashes = []
+        for (signed_tx, result) in zip(signed_txs, results):
+            if isinstance(result, RpcError) and not (result.message or '').startswith(('known transaction', 'already known')):
+                logger.info(f"Tx {signed_tx.hash} rejected: {result.message}")
+            else:
+                tx_hashes.append(signed_tx.hash)
+        return tx_hashes
+
+    async def wait_for_receipts(self, tx_hashes):
+        # Returns the number of successful txs, once all of them are confirmed or after the timeout:
+        pending = list(tx_hashes)
+        (succeeded, failed) = (0, 0)
+        started_at = time.time()
+        while pending and not TERMINATION_REQUESTED and time.time() - started_at < CONFIRMATION_TIMEOUT_SECS:
+            await asyncio.sleep(RECEIPT_POLL_SECS)
+            receipts = await self._batched([("eth_getTransactionReceipt", [tx_hash]) for tx_hash in pending])
+            still_pending = []
+            for (tx_hash, receipt) in zip(pending, receipts):
+                if not isinstance(receipt, dict):
+                    still_pending.append(tx_hash)
+                elif int(receipt['status'], 16) == 1:
+                    succeeded += 1
+                else:
+                    failed += 1
+                    logger.info(f"Tx failed: {tx_hash} | Block: {int(receipt['blockNumber'], 16)}")
+            pending = still_pending
+        if pending:
+            logger.info(f"Unable to confirm {len(pending)} of {len(tx_hashes)} txs")
+        logger.info(f"Confirmed {succeeded + failed} txs: {succeeded} succeeded, {failed} failed")
+        return succeeded
+
+    def _tx(self, account, nonce, to_address, value=0, data='0x', gas=CONTRACT_CALL_GAS):
+        return {
             'chainId': self.chain_id,
-            'from': self.account.address,
+            'from': account.address,
             'to': to_address,
-            'value': Web3.to_wei(amount_in_eth, 'ether'),
-            'gas': 500000,
-            'gasPrice': self.w3.eth.gas_price,
-            'nonce': self.nonce,
+            'value': value,
+            'data': data,
+            'gas': gas,
+            'gasPrice': self.gas_price,
+            'nonce': nonce,
         }
-        signed_tx = self.w3.eth.account.sign_transaction(tx, self.account.key)
-        tx_hash = self.w3.eth.send_raw_transaction(signed_tx.rawTransaction)
-        logger.info(f"[{self.account.address}] Tx sent (transfer_eth): {tx_hash.hex()} | nonce={self.nonce}")
-        self.pending_tx_hashes.append(tx_hash.hex())
-        self.nonce += 1
-        return True
-
-    @retriable
-    def wrap_eth(self, amount_in_eth):
-        tx = self.weth.functions.deposit().build_transaction({
-            'chainId': self.chain_id,
-            'from': self.account.address,
-            'value': Web3.to_wei(amount_in_eth, 'ether'),
-            'gas': 2000000,
-            'gasPrice': self.w3.eth.gas_price,
-            'nonce': self.nonce,
-        })
-        signed_tx = self.w3.eth.account.sign_transaction(tx, self.account.key)
-        tx_hash = self.w3.eth.send_raw_transaction(signed_tx.rawTransaction)
-        logger.info(f"[{self.account.address}] Tx sent (wrap): {tx_hash.hex()} | nonce={self.nonce}")
-        self.pending_tx_hashes.append(tx_hash.hex())
-        self.nonce += 1
-        return True
-
-    @retriable
-    def approve_token(self, token_contract, spender, amount_in_eth):
-        amount_in_wei = Web3.to_wei(amount_in_eth, 'ether')
-        tx = token_contract.functions.approve(spender, amount_in_wei).build_transaction({
-            'chainId': self.chain_id,
-            'from': self.account.address,
-            'gas': 2000000,
-            'gasPrice': self.w3.eth.gas_price,
-            'nonce': self.nonce,
-        })
-        signed_tx = self.w3.eth.account.sign_transaction(tx, self.account.key)
-        tx_hash = self.w3.eth.send_raw_transaction(signed_tx.rawTransaction)
-        logger.info(f"[{self.account.address}] Tx sent (approve): {tx_hash.hex()} | nonce={self.nonce}")
-        self.pending_tx_hashes.append(tx_hash.hex())
-        self.nonce += 1
-        return True
-
-    def fund_accounts(self):
-        mnemonic = open("mnemonic.txt", "r").read()
-        accounts = generate_ethereum_accounts(mnemonic, NUM_ACCOUNTS)
-        for account in accounts:
-            self.transfer_eth(account.address, 0.002)
-
-    def start(self):
-        # logger.info(f'[{self.account.address}] Balance: {self.w3.eth.get_balance(self.account.address) / 1e18}')
-        # logger.info(f'[{self.account.address}] WETH Balance: {self.weth.functions.balanceOf(self.account.address).call() / 1e18}')
-        # 1. Fund all accounts:
-        self.fund_accounts()
-        # 2. Each account has to wrap enough WETH for swaps (each swap requires 1e-9 WETH)
-        # self.wrap_eth(5e-8)
-        # 3. Each account has to approve WETH spending to SMART_ROUTER
-        # smart_router_address = self.blockchain.get_address(Contract.PANCAKE_SMART_ROUTER)
-        # self.approve_token(self.weth, smart_router_address, 1)
-        # 4. Check readiness:
-        # logger.info(f'[{self.account.address}] Ready: {self.is_ready()}')
-        self.done_sending = True
-
-    def is_ready(self):
-        smart_router_address = self.blockchain.get_address(Contract.PANCAKE_SMART_ROUTER)
-        eth_balance = self.w3.eth.get_balance(self.account.address) / 1e18
-        weth_balance = self.weth.functions.balanceOf(self.account.address).call() / 1e18
-        weth_allowance = self.weth.functions.allowance(self.account.address, smart_router_address).call() / 1e18
-        return eth_balance >= 0.001 and weth_balance >= 2e-8 and weth_allowance >= 2e-8
-
-    def wait_for_transaction_receipt(self, tx_hash):
-        retry_secs = 0.5
-        max_retries = 20
-        retry_count = 0
-        while not TERMINATION_REQUESTED:
-            try:
-                return self.w3.eth.wait_for_transaction_receipt(tx_hash, poll_latency=0.5)
-            except Exception as e:
-                if retry_count > max_retries:
-                    return False
-                retry_count += 1
-                logger.info(f"Failed to execute wait_for_transaction_receipt: {e}. Retry #{retry_count}")
-                time.sleep(retry_secs)
-        return False
-
-    def _wait(self):
-        while not self.done_sending:
-            time.sleep(0.2)
-        if len(self.pending_tx_hashes) == 0:
-            return
-        last_tx_hash = self.pending_tx_hashes[-1]
-        receipt = self.wait_for_transaction_receipt(last_tx_hash)
-        if not receipt:
-            logger.info(f"[{self.account.address}] Unable to confirm all txs")
+
+    async def fund(self, funder, addresses, amount_in_eth):
+        # Transfers from a single sender: sent in nonce order, with at most MAX_PENDING_FUNDING_TXS unconfirmed
+        (nonce,) = await self.get_nonces([funder.address])
+        value = Web3.to_wei(amount_in_eth, 'ether')
+        txs = [self._tx(funder, nonce + i, address, value=value, gas=TRANSFER_GAS) for (i, address) in enumerate(addresses)]
+        (signed_txs,) = sign_in_parallel([(funder.key, txs)], self.signing_processes)
+        logger.info(f"Funding {len(addresses)} accounts with {amount_in_eth} ETH from {funder.address} (nonces {nonce}...{nonce + len(txs) - 1})")
+        tx_hashes = []
+        for start in range(0, len(signed_txs), RPC_BATCH_SIZE):
+            while not TERMINATION_REQUESTED:
+                (confirmed_nonce,) = await self.get_nonces([funder.address], block='latest')
+                if nonce + start - confirmed_nonce < MAX_PENDING_FUNDING_TXS:
+                    break
+                await asyncio.sleep(RECEIPT_POLL_SECS)
+            if TERMINATION_REQUESTED:
+                break
+            tx_hashes += await self.send(signed_txs[start:start + RPC_BATCH_SIZE])
+        return await self.wait_for_receipts(tx_hashes)
+
+    async def wrap_and_approve(self, accounts, states):
+        # The wrap and/or approve txs of every account, in one round of concurrent batches:
+        if not accounts:
+            return 0
+        nonces = await self.get_nonces([account.address for account in accounts])
+        min_weth = Web3.to_wei(MIN_WETH_AMOUNT, 'ether')
+        approve_amount = encode_uint(Web3.to_wei(APPROVE_AMOUNT_ETH, 'ether'))
+        jobs = []
+        for (account, state, nonce) in zip(accounts, states, nonces):
+            txs = []
+            if state.weth_balance < min_weth:
+                txs.append(self._tx(account, nonce + len(txs), self.weth_address, value=Web3.to_wei(WRAP_AMOUNT_ETH, 'ether'), data='0x' + selector('deposit()')))
+            for ((token_address, router_address), allowance) in zip(self.approvals, state.allowances):
+                if allowance < min_weth:
+                    approve_data = '0x' + selector('approve(address,uint256)') + encode_address(router_address) + approve_amount
+                    txs.append(self._tx(account, nonce + len(txs), token_address, data=approve_data))
+            jobs.append((account.key, txs))
+        signed_txs = [signed_tx for job_signed_txs in sign_in_parallel(jobs, self.signing_processes) for signed_tx in job_signed_txs]
+        if not signed_txs:
+            return 0
+        logger.info(f"Sending {len(signed_txs)} wrap/approve txs of {len(accounts)} accounts")
+        return await self.wait_for_receipts(await self.send(signed_txs))
+
+    async def _fund_then_wrap(self, funder, accounts, states, amount_in_eth):
+        if not accounts:
             return
-        block_num = receipt['blockNumber']
-        tx_status = 'SUCCESS' if receipt['status'] == 1 else 'FAILED'
-        logger.info(f"[{self.account.address}] Tx confirmed: {last_tx_hash} | Block: {block_num} | Status: {tx_status}")
-
-    def wait(self):
-        if hasattr(self, 'waiting_thread') and self.waiting_thread:
-            self.waiting_thread.join()
-
-
-def run_in_parallel(objects):
-    def start_and_wait(obj):
-        obj.start()
-        obj.wait()
-        return "Done"
-    global EXECUTION_STARTED
-    EXECUTION_STARTED = True
-    if len(objects) > 1:
-        with ThreadPoolExecutor() as executor:
-            futures = [executor.submit(start_and_wait, obj) for obj in objects]
-        for future in as_completed(futures):
-            future.result()
-    elif len(objects) == 1:
-        start_and_wait(objects[0])
+        await self.fund(funder, [account.address for account in accounts], amount_in_eth)
+        funded = [(account, state) for (account, state) in zip(accounts, await self.get_states([account.address for account in accounts])) if is_funded(state)]
+        if len(funded) < len(accounts):
+            logger.info(f"{len(accounts) - len(funded)} accounts are still not funded")
+        await self.wrap_and_approve([account for (account, _) in funded], [state for (_, state) in funded])
+
+    async def prepare(self, funder, accounts, amount_in_eth=FUND_AMOUNT_ETH):
+        started_at = time.time()
+        self.gas_price = int(await self.client.request("eth_gasPrice"), 16)
+        states = await self.get_states([account.address for account in accounts])
+        logger.info(f"{sum(is_ready(state) for state in states)} of {len(accounts)} accounts are ready")
+        # Funded accounts are wrapped/approved while the others are being funded:
+        to_fund = [(account, state) for (account, state) in zip(accounts, states) if not is_funded(state)]
+        to_wrap = [(account, state) for (account, state) in zip(accounts, states) if is_funded(state) and not is_ready(state)]
+        await asyncio.gather(
+            self._fund_then_wrap(funder, [account for (account, _) in to_fund], [state for (_, state) in to_fund], amount_in_eth),
+            self.wrap_and_approve([account for (account, _) in to_wrap], [state for (_, state) in to_wrap]),
+        )
+        return await self.check(accounts, started_at)
+
+    async def check(self, accounts, started_at=None):
+        states = await self.get_states([account.address for account in accounts])
+        not_ready = [account.address for (account, state) in zip(accounts, states) if not is_ready(state)]
+        for address in not_ready:
+            logger.info(f"[{address}] Not ready")
+        elapsed = f" in {time.time() - started_at:.1f}s" if started_at is not None else ''
+        logger.info(f"{len(accounts) - len(not_ready)} of {len(accounts)} accounts are ready{elapsed}")
+        return not not_ready
+
+
+async def run(chain_id, funder, accounts, amount_in_eth, check_only, workloads=None):
+    async with RpcClient(BlockchainData(chain_id).ws_rpc_url()) as client:
+        preparer = Preparer(chain_id, client, workloads)
+        if check_only:
+            return await preparer.check(accounts)
+        return await preparer.prepare(funder, accounts, amount_in_eth)
 
 
 if __name__ == "__main__":
     signal.signal(signal.SIGINT, signal_handler)
-    funder = Account.from_key("<PRIVATE_KEY>")
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--chain', choices=[chain.name for chain in ChainId], default=ChainId.ZKSYNC_ERA_MAINNET.name)
+    parser.add_argument('--start-index', type=int, default=0, help='index of the first account')
+    parser.add_argument('--accounts', type=int, default=NUM_ACCOUNTS, help='number of accounts to prepare')
+    parser.add_argument('--fund-amount', type=float, default=FUND_AMOUNT_ETH, help='ETH sent to every account that is not funded yet')
+    parser.add_argument('--check', action='store_true', help='only check the readiness of the accounts')
+    parser.add_argument('--workload', action='append', type=parse_workload, help='as in tps_test.py: the routers of all swaps are approved (repeatable)')
+    args = parser.parse_args()
+    # The funder's key is read from the environment (never passed on the command line):
+    funder = Account.from_key(os.environ.get(FUNDER_KEY_ENV, "<PRIVATE_KEY>")) if not args.check else None
     mnemonic = open("mnemonic.txt", "r").read()
-    accounts = generate_ethereum_accounts(mnemonic, count=NUM_ACCOUNTS)
-    # 1. Fund all accounts:
-    objects = [Preparer(ChainId.ZKSYNC_ERA_MAINNET, funder)]
-    # 2. Each account has to wrap enough WETH for swaps (each swap requires 1e-9 WETH)
-    # 3. Each account has to approve WETH spending to SMART_ROUTER
-    # 4. Check readiness
-    # objects = [Preparer(ChainId.ZKSYNC_ERA_MAINNET, account) for account in accounts]
-
-    # Execute in parallel:
-    run_in_parallel(objects)
+    accounts = AccountProvider(mnemonic).get_accounts(args.start_index, args.accounts)
+    # Fund the accounts that are not funded, wrap WETH and approve the routers for the accounts that need it,
+    # then check readiness of all of them:
+    ready = asyncio.run(run(ChainId[args.chain], funder, accounts, args.fund_amount, args.check, args.workload))
+    sys.exit(0 if ready else 1)
@@ -0,0 +1,201 @@
+import numpy as np
+import argparse
+import csv
+import glob
+import os
+import re
+
+try:
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+except ImportError:
+    plt = None  # plots are optional, tables work without matplotlib
+
+from blockchain import ChainId
+from logs_parser import gas_stats, group_blocks, latency_percentiles, read_swaps
+
+
+RUN_FILENAME = 'run.npz'
+RUN_DIR_PATTERN = re.compile(r'^(?P<chain>.+)_(?P<date>\d{4}-\d{2}-\d{2})$')  # e.g. results/zksync_era_2024-06-14
+
+
+def chain_of_run_dir(run_dir):
+    # 'zksync_era_2024-06-14' -> ZKSYNC_ERA_MAINNET:
+    match = RUN_DIR_PATTERN.match(os.path.basename(os.path.normpath(run_dir)))
+    if match is None:
+        return (None, None)
+    chains = [chain for chain in ChainId if chain.name.lower().startswith(match['chain'])]
+    return (chains[0] if len(chains) == 1 else None, match['date'])
+
+
+def store_run(run_dir, chain=None, date=None):
+    # Per-tx and per-block columns of a run, converted once from its swaps.log:
+    (dir_chain, dir_date) = chain_of_run_dir(run_dir)
+    chain = chain or dir_chain
+    txs = read_swaps(os.path.join(run_dir, 'swaps.log'))
+    blocks = group_blocks(txs)
+    path = os.path.join(run_dir, RUN_FILENAME)
+    np.savez_compressed(
+        path,
+        chain=np.array(chain.name if chain is not None else ''),
+        date=np.array(date or dir_date or ''),
+        tx_sent_ts=txs['sent_ts'],
+        tx_block_ts=txs['block_ts'],
+        tx_block_num=txs['block_num'],
+        tx_account_ids=txs['account_ids'],
+        tx_shards=txs['shards'],
+        tx_status=txs['status'],
+        tx_gas_used=txs['gas_used'],
+        tx_block_gas_used=txs['block_gas_used'],
+        tx_block_gas_limit=txs['block_gas_limit'],
+        account_names=np.array(txs['account_names'], dtype=str),
+        block_ts=blocks['block_ts'],
+        block_num=blocks['block_num'],
+        block_all_txs=blocks['all_txs'],
+        block_our_txs=blocks['our_txs'],
+    )
+    return path
+
+
+class Run:
+    # A stored run; arrays are only read from the .npz when accessed
+    def __init__(self, path):
+        self.path = path
+        self.data = np.load(path)
+        self.chain = str(self.data['chain'])
+        self.date = str(self.data['date'])
+        self.name = os.path.basename(os.path.dirname(path))
+
+    def summary(self):
+        (sent_ts, block_ts) = (self.data['tx_sent_ts'], self.data['tx_block_ts'])
+        included = block_ts >= 0
+        blocks_ts = self.data['block_ts']
+        total_secs = int(blocks_ts[-1] - blocks_ts[0]) if len(blocks_ts) else 0
+        gas = None
+        if 'tx_status' in self.data.files and included.any():  # runs stored before receipts were fetched have none
+            gas = gas_stats({
+                'block_ts': block_ts,
+                'block_num': self.data['tx_block_num'],
+                'block_gas_used': self.data['tx_block_gas_used'],
+                'block_gas_limit': self.data['tx_block_gas_limit'],
+                'status': self.data['tx_status'],
+                'gas_used': self.data['tx_gas_used'],
+            })
+        return {
+            'run': self.name,
+            'chain': self.chain,
+            'date': self.date,
+            'sent_txs': len(sent_ts),
+            'included_txs': int(included.sum()),
+            'blocks': len(blocks_ts),
+            'total_secs': total_secs,
+            'tps': included.sum() / total_secs if total_secs > 0 else None,
+            'max_block_txs': int(self.data['block_our_txs'].max()) if len(blocks_ts) else 0,
+            **{key: (gas[key] if gas is not None else None) for key in ('success_tps', 'mgas_per_sec', 'block_gas_utilization', 'max_tps')},
+            **{f"latency_{name}": value for (name, value) in latency_percentiles(np.sort((block_ts - sent_ts)[included])).items()},
+        }
+
+
+def load_runs(results_dir, chains=None):
+    # Runs are (re)stored when their swaps.log is newer than the .npz, text logs are not parsed otherwise:
+    runs = []
+    for swaps_log in sorted(glob.glob(os.path.join(results_dir, '*', 'swaps.log'))):
+        run_dir = os.path.dirname(swaps_log)
+        path = os.path.join(run_dir, RUN_FILENAME)
+        if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(swaps_log):
+            store_run(run_dir)
+        run = Run(path)
+        if chains is None or run.chain in chains:
+            runs.append(run)
+    return sorted(runs, key=lambda run: (run.chain, run.date))
+
+
+def print_table(summaries):
+    print(f"{'run':<32} {'chain':<24} {'date':<10} {'included':>12} {'secs':>6} {'tps':>8} {'ok_tps':>8} {'mgas/s':>8} {'gas_util':>8} {'max_tps':>8} "
+          f"{'p50':>8} {'p90':>8} {'p99':>8} {'max':>8}")
+    for summary in summaries:
+        tps = f"{summary['tps']:.2f}" if summary['tps'] is not None else '∞'
+        gas = ' '.join(
+            f"{'-' if summary.get(key) is None else f'{scale * summary[key]:.2f}':>8}"
+            for (key, scale) in (('success_tps', 1), ('mgas_per_sec', 1), ('block_gas_utilization', 100), ('max_tps', 1))
+        )
+        latencies = ' '.join(f"{summary.get(f'latency_{name}', float('nan')):8.2f}" for name in ('p50', 'p90', 'p99', 'max'))
+        print(f"{summary['run']:<32} {summary['chain']:<24} {summary['date']:<10} {summary['included_txs']:>5}/{summary['sent_txs']:<6} "
+              f"{summary['total_secs']:>6} {tps:>8} {gas} {latencies}")
+
+
+def write_csv(summaries, path):
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(summaries[0].keys()))
+        writer.writeheader()
+        writer.writerows(summaries)
+
+
+def plot_runs(runs, summaries, out_dir):
+    # 1. Cumulative included txs since the first block with our txs:
+    (figure, axes) = plt.subplots(figsize=(10, 6))
+    for run in runs:
+        (blocks_ts, our_txs) = (run.data['block_ts'], run.data['block_our_txs'])
+        axes.step(blocks_ts - blocks_ts[0], np.cumsum(our_txs), where='post', label=run.name)
+    axes.set(xlabel='secs since first block', ylabel='txs included', title='Cumulative included txs')
+    axes.legend()
+    figure.savefig(os.path.join(out_dir, 'cumulative_txs.png'), dpi=120)
+    # 2. Send-to-inclusion latency CDF:
+    (figure, axes) = plt.subplots(figsize=(10, 6))
+    for run in runs:
+        block_ts = run.data['tx_block_ts']
+        latencies = np.sort((block_ts - run.data['tx_sent_ts'])[block_ts >= 0])
+        axes.plot(latencies, np.arange(1, len(latencies) + 1) / len(latencies), label=run.name)
+    axes.set(xlabel='latency, secs (sent -> block timestamp)', ylabel='share of txs', title='Latency CDF')
+    axes.legend()
+    figure.savefig(os.path.join(out_dir, 'latency_cdf.png'), dpi=120)
+    # 3. TPS and median latency of every chain over time (regressions of sequencer throughput):
+    (figure, (tps_axes, latency_axes)) = plt.subplots(2, 1, figsize=(10, 8), sharex=True)
+    for chain in sorted({summary['chain'] for summary in summaries}):
+        chain_summaries = [summary for summary in summaries if summary['chain'] == chain and summary['tps'] is not None]
+        dates = [np.datetime64(summary['date']) for summary in chain_summaries]
+        tps_axes.plot(dates, [summary['tps'] for summary in chain_summaries], marker='o', label=chain)
+        latency_axes.plot(dates, [summary.get('latency_p50') for summary in chain_summaries], marker='o', label=chain)
+    tps_axes.set(ylabel='TPS', title='TPS by date')
+    latency_axes.set(ylabel='latency p50, secs', xlabel='date')
+    tps_axes.legend()
+    figure.savefig(os.path.join(out_dir, 'tps_by_date.png'), dpi=120)
+    plt.close('all')
+
+
+def report(results_dir, out_dir, chains=None):
+    runs = load_runs(results_dir, chains)
+    if not runs:
+        print(f"No runs in {results_dir}")
+        return
+    summaries = [run.summary() for run in runs]
+    print_table(summaries)
+    os.makedirs(out_dir, exist_ok=True)
+    write_csv(summaries, os.path.join(out_dir, 'summary.csv'))
+    if plt is None:
+        print("matplotlib is not installed, plots are skipped")
+        return
+    plot_runs(runs, summaries, out_dir)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    # 1. Store a run (done automatically by `compare` for runs with a swaps.log):
+    # python3 report.py store results/zksync_era_2024-06-14
+    store_parser = subparsers.add_parser('store', help='convert swaps.log of a run to columnar run.npz')
+    store_parser.add_argument('run_dir')
+    store_parser.add_argument('--chain', choices=[chain.name for chain in ChainId], help='default: from the run directory name')
+    store_parser.add_argument('--date', help='YYYY-MM-DD, default: from the run directory name')
+    # 2. Compare all runs: table, summary.csv and plots
+    # python3 report.py compare --chain ZKSYNC_ERA_MAINNET
+    compare_parser = subparsers.add_parser('compare', help='TPS/latency table and plots across runs')
+    compare_parser.add_argument('--results', default='results', help='directory of runs (<chain>_<YYYY-MM-DD>/swaps.log)')
+    compare_parser.add_argument('--out', default='results/report')
+    compare_parser.add_argument('--chain', action='append', choices=[chain.name for chain in ChainId], help='only these chains (repeatable)')
+    args = parser.parse_args()
+    if args.command == 'store':
+        print(store_run(args.run_dir, ChainId[args.chain] if args.chain else None, args.date))
+    elif args.command == 'compare':
+        report(args.results, args.out, args.chain)
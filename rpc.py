@@ -0,0 +1,144 @@
+import asyncio
+import itertools
+import json
+import logging
+import random
+import websockets
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+
+REQUEST_TIMEOUT_SECS = 30
+MAX_RETRIES = 5
+
+
+def request_to_json(method, params, request_id=None):
+    if request_id is None:
+        request_id = random.randint(0, int(1e9))
+    return {
+        'jsonrpc': '2.0',
+        'id': request_id,
+        'method': method,
+        'params': params,
+    }
+
+
+class RpcError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+class RpcClient:
+    # Pipelined JSON-RPC over a single websocket: any number of concurrent requests, matched by id.
+    def __init__(self, ws_url, request_timeout=REQUEST_TIMEOUT_SECS, **connect_kwargs):
+        self.ws_url = ws_url
+        self.request_timeout = request_timeout
+        self.connect_kwargs = connect_kwargs
+        self.ws = None
+        self.reader_task = None
+        self.request_ids = itertools.count(1)
+        self.futures_by_request_id = {}
+        self.subscription_queues = {}
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *_exc_info):
+        await self.close()
+
+    async def connect(self):
+        self.ws = await websockets.connect(self.ws_url, max_size=None, **self.connect_kwargs)
+        self.reader_task = asyncio.create_task(self._reader())
+
+    async def close(self):
+        if self.reader_task is not None:
+            self.reader_task.cancel()
+        if self.ws is not None:
+            await self.ws.close()
+
+    async def _reconnect(self):
+        await self.close()
+        for future in self.futures_by_request_id.values():
+            if not future.done():
+                future.set_exception(websockets.ConnectionClosed(None, None))
+        self.futures_by_request_id.clear()
+        await self.connect()
+
+    async def request(self, method, params=None):
+        return (await self.batch([(method, params or [])]))[0]
+
+    async def batch(self, calls, raise_errors=True):
+        # calls: [(method, params), ...]; a single call is sent as a plain request, more as a JSON-RPC batch
+        retry_secs = 0.1
+        for retry_count in range(MAX_RETRIES + 1):
+            try:
+                return await self._batch(calls, raise_errors)
+            except (websockets.ConnectionClosed, asyncio.TimeoutError, OSError) as e:
+                if retry_count == MAX_RETRIES:
+                    raise
+                logger.info(f"RPC request failed: {e!r}. Retry #{retry_count + 1}")
+                await asyncio.sleep(retry_secs)
+                retry_secs *= 2
+                if self.ws is None or self.ws.closed:
+                    await self._reconnect()
+
+    async def _batch(self, calls, raise_errors):
+        loop = asyncio.get_running_loop()
+        json_requests = []
+        futures = []
+        for (method, params) in calls:
+            request_id = next(self.request_ids)
+            future = loop.create_future()
+            self.futures_by_request_id[request_id] = future
+            json_requests.append(request_to_json(method, params, request_id=request_id))
+            futures.append(future)
+        try:
+            await self.ws.send(json.dumps(json_requests if len(json_requests) > 1 else json_requests[0]))
+            results = await asyncio.wait_for(asyncio.gather(*futures, return_exceptions=True), self.request_timeout)
+        finally:
+            for json_request in json_requests:
+                self.futures_by_request_id.pop(json_request['id'], None)
+        for result in results:
+            if isinstance(result, (websockets.ConnectionClosed, asyncio.TimeoutError, OSError)):
+                raise result
+            if raise_errors and isinstance(result, RpcError):
+                raise result
+        return results
+
+    async def subscribe(self, subscription, *params):
+        # Returns a queue receiving every notification of the subscription:
+        subscription_id = await self.request('eth_subscribe', [subscription, *params])
+        queue = asyncio.Queue()
+        self.subscription_queues[subscription_id] = queue
+        return queue
+
+    def _on_response(self, json_response):
+        if json_response.get('method') == 'eth_subscription':
+            params = json_response['params']
+            queue = self.subscription_queues.get(params['subscription'])
+            if queue is not None:
+                queue.put_nowait(params['result'])
+            return
+        future = self.futures_by_request_id.get(json_response.get('id'))
+        if future is None or future.done():
+            return
+        if 'error' in json_response:
+            error = json_response['error'] or {}
+            future.set_exception(RpcError(error.get('code'), error.get('message')))
+        else:
+            future.set_result(json_response.get('result'))
+
+    async def _reader(self):
+        try:
+            async for message in self.ws:
+                json_response = json.loads(message)
+                for item in (json_response if isinstance(json_response, list) else [json_response]):
+                    self._on_response(item)
+        except websockets.ConnectionClosed as e:
+            for future in self.futures_by_request_id.values():
+                if not future.done():
+                    future.set_exception(e)
@@ -0,0 +1,63 @@
+import json
+import os
+import sqlite3
+
+
+CONFIRMATIONS = 32  # blocks deeper than this below the head are treated as immutable
+QUERY_CHUNK_SIZE = 500  # bound on the number of '?' parameters of one query
+
+
+class RpcCache:
+    # Immutable chain data on disk, one SQLite file per chain: blocks (with tx hashes only),
+    # tx hash -> block number and receipts. Every write is committed, so an interrupted
+    # resolution resumes from where it stopped.
+    def __init__(self, directory, chain_id):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"{chain_id}.sqlite")
+        self.db = sqlite3.connect(self.path)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS blocks (number INTEGER PRIMARY KEY, block TEXT NOT NULL)')
+        self.db.execute('CREATE TABLE IF NOT EXISTS txs (hash TEXT PRIMARY KEY, block_number INTEGER NOT NULL) WITHOUT ROWID')
+        self.db.execute('CREATE TABLE IF NOT EXISTS receipts (tx_hash TEXT PRIMARY KEY, receipt TEXT NOT NULL) WITHOUT ROWID')
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+    def get_block(self, number):
+        row = self.db.execute('SELECT block FROM blocks WHERE number = ?', (number,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def put_blocks(self, blocks_by_number):
+        self.db.executemany('INSERT OR REPLACE INTO blocks VALUES (?, ?)', [
+            (number, json.dumps(block, separators=(',', ':'))) for (number, block) in blocks_by_number.items()
+        ])
+        self.db.executemany('INSERT OR REPLACE INTO txs VALUES (?, ?)', [
+            (tx_hash, number) for (number, block) in blocks_by_number.items() for tx_hash in block['transactions']
+        ])
+        self.db.commit()
+
+    def get_block_numbers(self, tx_hashes):
+        # tx hash -> block number, for the cached txs only:
+        tx_hashes = list(tx_hashes)
+        block_num_by_tx_hash = {}
+        for i in range(0, len(tx_hashes), QUERY_CHUNK_SIZE):
+            chunk = tx_hashes[i:i + QUERY_CHUNK_SIZE]
+            query = f"SELECT hash, block_number FROM txs WHERE hash IN ({','.join('?' * len(chunk))})"
+            block_num_by_tx_hash.update(self.db.execute(query, chunk).fetchall())
+        return block_num_by_tx_hash
+
+    def get_receipts(self, tx_hashes):
+        tx_hashes = list(tx_hashes)
+        receipts = {}
+        for i in range(0, len(tx_hashes), QUERY_CHUNK_SIZE):
+            chunk = tx_hashes[i:i + QUERY_CHUNK_SIZE]
+            query = f"SELECT tx_hash, receipt FROM receipts WHERE tx_hash IN ({','.join('?' * len(chunk))})"
+            receipts.update((tx_hash, json.loads(receipt)) for (tx_hash, receipt) in self.db.execute(query, chunk))
+        return receipts
+
+    def put_receipts(self, receipts_by_tx_hash):
+        self.db.executemany('INSERT OR REPLACE INTO receipts VALUES (?, ?)', [
+            (tx_hash, json.dumps(receipt, separators=(',', ':'))) for (tx_hash, receipt) in receipts_by_tx_hash.items()
+        ])
+        self.db.commit()
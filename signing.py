@@ -0,0 +1,167 @@
+from concurrent.futures import ProcessPoolExecutor
+from eth_account import Account
+from eth_keys import keys
+from eth_utils import keccak
+from web3 import Web3
+
+import collections
+import functools
+import json
+import os
+import rlp
+import time
+
+
+SignedTx = collections.namedtuple('SignedTx', ['raw_tx', 'hash'])  # both as 0x-prefixed hex strings
+
+SIGNING_CHUNK_SIZE = 256  # txs per process pool task
+CACHE_TEMPLATE_FIELDS = ('chainId', 'type', 'to', 'value', 'data', 'gas', 'maxFeePerGas', 'maxPriorityFeePerGas', 'accessList')
+
+
+@functools.lru_cache(maxsize=1024)
+def _private_key(private_key):
+    # Deriving the public key costs as much as a signature, replacements re-use the key object of the account.
+    # eth_keys signs with libsecp256k1 when coincurve is installed (optional), in pure Python otherwise:
+    return keys.PrivateKey(private_key)
+
+
+def _encode_int(value):
+    if value == 0:
+        return b'\x80'
+    if value < 0x80:
+        return bytes((value,))
+    data = value.to_bytes((value.bit_length() + 7) // 8, 'big')
+    return bytes((0x80 + len(data),)) + data
+
+
+def _encode_list(payload):
+    if len(payload) < 56:
+        return bytes((0xc0 + len(payload),)) + payload
+    length = len(payload).to_bytes((len(payload).bit_length() + 7) // 8, 'big')
+    return bytes((0xf7 + len(length),)) + length + payload
+
+
+class TxTemplate:
+    # Legacy EIP-155 tx of one account where only the nonce changes between txs: all other fields are
+    # RLP-encoded once, every tx only encodes its nonce and signature and signs the keccak of the
+    # unsigned payload directly (no tx validation, no HexBytes round trips).
+    def __init__(self, private_key, tx):
+        self.private_key = _private_key(bytes(private_key))
+        to_address = bytes.fromhex(tx['to'][2:]) if tx.get('to') else b''
+        data = tx.get('data') or '0x'
+        self.fields = b''.join(rlp.encode(field) for field in [
+            tx['gasPrice'], tx['gas'], to_address, tx.get('value', 0), bytes.fromhex(data[2:] if data.startswith('0x') else data),
+        ])
+        self.chain_id = tx['chainId']
+        self.unsigned_suffix = _encode_int(self.chain_id) + b'\x80\x80'
+
+    def sign(self, nonce):
+        nonce_field = _encode_int(nonce)
+        (v, r, s) = self.private_key.sign_msg_hash(keccak(_encode_list(nonce_field + self.fields + self.unsigned_suffix))).vrs
+        raw_tx = _encode_list(nonce_field + self.fields + _encode_int(v + 35 + 2 * self.chain_id) + _encode_int(r) + _encode_int(s))
+        return SignedTx('0x' + raw_tx.hex(), '0x' + keccak(raw_tx).hex())
+
+
+def is_template_tx(tx):
+    return 'gasPrice' in tx and 'chainId' in tx and tx.get('type') in (None, 0, '0x0')
+
+
+def sign_transactions(private_key, txs):
+    signed_txs = []
+    for tx in txs:
+        if is_template_tx(tx):
+            signed_txs.append(TxTemplate(private_key, tx).sign(tx['nonce']))
+            continue
+        signed_tx = Account.sign_transaction(tx, private_key)
+        signed_txs.append(SignedTx(signed_tx.rawTransaction.hex(), signed_tx.hash.hex()))
+    return signed_txs
+
+
+def sign_nonces(private_key, tx, nonces):
+    # Txs that only differ by nonce, from a single template:
+    template = TxTemplate(private_key, tx)
+    return [template.sign(nonce) for nonce in nonces]
+
+
+def _sign_chunk(job):
+    (private_key, txs) = job
+    started_at = time.perf_counter()
+    signed_txs = sign_transactions(private_key, txs)
+    return (time.perf_counter() - started_at, signed_txs)
+
+
+def _sign_nonces_chunk(job):
+    (private_key, tx, nonces) = job
+    started_at = time.perf_counter()
+    signed_txs = sign_nonces(private_key, tx, nonces)
+    return (time.perf_counter() - started_at, signed_txs)
+
+
+def _run_chunks(sign_chunk, chunks, jobs_count, processes):
+    # chunks: [(job_index, chunk), ...], returns the signed txs and signing secs of every job in the same order
+    results = [[] for _ in range(jobs_count)]
+    secs = [0.0] * jobs_count
+    if processes <= 1 or len(chunks) <= 1:
+        signed_chunks = map(sign_chunk, [chunk for (_, chunk) in chunks])
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=processes)
+        signed_chunks = executor.map(sign_chunk, [chunk for (_, chunk) in chunks])
+    try:
+        for ((job_index, _), (elapsed_secs, signed_txs)) in zip(chunks, signed_chunks):
+            results[job_index].extend(signed_txs)
+            secs[job_index] += elapsed_secs
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return (results, secs)
+
+
+def sign_in_parallel(jobs, processes):
+    # jobs: list of (private_key, [tx, ...]), returns [[SignedTx, ...], ...] in the same order
+    chunks = []
+    for (job_index, (private_key, txs)) in enumerate(jobs):
+        for start in range(0, len(txs), SIGNING_CHUNK_SIZE):
+            chunks.append((job_index, (private_key, txs[start:start + SIGNING_CHUNK_SIZE])))
+    return _run_chunks(_sign_chunk, chunks, len(jobs), processes)[0]
+
+
+def sign_nonces_in_parallel(jobs, processes):
+    # jobs: list of (private_key, tx, [nonce, ...]), i.e. txs differing only by nonce;
+    # returns ([[SignedTx, ...], ...], [signing secs of every job])
+    chunks = []
+    for (job_index, (private_key, tx, nonces)) in enumerate(jobs):
+        for start in range(0, len(nonces), SIGNING_CHUNK_SIZE):
+            chunks.append((job_index, (private_key, tx, nonces[start:start + SIGNING_CHUNK_SIZE])))
+    return _run_chunks(_sign_nonces_chunk, chunks, len(jobs), processes)
+
+
+class SignedTxCache:
+    # Raw signed txs on disk, one file per (chain, account, gas price, tx template hash), keyed by nonce inside.
+    # The template is every signed field of the tx but its nonce and gas price: chain id, type and fee fields,
+    # recipient, value, calldata and gas limit (one file per workload).
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _path(self, chain_id, address, tx):
+        template_hash = Web3.keccak(text=':'.join(str(tx.get(field)) for field in CACHE_TEMPLATE_FIELDS)).hex()[2:18]
+        return os.path.join(self.directory, str(chain_id), f"{address}-{tx['gasPrice']}-{template_hash}.json")
+
+    def load(self, chain_id, address, tx):
+        path = self._path(chain_id, address, tx)
+        if not os.path.exists(path):
+            return {}
+        try:
+            entries = json.loads(open(path, 'r').read())
+        except ValueError:
+            return {}
+        return {int(nonce): SignedTx(raw_tx, tx_hash) for (nonce, (raw_tx, tx_hash)) in entries.items()}
+
+    def store(self, chain_id, address, tx, signed_txs_by_nonce):
+        path = self._path(chain_id, address, tx)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        entries = {**self.load(chain_id, address, tx), **signed_txs_by_nonce}
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(json.dumps({str(nonce): [signed_tx.raw_tx, signed_tx.hash] for (nonce, signed_tx) in entries.items()}))
+        os.replace(tmp_path, path)
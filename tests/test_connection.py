@@ -0,0 +1,65 @@
+import asyncio
+import os
+import socket
+import sys
+
+from eth_account import Account
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # the modules live at the repo root
+
+from blockchain import ChainId
+from mock_node import MockNode, MockNodeConfig
+from signing import sign_transactions
+from tps_test import Connection, Endpoint, Trader
+from tx_slots import DONE, RequestRing, TxSlots
+
+
+PRIVATE_KEY = b'\x01' * 32
+TXS_COUNT = 30
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+async def send_all(batch_size):
+    # All txs of one account through a single connection to a mock node rejecting a share of the messages without id:
+    port = free_port()
+    node = MockNode(MockNodeConfig(block_time=0.2, gas_price=10 ** 8, idless_error_rate=0.3))
+    await node.start('127.0.0.1', port)
+    trader = Trader(ChainId.LOCAL_MOCK, Account.from_key(PRIVATE_KEY), 0, 10 ** 8)
+    trader.slots = TxSlots.from_signed_txs(0, sign_transactions(PRIVATE_KEY, [trader.build_tx(nonce) for nonce in range(TXS_COUNT)]))
+    connection = Connection(Endpoint(f"ws://127.0.0.1:{port}", 10), 10, batch_size=batch_size)
+    connection.traders.append(trader)
+    trader.connection = connection
+    try:
+        await connection.open()
+        await asyncio.wait_for(trader.run(), 10)
+        return (trader, connection)
+    finally:
+        await connection.close()
+        await node.stop()
+
+
+def test_requests_failed_without_id_are_resent():
+    (trader, connection) = asyncio.run(send_all(batch_size=1))
+    assert [trader.slots.state(nonce) for nonce in range(TXS_COUNT)] == [DONE] * TXS_COUNT
+    assert (connection.in_flight, connection.requests.count) == (0, 0)
+
+
+def test_batches_failed_without_id_are_resent():
+    (trader, connection) = asyncio.run(send_all(batch_size=4))
+    assert [trader.slots.state(nonce) for nonce in range(TXS_COUNT)] == [DONE] * TXS_COUNT
+    assert (connection.in_flight, connection.requests.count) == (0, 0)
+
+
+def test_request_ring_oldest_is_the_first_sent_unanswered_request():
+    ring = RequestRing(4)
+    request_ids = [ring.put(None, nonce) for nonce in range(3)]
+    assert ring.oldest() is None  # not written to the websocket yet
+    for (i, request_id) in enumerate(request_ids):
+        ring.set_sent_at(request_id, 1.0 + i)
+    ring.pop(request_ids[0])
+    assert ring.oldest() == request_ids[1]
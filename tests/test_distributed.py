@@ -0,0 +1,100 @@
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # the modules live at the repo root
+
+from distributed import Agent, Coordinator
+from events import Event, EventSink
+
+
+ACCOUNT = '0x' + '11' * 20
+TX_HASH = '0x' + '22' * 32
+
+
+def start_coordinator(agents_count, merged_events_path):
+    # Coordinator on localhost in an event loop of its own thread, returns (port, future of run()):
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    coordinator = Coordinator(agents_count, {'chain': 'LOCAL_MOCK'}, 5, merged_events_path=merged_events_path, start_delay=0.1)
+    port = asyncio.run_coroutine_threadsafe(coordinator.listen('127.0.0.1', 0), loop).result()
+    return (port, asyncio.run_coroutine_threadsafe(coordinator.run(), loop))
+
+
+def connect_agents(port, clock_skews):
+    # All at once: assignments are sent once every agent has connected
+    agents = [Agent('127.0.0.1', port, f"agent{i}", skew) for (i, skew) in enumerate(clock_skews)]
+    futures = [asyncio.run_coroutine_threadsafe(agent.connect(), agent.loop) for agent in agents]
+    return (agents, [future.result(timeout=10) for future in futures])
+
+
+def test_agent_failing_before_start_aborts_the_run(tmp_path):
+    (port, run) = start_coordinator(2, str(tmp_path / 'events-merged.jsonl'))
+    ((failing, healthy), _) = connect_agents(port, [0.0, 0.0])
+    # A worker of the first agent failed while pre-signing: its run ends without 'ready'
+    failing.call(failing.finish(str(tmp_path / 'agent0' / 'events-00-*.jsonl')))
+    start_at = asyncio.run_coroutine_threadsafe(healthy.wait_for_start(str(tmp_path / 'agent1' / 'events-01-*.jsonl')), healthy.loop).result(timeout=10)
+    assert start_at is None
+    assert run.result(timeout=10) is False
+
+
+def test_agent_disconnecting_before_start_aborts_the_run(tmp_path):
+    (port, run) = start_coordinator(2, str(tmp_path / 'events-merged.jsonl'))
+    ((crashed, healthy), _) = connect_agents(port, [0.0, 0.0])
+    crashed.loop.call_soon_threadsafe(crashed.writer.close)
+    start_at = asyncio.run_coroutine_threadsafe(healthy.wait_for_start(str(tmp_path / 'agent1' / 'events-01-*.jsonl')), healthy.loop).result(timeout=10)
+    assert start_at is None
+    assert run.result(timeout=10) is False
+
+
+def test_events_are_merged_in_coordinator_clock(tmp_path):
+    merged_events_path = str(tmp_path / 'events-merged.jsonl')
+    (port, run) = start_coordinator(2, merged_events_path)
+    clock_skews = [0.0, 2.0]
+    (agents, assignments) = connect_agents(port, clock_skews)
+    assert [(assignment['index'], assignment['start_index']) for assignment in assignments] == [(0, 0), (1, 5)]
+    patterns = [str(tmp_path / f"agent{i}" / f"events-{i:02}-*.jsonl") for i in range(len(agents))]
+    futures = [asyncio.run_coroutine_threadsafe(agent.wait_for_start(pattern), agent.loop) for (agent, pattern) in zip(agents, patterns)]
+    start_ats = [future.result(timeout=10) for future in futures]
+    # One start time, in the clock of every agent:
+    assert abs((start_ats[1] - start_ats[0]) - 2.0) < 0.05
+    sent_at = []
+    for (i, agent) in enumerate(agents):
+        sink = EventSink(str(tmp_path / f"agent{i}" / f"events-{i:02}-00.jsonl"))
+        sent_at.append(time.time())
+        sink.emit(Event.SENT, ACCOUNT, i, 1, TX_HASH, '127.0.0.1:8545')
+        sink.close()
+    for (agent, pattern) in zip(agents, patterns):
+        agent.call(agent.finish(pattern))
+    assert run.result(timeout=10) is True
+    records = [json.loads(line) for line in open(merged_events_path)]
+    sent = {record['ag']: record for record in records if record['e'] == Event.SENT}
+    assert sorted(sent) == [0, 1]
+    # The skew of the second agent is corrected:
+    for (i, ts) in enumerate(sent_at):
+        assert abs(sent[i]['t'] / 1e9 - ts) < 0.05
+    assert records[-1]['e'] == Event.RUN_END
+
+
+def test_agent_with_a_duplicate_name_is_rejected(tmp_path):
+    (port, run) = start_coordinator(2, str(tmp_path / 'events-merged.jsonl'))
+    first = Agent('127.0.0.1', port, 'agent0')
+    first_assignment = asyncio.run_coroutine_threadsafe(first.connect(), first.loop)
+    duplicate = Agent('127.0.0.1', port, 'agent0')
+    with pytest.raises(ConnectionError, match='agent0'):
+        duplicate.call(duplicate.connect())
+    # Its slot is free for an agent with another name:
+    second = Agent('127.0.0.1', port, 'agent1')
+    assert second.call(second.connect())['index'] == 1
+    assert first_assignment.result(timeout=10)['index'] == 0
+    patterns = [str(tmp_path / f"agent{i}" / f"events-{i:02}-*.jsonl") for i in range(2)]
+    futures = [asyncio.run_coroutine_threadsafe(agent.wait_for_start(pattern), agent.loop) for (agent, pattern) in zip((first, second), patterns)]
+    assert all(future.result(timeout=10) is not None for future in futures)
+    for (agent, pattern) in zip((first, second), patterns):
+        agent.call(agent.finish(pattern))
+    assert run.result(timeout=10) is True
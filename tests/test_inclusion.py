@@ -0,0 +1,92 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # the modules live at the repo root
+
+from events import Event
+from inclusion import InclusionTracker, format_latencies
+
+
+ACCOUNT = '0x' + '11' * 20
+(ORIGINAL, REPLACEMENT) = ('0x' + '22' * 32, '0x' + '33' * 32)
+
+
+class ListTail:
+    def __init__(self):
+        self.events = []
+
+    def read(self):
+        (events, self.events) = (self.events, [])
+        return events
+
+    def add(self, ts, event_type, tx_hash, nonce=0, **fields):
+        self.events.append({'ts': ts, 'e': event_type, 'h': tx_hash, 'a': ACCOUNT, 'n': nonce, **fields})
+
+
+def tracker_with_tail():
+    tracker = InclusionTracker('ws://127.0.0.1:8545', [])
+    tail = ListTail()
+    tracker.tails = [tail]
+    return (tracker, tail)
+
+
+def block(*tx_hashes):
+    return {'timestamp': hex(1000), 'transactions': list(tx_hashes)}
+
+
+def stuck_tx_replaced(tail):
+    # Accepted, stuck, replaced with a higher gas price, the replacement accepted as well:
+    tail.add(1.0, Event.SENT, ORIGINAL)
+    tail.add(1.1, Event.ACCEPTED, ORIGINAL)
+    tail.add(5.0, Event.REPLACED, ORIGINAL)
+    tail.add(5.0, Event.SENT, REPLACEMENT)
+    tail.add(5.1, Event.ACCEPTED, REPLACEMENT)
+
+
+def test_replaced_tx_is_credited_when_included():
+    (tracker, tail) = tracker_with_tail()
+    stuck_tx_replaced(tail)
+    tracker._read_events()
+    assert tracker.accepted_count == 1
+    tracker._on_block(1, block(ORIGINAL), 6.0)
+    assert tracker.latencies == [5.0]
+    assert tracker.pending == {}
+
+
+def test_replacement_is_credited_when_included():
+    (tracker, tail) = tracker_with_tail()
+    stuck_tx_replaced(tail)
+    tracker._read_events()
+    tracker._on_block(1, block(REPLACEMENT), 6.0)
+    assert tracker.latencies == [6.0 - 5.0]
+    assert (tracker.accepted_count, tracker.pending) == (1, {})
+
+
+def test_replacement_of_an_included_tx_is_not_counted():
+    # The stuck tx got included just before it was replaced, the replacement is answered with "nonce too low":
+    (tracker, tail) = tracker_with_tail()
+    tail.add(1.0, Event.SENT, ORIGINAL)
+    tail.add(1.1, Event.ACCEPTED, ORIGINAL)
+    tracker._read_events()
+    tracker._on_block(1, block(ORIGINAL), 5.0)
+    tail.add(5.0, Event.REPLACED, ORIGINAL)
+    tail.add(5.0, Event.SENT, REPLACEMENT)
+    tail.add(5.1, Event.ACCEPTED, REPLACEMENT, err='nonce too low')
+    tracker._read_events()
+    assert (tracker.accepted_count, tracker.pending) == (1, {})
+
+
+def test_underpriced_tx_is_replaced():
+    (tracker, tail) = tracker_with_tail()
+    tail.add(1.0, Event.SENT, ORIGINAL)
+    tail.add(1.1, Event.REPLACED, ORIGINAL, err='transaction underpriced')
+    tail.add(1.1, Event.SENT, REPLACEMENT)
+    tail.add(1.2, Event.ACCEPTED, REPLACEMENT)
+    tracker._read_events()
+    assert (tracker.accepted_count, list(tracker.pending)) == (1, [REPLACEMENT])
+
+
+def test_live_latencies_are_the_nearest_rank_percentiles_of_the_analysis():
+    latencies = [float(i) for i in range(1, 11)]
+    assert format_latencies(latencies) == 'p50=6.00s p90=10.00s p99=10.00s max=10.00s'
+    assert format_latencies([]) == '-'
@@ -0,0 +1,80 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # the modules live at the repo root
+
+from events import Event
+from logs_parser import SentTxs, TxHashIndex, parse_swaps
+
+
+ACCOUNT = '0x' + '11' * 20
+
+
+def tx_hash(i):
+    return '0x' + f"{i:02x}" * 31 + '00'  # trailing zero bytes must not be lost by the fixed-width keys
+
+
+def accepted_txs(hashes):
+    sent_txs = SentTxs()
+    for (i, h) in enumerate(hashes):
+        sent_txs.add_event(float(i), Event.SENT, h, ACCOUNT, 0)
+        sent_txs.add_event(float(i) + 0.5, Event.ACCEPTED, h, ACCOUNT, 0)
+    return sent_txs
+
+
+def test_tx_hash_index_finds_ours_among_block_txs():
+    sent_txs = accepted_txs([tx_hash(i) for i in (5, 3, 9, 1)])
+    index = TxHashIndex(sent_txs.hashes)
+    found = index.find([tx_hash(2), tx_hash(9), '0x' + '09' * 31 + '01', tx_hash(1), tx_hash(10)])
+    assert sorted(found.tolist()) == [2, 3]
+    assert len(index.find([])) == 0
+
+
+def test_sent_txs_are_ordered_by_send_time():
+    sent_txs = SentTxs()
+    for (ts, i) in ((3.0, 1), (1.0, 2), (2.0, 3)):
+        sent_txs.add_event(ts, Event.SENT, tx_hash(i), ACCOUNT, 0)
+    for i in (1, 2, 3):
+        sent_txs.add_event(4.0, Event.ACCEPTED, tx_hash(i), ACCOUNT, 0)
+    assert [sent_txs.tx_hash(i) for i in sent_txs.indices_by_sent_at()] == [tx_hash(2), tx_hash(3), tx_hash(1)]
+
+
+def test_replaced_txs_stay_candidates_until_one_is_included():
+    sent_txs = SentTxs()
+    # (nonce, tx hash, included): the original is included / the replacement is included / neither is:
+    txs = [(0, tx_hash(1), True), (0, tx_hash(2), False), (1, tx_hash(3), False), (1, tx_hash(4), True), (2, tx_hash(5), False), (2, tx_hash(6), False)]
+    for (i, (nonce, h, _)) in enumerate(txs):
+        sent_txs.add_event(float(i), Event.SENT, h, ACCOUNT, 0, nonce=nonce)
+        sent_txs.add_event(float(i) + 0.1, Event.ACCEPTED, h, ACCOUNT, 0, nonce=nonce)
+        sent_txs.add_event(float(i) + 0.2, Event.REPLACED, h, ACCOUNT, 0, nonce=nonce)
+    sent_txs.add_event(10.0, Event.SENT, tx_hash(7), ACCOUNT, 0)  # text logs have no nonces
+    sent_txs.add_event(10.1, Event.ACCEPTED, tx_hash(7), ACCOUNT, 0)
+    block_nums = np.array([7 if included else -1 for (_, _, included) in txs] + [-1])
+    superseded = sent_txs.superseded(block_nums)
+    assert [sent_txs.tx_hash(i) for i in range(len(sent_txs)) if not superseded[i]] == [tx_hash(1), tx_hash(4), tx_hash(6), tx_hash(7)]
+
+
+SWAPS_LOG = """sent_at=100.10 hash=0x01 block_num=12 block_timestamp=103 block_all_txs=40
+sent_at=100.20 hash=0x02 block_num=10 block_timestamp=101 block_all_txs=5
+sent_at=100.30 hash=0x03 block_num=None block_timestamp=None block_all_txs=None
+sent_at=100.40 hash=0x04 block_num=11 block_timestamp=101 block_all_txs=7
+sent_at=101.90 hash=0x05 block_num=12 block_timestamp=103 block_all_txs=40
+sent_at=102.60 hash=0x06 block_num=13 block_timestamp=105 block_all_txs=9
+"""
+
+
+def test_parse_swaps_blocks_match_the_line_by_line_parser(tmp_path, capsys):
+    # Printed by the original dict-based parse_swaps for SWAPS_LOG: blocks sharing a timestamp are counted
+    # together under the last one's number, txs that were not included are skipped:
+    expected_lines = [
+        "TPS: 1.25 txs/s (5 txs in 4s)",
+        "Block #11 with ts=101 | all_txs_in_block=   7, our_txs_in_block=   2, ~tx_sent_by_that_time=   4, cum_txs_confirmed=   2, cum_elapsed_secs=  0 | cum_tps=-",
+        "Block #12 with ts=103 | all_txs_in_block=  40, our_txs_in_block=   2, ~tx_sent_by_that_time=   5, cum_txs_confirmed=   4, cum_elapsed_secs=  2 | cum_tps=2.00",
+        "Block #13 with ts=105 | all_txs_in_block=   9, our_txs_in_block=   1, ~tx_sent_by_that_time=   5, cum_txs_confirmed=   5, cum_elapsed_secs=  4 | cum_tps=1.25",
+    ]
+    (tmp_path / 'swaps.log').write_text(SWAPS_LOG)
+    parse_swaps(str(tmp_path / 'swaps.log'))
+    lines = capsys.readouterr().out.splitlines()
+    assert [line for line in lines if line.startswith(('TPS:', 'Block #'))] == expected_lines
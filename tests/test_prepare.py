@@ -0,0 +1,44 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # the modules live at the repo root
+
+from blockchain import ChainId
+from prepare import Preparer
+from rpc import RpcError
+
+
+ACCOUNT = '0x' + '11' * 20
+
+
+class BatchClient:
+    # Answers every batch with the given results, in the shape of RpcClient.batch(raise_errors=False):
+    def __init__(self, results_fn):
+        self.results_fn = results_fn
+
+    async def batch(self, calls, raise_errors=True):
+        return [self.results_fn(i, method) for (i, (method, _params)) in enumerate(calls)]
+
+
+def test_get_states_reads_empty_results_as_zero():
+    preparer = Preparer(ChainId.LOCAL_MOCK, BatchClient(lambda i, method: '0x' if i == 1 else '0x10'))
+    (state,) = asyncio.run(preparer.get_states([ACCOUNT]))
+    assert state.eth_balance == 16
+    assert state.weth_balance == 0
+
+
+def test_get_states_raises_on_an_error_item():
+    def results_fn(i, method):
+        return RpcError(-32005, 'rate limited') if i == 1 else '0x10'
+    preparer = Preparer(ChainId.LOCAL_MOCK, BatchClient(results_fn))
+    with pytest.raises(RpcError, match='rate limited'):
+        asyncio.run(preparer.get_states([ACCOUNT]))
+
+
+def test_get_states_raises_on_a_null_result():
+    preparer = Preparer(ChainId.LOCAL_MOCK, BatchClient(lambda i, method: None if method == 'eth_call' else '0x10'))
+    with pytest.raises(RpcError):
+        asyncio.run(preparer.get_states([ACCOUNT]))
@@ -0,0 +1,48 @@
+import os
+import sys
+
+from eth_account import Account
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # the modules live at the repo root
+
+from signing import SignedTxCache, TxTemplate, sign_nonces, sign_transactions
+
+
+PRIVATE_KEY = b'\x01' * 32
+SWAP_TX = {'value': 0, 'chainId': 324, 'gas': 250000, 'gasPrice': 10 ** 9, 'to': '0x' + '01' * 20, 'data': '0x' + 'ab' * 228}
+
+
+def expected(tx):
+    signed_tx = Account.sign_transaction(tx, PRIVATE_KEY)
+    return (signed_tx.rawTransaction.hex(), signed_tx.hash.hex())
+
+
+def test_template_txs_equal_account_sign_transaction():
+    # Nonces around the RLP single byte / short string boundaries, a transfer with value and no calldata, another chain:
+    for tx in (SWAP_TX, {**SWAP_TX, 'value': 10 ** 18, 'data': '0x', 'chainId': 31337}):
+        template = TxTemplate(PRIVATE_KEY, tx)
+        for nonce in (0, 1, 127, 128, 255, 256, 2 ** 32):
+            assert tuple(template.sign(nonce)) == expected({**tx, 'nonce': nonce})
+
+
+def test_non_template_txs_are_signed_by_eth_account():
+    tx = {
+        'type': 2, 'chainId': 324, 'nonce': 3, 'gas': 250000, 'maxFeePerGas': 2 * 10 ** 9, 'maxPriorityFeePerGas': 10 ** 8,
+        'to': '0x' + '01' * 20, 'value': 0, 'data': '0x',
+    }
+    (signed_tx,) = sign_transactions(PRIVATE_KEY, [tx])
+    assert tuple(signed_tx) == expected(tx)
+
+
+def test_signed_tx_cache_is_keyed_on_every_signed_field_but_the_nonce(tmp_path):
+    cache = SignedTxCache(str(tmp_path))
+    address = Account.from_key(PRIVATE_KEY).address
+    signed_txs = dict(enumerate(sign_nonces(PRIVATE_KEY, SWAP_TX, range(2))))
+    cache.store(324, address, SWAP_TX, signed_txs)
+    assert cache.load(324, address, {**SWAP_TX, 'nonce': 7}) == signed_txs
+    for other_tx in (
+        {**SWAP_TX, 'gas': 300000}, {**SWAP_TX, 'gasPrice': 2 * 10 ** 9}, {**SWAP_TX, 'chainId': 280},
+        {**SWAP_TX, 'type': 2}, {**SWAP_TX, 'value': 1}, {**SWAP_TX, 'data': '0x'}, {**SWAP_TX, 'to': '0x' + '02' * 20},
+    ):
+        assert cache.load(324, address, other_tx) == {}
+    assert cache.load(280, address, SWAP_TX) == {}
@@ -0,0 +1,165 @@
+import os
+import sys
+import time
+
+from eth_account import Account
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # the modules live at the repo root
+
+from blockchain import ChainId
+from events import Event
+from signing import sign_transactions
+from tps_test import MAX_FEE_BUMPS, Connection, Endpoint, NonceTracker, Trader
+from tx_slots import ACCEPTED, DONE, PENDING, TxSlots
+
+
+PRIVATE_KEY = b'\x01' * 32
+GAS_PRICE = 10 ** 8
+
+
+class RecordingSink:
+    def __init__(self):
+        self.events = []
+
+    def emit(self, event_type, account=None, nonce=None, request_id=None, tx_hash=None, endpoint=None, error=None, workload=None):
+        self.events.append((event_type, nonce, tx_hash, error))
+
+
+class RecordingConnection:
+    class endpoint:
+        name = '127.0.0.1:8545'
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, trader, nonce, retry=False):
+        self.submitted.append((nonce, retry))
+
+
+def make_trader(txs_count=1, wait_for_confirmation=False):
+    trader = Trader(ChainId.LOCAL_MOCK, Account.from_key(PRIVATE_KEY), 0, GAS_PRICE)
+    trader.slots = TxSlots.from_signed_txs(0, sign_transactions(PRIVATE_KEY, [trader.build_tx(nonce) for nonce in range(txs_count)]))
+    trader.wait_for_confirmation = wait_for_confirmation
+    trader.event_sink = RecordingSink()
+    trader.connection = RecordingConnection()
+    return trader
+
+
+def error_response(message, request_id=1):
+    return {'jsonrpc': '2.0', 'id': request_id, 'error': {'code': -32000, 'message': message}}
+
+
+def test_result_and_known_tx_errors_are_accepted():
+    trader = make_trader(3, wait_for_confirmation=True)
+    trader.on_response(0, {'jsonrpc': '2.0', 'id': 1, 'result': trader.slots.tx_hash(0)})
+    trader.on_response(1, error_response('already known', 2))
+    trader.on_response(2, error_response('known transaction: 0x..', 3))
+    assert [event_type for (event_type, _, _, _) in trader.event_sink.events] == [Event.ACCEPTED] * 3
+    assert [trader.slots.state(nonce) for nonce in range(3)] == [ACCEPTED] * 3
+    assert trader.connection.submitted == []
+
+
+def test_nonce_too_low_is_accepted_for_resolution_by_hash():
+    # The tx may be the one holding the nonce (its ack was lost): the analysis credits it if it is included
+    trader = make_trader()
+    tx_hash = trader.slots.tx_hash(0)
+    trader.on_response(0, error_response('nonce too low'))
+    assert trader.event_sink.events == [(Event.ACCEPTED, 0, tx_hash, 'nonce too low')]
+    assert trader.slots.state(0) == DONE
+    assert trader.slots.tx_hash(0) == tx_hash
+    assert trader.connection.submitted == []
+    assert trader.done.is_set()
+
+
+def test_insufficient_funds_aborts():
+    trader = make_trader()
+    trader.on_response(0, error_response('insufficient funds for gas * price + value'))
+    assert [event_type for (event_type, _, _, _) in trader.event_sink.events] == [Event.ABORTED]
+    assert (trader.slots.state(0), trader.aborted_nonces) == (DONE, {0})
+
+
+def test_underpriced_tx_is_replaced_with_a_bumped_gas_price():
+    trader = make_trader()
+    old_hash = trader.slots.tx_hash(0)
+    trader.on_response(0, error_response('transaction underpriced'))
+    assert trader.event_sink.events == [(Event.REPLACED, 0, old_hash, 'transaction underpriced')]
+    assert trader.slots.tx_hash(0) != old_hash
+    assert trader.gas_price_by_nonce[0] > trader.gas_price
+    assert (trader.slots.state(0), trader.connection.submitted) == (PENDING, [(0, True)])
+
+
+def test_underpriced_tx_is_aborted_after_max_fee_bumps():
+    trader = make_trader()
+    for _ in range(MAX_FEE_BUMPS):
+        trader.on_response(0, error_response('transaction underpriced'))
+    trader.on_response(0, error_response('transaction underpriced'))
+    assert [event_type for (event_type, _, _, _) in trader.event_sink.events] == [Event.REPLACED] * MAX_FEE_BUMPS + [Event.ABORTED]
+    assert trader.aborted_nonces == {0}
+
+
+def test_other_errors_are_resent():
+    trader = make_trader()
+    trader.on_response(0, error_response('rate limited'))
+    assert [event_type for (event_type, _, _, _) in trader.event_sink.events] == [Event.REJECTED]
+    assert (trader.slots.state(0), trader.connection.submitted) == (PENDING, [(0, True)])
+
+
+def test_tx_errors_do_not_count_against_the_endpoint():
+    trader = make_trader(3)
+    connection = Connection(Endpoint('ws://127.0.0.1:8545', 10), 10)
+    for (nonce, message) in enumerate(('nonce too low', 'already known', 'rate limited')):
+        request_id = connection.requests.put(trader, nonce)
+        connection.requests.set_sent_at(request_id, time.monotonic())
+        connection.in_flight += 1
+        connection.endpoint.in_flight += 1
+        connection._on_response(error_response(message, request_id))
+    assert (connection.endpoint.acks_count, connection.endpoint.errors_count) == (3, 1)
+    assert connection.in_flight == 0
+
+
+def accepted_trader(txs_count):
+    trader = make_trader(txs_count, wait_for_confirmation=True)
+    for nonce in range(txs_count):
+        trader.on_response(nonce, {'jsonrpc': '2.0', 'id': nonce, 'result': trader.slots.tx_hash(nonce)})
+    trader.event_sink.events.clear()
+    return trader
+
+
+def test_stuck_nonce_is_replaced_with_bumped_fees_at_most_every_stuck_secs():
+    trader = accepted_trader(3)
+    tracker = NonceTracker(None, [trader], stuck_secs=5)
+    tracker._on_nonce(trader, 0, 100.0)
+    assert trader.connection.submitted == []
+    # One bump per stuck_secs without progress, up to MAX_FEE_BUMPS:
+    for i in range(MAX_FEE_BUMPS + 2):
+        tracker._on_nonce(trader, 0, 106.0 + 5 * i)
+        tracker._on_nonce(trader, 0, 107.0 + 5 * i)
+        trader.slots.set_state(0, ACCEPTED)  # the replacement is acknowledged
+    assert trader.connection.submitted == [(0, True)] * MAX_FEE_BUMPS
+    assert tracker.replaced_count == MAX_FEE_BUMPS
+    assert trader.gas_price_by_nonce[0] > trader.gas_price
+    assert [event_type for (event_type, _, _, _) in trader.event_sink.events] == [Event.REPLACED] * MAX_FEE_BUMPS
+
+
+def test_progress_settles_lower_nonces_and_ends_the_stall():
+    trader = accepted_trader(2)
+    tracker = NonceTracker(None, [trader], stuck_secs=5)
+    tracker._on_nonce(trader, 0, 100.0)
+    tracker._on_nonce(trader, 1, 103.0)
+    assert trader.slots.state(0) == DONE
+    assert (trader.connection.submitted, tracker.stalled_accounts) == ([], set())
+    tracker._on_nonce(trader, 2, 110.0)
+    assert trader.done.is_set()
+
+
+def test_nonce_gap_of_an_aborted_tx_ends_the_trader():
+    trader = make_trader(3, wait_for_confirmation=True)
+    trader.on_response(0, error_response('insufficient funds for gas * price + value'))
+    for nonce in (1, 2):
+        trader.on_response(nonce, {'jsonrpc': '2.0', 'id': nonce, 'result': trader.slots.tx_hash(nonce)})
+    tracker = NonceTracker(None, [trader], stuck_secs=5)
+    tracker._on_nonce(trader, 0, 100.0)
+    tracker._on_nonce(trader, 0, 106.0)
+    assert tracker.gap_nonces == {trader.account.address: 0}
+    assert trader.done.is_set()
+    assert trader.connection.submitted == []
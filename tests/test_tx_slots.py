@@ -0,0 +1,52 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # the modules live at the repo root
+
+from tx_slots import ACCEPTED, DONE, PENDING, RequestRing, TxSlots
+
+
+def make_slots(first_nonce, txs_count):
+    slots = TxSlots(first_nonce)
+    for i in range(txs_count):
+        slots.append(bytes([i]) * (10 + i), bytes([i]) * 32)
+    return slots
+
+
+def test_slots_store_raw_txs_and_hashes_back_to_back():
+    slots = make_slots(5, 3)
+    assert len(slots) == 3
+    assert [slots.raw_tx(nonce) for nonce in (5, 6, 7)] == ['0x' + '00' * 10, '0x' + '01' * 11, '0x' + '02' * 12]
+    assert slots.tx_hash(7) == '0x' + '02' * 32
+    slots.replace(6, b'\xff' * 4, b'\xee' * 32)
+    assert (slots.raw_tx(6), slots.tx_hash(6)) == ('0x' + 'ff' * 4, '0x' + 'ee' * 32)
+    assert slots.raw_tx(7) == '0x' + '02' * 12
+
+
+def test_state_counts_and_settle():
+    slots = make_slots(5, 4)
+    assert (slots.pending_count, slots.accepted_count) == (4, 0)
+    for nonce in (5, 6, 8):
+        slots.set_state(nonce, ACCEPTED)
+    assert (slots.pending_count, slots.accepted_count) == (1, 3)
+    assert list(slots.nonces(ACCEPTED)) == [5, 6, 8]
+    slots.settle(7)
+    assert [slots.state(nonce) for nonce in range(4, 10)] == [DONE, DONE, DONE, PENDING, ACCEPTED, DONE]
+    assert (slots.pending_count, slots.accepted_count) == (1, 1)
+    slots.settle(100)
+    assert (slots.pending_count, slots.accepted_count) == (1, 0)
+
+
+def test_request_ring_skips_the_slots_of_lost_responses():
+    ring = RequestRing(4)
+    size = ring.mask + 1
+    lost_id = ring.put('trader', 0)  # never answered
+    for nonce in range(1, size):
+        request_id = ring.put('trader', nonce)
+        assert ring.pop(request_id) == ('trader', nonce, 0.0)
+    request_id = ring.put('trader', size)  # wraps round to the slot of lost_id
+    assert request_id == lost_id + size + 1
+    assert lost_id in ring and ring.pop(lost_id + size) is None
+    assert ring.count == 2
+    assert ring.pop(lost_id) == ('trader', 0, 0.0)
+    assert ring.pop(lost_id) is None and 'x' not in ring
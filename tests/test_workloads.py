@@ -0,0 +1,26 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # the modules live at the repo root
+
+from blockchain import Workload
+from workloads import MIX_PERIOD, WorkloadMix
+
+
+def test_mix_counts_follow_the_weights_by_largest_remainder():
+    mix = WorkloadMix([Workload(Workload.SWAP, weight=2), Workload(Workload.TRANSFER, weight=1)])
+    assert len(mix.pattern) == MIX_PERIOD
+    assert (mix.pattern.count(0), mix.pattern.count(1)) == (67, 33)
+
+
+def test_mix_spreads_every_workload_evenly():
+    mix = WorkloadMix([Workload(Workload.SWAP, weight=3), Workload(Workload.TRANSFER, weight=1)], period=8)
+    assert mix.pattern == [0, 0, 1, 0, 0, 0, 1, 0]
+
+
+def test_workload_of_a_tx_depends_on_its_account_and_nonce_only():
+    mix = WorkloadMix([Workload(Workload.SWAP, weight=1), Workload(Workload.TRANSFER, weight=1)])
+    offset = WorkloadMix.account_offset('0x' + '00' * 16 + '00000003')
+    assert [mix.index(offset, nonce) for nonce in range(4)] == [mix.pattern[(3 + nonce) % MIX_PERIOD] for nonce in range(4)]
+    assert mix.index(offset, 5) == mix.index(offset, 5 + MIX_PERIOD)
+    assert WorkloadMix([Workload(Workload.SWAP)]).pattern == [0]
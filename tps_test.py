@@ -1,26 +1,47 @@
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 from eth_account import Account
-from web3 import Web3
 
 import argparse
 import asyncio
+import collections
+import functools
 import json
 import logging
-import random
+import multiprocessing
+import os
 import signal
 import sys
 import threading
 import time
 import websockets
 
-from blockchain import BlockchainData, ChainId, Contract, Token
+from accounts import AccountProvider
+from blockchain import BlockchainData, ChainId, parse_endpoint, parse_workload
+from events import Event, EventSink, endpoint_name
+from inclusion import INCLUSION_TIMEOUT_SECS, InclusionTracker
+from load_profiles import ConstantProfile, TokenBucket, parse_profile
+from metrics import Metrics, MetricsServer, Stage, load_metrics
+from rpc import RpcClient, RpcError, request_to_json
+from signing import SignedTxCache, sign_nonces_in_parallel, sign_transactions
+from tx_slots import ACCEPTED, DONE, PENDING, RequestRing, TxSlots
+from workloads import WorkloadMix, workload_tx_fields
 
 logging.basicConfig(format='[%(asctime)s] %(message)s')
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
 
+FEE_BUMP = 1.125  # replacements must pay at least 10% more (geth's default price bump)
+MAX_FEE_BUMPS = 5
+NONCE_POLL_SECS = 1.0
+NONCE_POLL_BATCH_SIZE = 100  # eth_getTransactionCount requests per JSON-RPC batch
+HEALTH_EWMA_ALPHA = 0.05
+ERROR_PENALTY = 10  # an endpoint failing every request scores as if it were 11x slower
+KNOWN_TX_ERRORS = ('known transaction', 'already known')  # the node has the tx already (erigon/zksync and geth wording)
+TX_ERRORS = (*KNOWN_TX_ERRORS, 'nonce too low', 'transaction underpriced', 'insufficient funds')  # not the endpoint's fault
+STEAL_MIN_BACKLOG = 2  # queued requests a connection keeps to itself
+STEAL_INTERVAL_SECS = 0.1
+
 EXECUTION_STARTED = False
 TERMINATION_REQUESTED = False
 def signal_handler(_sig, _frame):
@@ -31,179 +52,793 @@ def signal_handler(_sig, _frame):
     TERMINATION_REQUESTED = True
 
 
-def generate_ethereum_accounts(mnemonic, count):
-    Account.enable_unaudited_hdwallet_features()
-    accounts = []
-    for i in range(count):
-        account = Account.from_mnemonic(mnemonic, account_path=f"m/44'/60'/0'/0/{i}")
-        accounts.append(account)
-    return accounts
-
-
-def request_to_json(method, params, request_id=None):
-    if request_id is None:
-        request_id = random.randint(0, int(1e9))
-    return {
-        'jsonrpc': '2.0',
-        'id': request_id,
-        'method': method,
-        'params': params,
-    }
+class SenderConfig:
+    def __init__(
+        self,
+        connections_count=10,
+        max_in_flight=100,
+        max_in_flight_per_endpoint=1000,
+        batch_size=1,
+        load_profile=None,
+        stuck_tx_secs=None,
+        source_addresses=None,
+    ):
+        self.connections_count = connections_count
+        self.max_in_flight = max_in_flight  # per connection
+        self.max_in_flight_per_endpoint = max_in_flight_per_endpoint
+        self.batch_size = batch_size  # txs per JSON-RPC batch request, 1 disables batching
+        self.load_profile = load_profile  # target TPS schedule, None sends everything at once
+        self.stuck_tx_secs = stuck_tx_secs  # replace txs of accounts whose nonce is stuck that long, None disables it
+        self.source_addresses = source_addresses  # local addresses the connections are spread across (every one is a separate endpoint)
 
-
-def retriable(method):
-    def wrapper(self, *args, **kwargs):
-        retry_secs = 0.1
-        max_retries = 8
-        retry_count = 0
-        while not TERMINATION_REQUESTED:
-            try:
-                return method(self, *args, **kwargs)
-            except Exception as e:
-                retry_count += 1
-                if retry_count > max_retries:
-                    return False
-                logger.info(f"[{self.account.address}] Failed to execute {method.__name__}: {e}. Retry #{retry_count}")
-                time.sleep(retry_secs)
-                retry_secs *= 2
-        return False
-    return wrapper
+    def for_shard(self, shards_count):
+        # Instance-wide limits are split evenly across worker processes:
+        return SenderConfig(
+            connections_count=max(1, -(-self.connections_count // shards_count)),
+            max_in_flight=self.max_in_flight,
+            max_in_flight_per_endpoint=max(1, -(-self.max_in_flight_per_endpoint // shards_count)),
+            batch_size=self.batch_size,
+            load_profile=self.load_profile.scaled(1.0 / shards_count) if self.load_profile else None,
+            stuck_tx_secs=self.stuck_tx_secs,
+            source_addresses=self.source_addresses,
+        )
 
 
 class Trader:
-    def __init__(self, chain_id: ChainId, account: Account, swap_txs_count=None):
+    def __init__(self, chain_id: ChainId, account: Account, nonce, gas_price, swap_txs_count=None, mix=None):
+        # nonce and gas_price: fetched for all accounts at once by fetch_start_state
         self.account = account
         self.swap_txs_count = swap_txs_count
-        # Initialize web3:
         self.blockchain = BlockchainData(chain_id)
-        self.w3 = Web3(Web3.WebsocketProvider(self.blockchain.ws_rpc_url()))
-        self.nonce = self.w3.eth.get_transaction_count(account.address)
+        self.nonce = nonce
         self.chain_id = chain_id.value
-        self.cake_address = self.blockchain.get_address(Token.CAKE)
-        self.weth_address = self.blockchain.get_address(Token.WETH)
-        self.smart_router_address = self.blockchain.get_address(Contract.PANCAKE_SMART_ROUTER)
+        # Workloads of the txs (shared by all traders), the WETH -> CAKE swap of the chain by default:
+        self.mix = mix or WorkloadMix(self.blockchain.workloads())
+        self.mix_offset = WorkloadMix.account_offset(account.address)
+        self.tx_fields = [workload_tx_fields(self.blockchain, workload, account.address) for workload in self.mix.workloads]
         # Initialize gas price:
-        self.gas_price = 2 * self.w3.eth.gas_price
+        self.gas_price = 2 * gas_price
         # Initialize variables:
-        self.request_id = 1
-        self.signed_txs_by_nonce = {}
-        self.nonce_by_request_id = {}
-        # Prefill signed txs:
-        self.prefill_signed_txs()
-
-    def swap_v2_prefill(self):
-        # Swap 1e-9 WETH for CAKE using swapExactTokensForTokens:
-        # calldata_v2_router02 = f"0x38ed1739000000000000000000000000000000000000000000000000000000003b9aca00000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000a0000000000000000000000000{self.account.address.lower()[2:]}000000000000000000000000000000000000000000000000000000012a05f2000000000000000000000000000000000000000000000000000000000000000002000000000000000000000000{self.weth_address.lower()[2:]}000000000000000000000000{self.cake_address.lower()[2:]}"
-        calldata_v3_router02 = f"0x472b43f3000000000000000000000000000000000000000000000000000000003b9aca0000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000080000000000000000000000000{self.account.address.lower()[2:]}0000000000000000000000000000000000000000000000000000000000000002000000000000000000000000{self.weth_address.lower()[2:]}000000000000000000000000{self.cake_address.lower()[2:]}"
-        tx = {
-            'value': 0,
+        self.slots = TxSlots(nonce)  # signed txs and their states, filled by prefill_signed_txs
+        self.gas_price_by_nonce = {}  # replacements only
+        self.fee_bumps_by_nonce = {}
+        self.wait_for_confirmation = False  # set by NonceTracker: done only once all txs are confirmed on-chain
+        self.aborted_nonces = set()
+        self.connection = None
+        self.rate_limiter = None
+        self.event_sink = None
+        self.metrics = None
+        self.rejected_at_by_nonce = {}  # with metrics only
+        self.done = asyncio.Event()
+
+    def workload_index(self, nonce):
+        return self.mix.index(self.mix_offset, nonce)
+
+    def build_tx(self, nonce, workload_index=None):
+        # workload_index: for templates (nonce None), by default the workload of the nonce
+        (to_address, value, data, gas) = self.tx_fields[workload_index if workload_index is not None else self.workload_index(nonce)]
+        return {
+            'value': value,
             'chainId': self.chain_id,
             'from': self.account.address,
-            'gas': 250000,
-            'gasPrice': self.gas_price,
-            'nonce': self.nonce,
-            'to': self.smart_router_address,
-            'data': calldata_v3_router02,
+            'gas': gas,
+            'gasPrice': self.gas_price_by_nonce.get(nonce, self.gas_price),
+            'nonce': nonce,
+            'to': to_address,
+            'data': data,
         }
-        signed_tx = Account.sign_transaction(tx, self.account.key)
-        self.signed_txs_by_nonce[self.nonce] = signed_tx
-        self.nonce += 1
-        return True
 
-    def prefill_signed_txs(self):
-        for _ in range(self.swap_txs_count):
-            self.swap_v2_prefill()
-
-    def start(self):
+    async def run(self):
         logger.info(f'[{self.account.address}] Starting...')
-        sending_thread = threading.Thread(target=self._sending_thread)
-        sending_thread.start()
-        sending_thread.join()
-
-    @retriable
-    def _sending_thread(self):
-        asyncio.run(self._sending_thread_async())
-
-    async def _sending_thread_async(self):
-        ws_url = self.blockchain.ws_rpc_url()
-        async with websockets.connect(ws_url) as ws:
-            # 1. Send all transactions:
-            for (nonce, signed_tx) in self.signed_txs_by_nonce.items():
-                await self._send_transaction(ws, signed_tx, nonce)
-            # 2. Wait for RPC acknowledgements and resend if necessary:
-            while not TERMINATION_REQUESTED and len(self.signed_txs_by_nonce) > 0:
-                message = await ws.recv()
-                json_response = json.loads(message)
-                request_id = json_response["id"]
-                nonce = self.nonce_by_request_id[request_id]
-                error_message = (json_response["error"].get("message") if "error" in json_response else None) or ""
-                if "result" in json_response or error_message.startswith('known transaction'):
-                    if nonce in self.signed_txs_by_nonce:
-                        tx_hash = self.signed_txs_by_nonce[nonce].hash.hex()
-                        del self.signed_txs_by_nonce[nonce]
-                        logger.info(f"[{self.account.address}] Tx request accepted (swap): {tx_hash} | nonce={nonce} | id={request_id}")
+        for nonce in self.slots.nonces(PENDING):
+            if self.rate_limiter is not None:
+                # Open-loop mode: wait for the shared scheduler to release the next tx
+                await self.rate_limiter.acquire()
+                if TERMINATION_REQUESTED:
+                    break
+            self._send_transaction(nonce)
+        self._check_done()
+        await self.done.wait()
+
+    def resend_pending(self):
+        # Connection was re-established, acknowledgements for in-flight requests are lost:
+        for nonce in self.slots.nonces(PENDING):
+            self._send_transaction(nonce)
+
+    def on_request_sent(self, nonce, request_id, endpoint=None):
+        if self.slots.state(nonce) != PENDING:
+            return
+        if self.metrics is not None and nonce in self.rejected_at_by_nonce:
+            self.metrics.record(Stage.RETRY, time.monotonic() - self.rejected_at_by_nonce.pop(nonce), self.account.address, endpoint)
+        self._emit(Event.SENT, nonce, request_id, endpoint=endpoint)
+
+    def on_response(self, nonce, json_response, endpoint=None):
+        if self.slots.state(nonce) != PENDING:
+            return  # a duplicate (resent after a reconnect) was acknowledged first
+        request_id = json_response["id"]
+        error_message = (json_response["error"].get("message") if "error" in json_response else None) or ""
+        if "result" in json_response or error_message.startswith(KNOWN_TX_ERRORS):
+            self._emit(Event.ACCEPTED, nonce, request_id, endpoint=endpoint, workload=self.mix.workloads[self.workload_index(nonce)].name)
+            self.slots.set_state(nonce, ACCEPTED if self.wait_for_confirmation else DONE)
+        elif "transaction underpriced" in error_message and self.fee_bumps_by_nonce.get(nonce, 0) < MAX_FEE_BUMPS and not TERMINATION_REQUESTED:
+            # Dropping it would leave a nonce gap stalling all later txs of the account:
+            self.replace(nonce, request_id, error=error_message)
+        elif "insufficient funds" in error_message or "transaction underpriced" in error_message:
+            # No need to resend, tx will fail:
+            self._emit(Event.ABORTED, nonce, request_id, error=error_message, endpoint=endpoint)
+            self.slots.set_state(nonce, DONE)
+            self.aborted_nonces.add(nonce)
+        elif "nonce too low" in error_message:
+            # The nonce is taken on-chain already, resending cannot succeed. It may well be by this tx (its ack was lost,
+            # or it is a stuck tx replaced just before its inclusion), so it is logged as accepted and the analysis
+            # resolves it by hash; a tx that lost the nonce to another one is counted as not included:
+            self._emit(Event.ACCEPTED, nonce, request_id, error=error_message, endpoint=endpoint, workload=self.mix.workloads[self.workload_index(nonce)].name)
+            self.slots.set_state(nonce, ACCEPTED if self.wait_for_confirmation else DONE)
+        elif not TERMINATION_REQUESTED:
+            # Error: RPC didn't accept transaction, resedning...
+            self._emit(Event.REJECTED, nonce, request_id, error=error_message, endpoint=endpoint)
+            if self.metrics is not None:
+                self.rejected_at_by_nonce[nonce] = time.monotonic()
+            # Retries jump the queue, so they go out right after the current in-flight window frees up:
+            self._send_transaction(nonce, retry=True)
+        self._check_done()
+
+    def replace(self, nonce, request_id=None, error=None):
+        # Re-signs the tx with a bumped gas price, the new tx supersedes the old one with the same nonce:
+        old_hash = self.slots.tx_hash(nonce)
+        self.fee_bumps_by_nonce[nonce] = self.fee_bumps_by_nonce.get(nonce, 0) + 1
+        self.gas_price_by_nonce[nonce] = int(self.gas_price_by_nonce.get(nonce, self.gas_price) * FEE_BUMP) + 1
+        started_at = time.monotonic()
+        (signed_tx,) = sign_transactions(self.account.key, [self.build_tx(nonce)])
+        if self.metrics is not None:
+            self.metrics.record(Stage.SIGN, time.monotonic() - started_at, self.account.address)
+        self._emit(Event.REPLACED, nonce, request_id, tx_hash=old_hash, error=error)
+        self.slots.replace(nonce, bytes.fromhex(signed_tx.raw_tx[2:]), bytes.fromhex(signed_tx.hash[2:]))
+        self.slots.set_state(nonce, PENDING)
+        self._send_transaction(nonce, retry=True)
+
+    def confirm(self, confirmed_nonce):
+        # On-chain nonce of the account (from NonceTracker), txs below it are included:
+        self.slots.settle(confirmed_nonce)
+        self._check_done()
+
+    def _check_done(self):
+        if self.slots.pending_count == 0 and self.slots.accepted_count == 0:
+            self.done.set()
+
+    def _emit(self, event_type, nonce, request_id, tx_hash=None, error=None, endpoint=None, workload=None):
+        # tx_hash: the current tx of the nonce by default. endpoint: the one that handled the request, which
+        # differs from the trader's own when it was stolen
+        if self.event_sink is not None:
+            self.event_sink.emit(event_type, self.account.address, nonce, request_id, tx_hash or self.slots.tx_hash(nonce),
+                                 endpoint or self.connection.endpoint.name, error, workload)
+
+    def _send_transaction(self, nonce, retry=False):
+        self.connection.submit(self, nonce, retry=retry)
+
+
+class NonceTracker:
+    # Polls the on-chain nonces of accounts with unconfirmed txs. When the nonce of an account does not advance
+    # for stuck_secs, its lowest unconfirmed tx was dropped or is underpriced and blocks all later txs: it is
+    # re-signed with a bumped gas price. A nonce with no tx at all (aborted) is a gap that cannot be fixed.
+    def __init__(self, ws_url, traders, stuck_secs):
+        self.ws_url = ws_url
+        self.traders = traders
+        self.stuck_secs = stuck_secs
+        self.confirmed_nonce = {}  # address -> on-chain nonce
+        self.last_progress_at = {}  # address -> time the nonce last advanced
+        self.replaced_at = {}  # address -> time of the last stuck tx replacement
+        self.stalled_since = {}  # address -> start of the current stall
+        self.stalled_secs = 0.0  # account-secs
+        self.stalled_accounts = set()
+        self.gap_nonces = {}  # address -> nonce
+        self.replaced_count = 0
+        self.started_at = time.time()
+        for trader in traders:
+            trader.wait_for_confirmation = True
+
+    def _on_nonce(self, trader, confirmed_nonce, now):
+        address = trader.account.address
+        if confirmed_nonce > self.confirmed_nonce.get(address, -1):
+            self.confirmed_nonce[address] = confirmed_nonce
+            self.last_progress_at[address] = now
+            if address in self.stalled_since:
+                self.stalled_secs += now - self.stalled_since.pop(address)
+        trader.confirm(confirmed_nonce)
+        if trader.done.is_set() or now - self.last_progress_at[address] < self.stuck_secs:
+            return
+        if address not in self.stalled_since:
+            self.stalled_since[address] = self.last_progress_at[address]
+            self.stalled_accounts.add(address)
+        if trader.slots.state(confirmed_nonce) == ACCEPTED:
+            if now - self.replaced_at.get(address, 0) < self.stuck_secs or trader.fee_bumps_by_nonce.get(confirmed_nonce, 0) >= MAX_FEE_BUMPS:
+                return
+            logger.info(f"[{address}] Nonce {confirmed_nonce} stuck for {now - self.last_progress_at[address]:.1f}s, replacing with a higher gas price")
+            trader.replace(confirmed_nonce)
+            self.replaced_at[address] = now
+            self.replaced_count += 1
+        elif confirmed_nonce in trader.aborted_nonces:
+            logger.info(f"[{address}] Nonce gap at {confirmed_nonce}: {trader.slots.accepted_count} later txs will not be included")
+            self.gap_nonces[address] = confirmed_nonce
+            trader.slots.settle(trader.slots.first_nonce + len(trader.slots))
+            trader.done.set()
+
+    async def run(self):
+        async with RpcClient(self.ws_url) as client:
+            while not TERMINATION_REQUESTED and not all(trader.done.is_set() for trader in self.traders):
+                await asyncio.sleep(NONCE_POLL_SECS)
+                traders = [trader for trader in self.traders if not trader.done.is_set() and trader.slots.accepted_count > 0]
+                for i in range(0, len(traders), NONCE_POLL_BATCH_SIZE):
+                    chunk = traders[i:i + NONCE_POLL_BATCH_SIZE]
+                    nonces = await client.batch([("eth_getTransactionCount", [trader.account.address, 'latest']) for trader in chunk], raise_errors=False)
+                    now = time.time()
+                    for (trader, nonce) in zip(chunk, nonces):
+                        if not isinstance(nonce, RpcError):
+                            self._on_nonce(trader, int(nonce, 16), now)
+
+    def log_summary(self):
+        now = time.time()
+        stalled_secs = self.stalled_secs + sum(now - stalled_since for stalled_since in self.stalled_since.values())
+        total_secs = len(self.traders) * (now - self.started_at)
+        logger.info(
+            f"Stalls: {len(self.stalled_accounts)} accounts stalled for {stalled_secs:.1f} account-secs "
+            f"({100 * stalled_secs / total_secs if total_secs > 0 else 0:.1f}% of {total_secs:.0f} account-secs), "
+            f"{self.replaced_count} stuck txs replaced, {sum(len(trader.fee_bumps_by_nonce) for trader in self.traders)} txs with bumped gas price, "
+            f"{len(self.gap_nonces)} nonce gaps"
+        )
+
+
+class Endpoint:
+    # In-flight window and rate limit shared by all connections of the process to the same RPC url
+    # (and source address), plus its health: moving averages of ack latency and error rate.
+    def __init__(self, url, max_in_flight, max_rps=None, local_addr=None):
+        self.url = url
+        self.name = endpoint_name(url) + (f"@{local_addr}" if local_addr else '')
+        self.max_in_flight = max_in_flight
+        self.local_addr = local_addr
+        self.rate_limiter = TokenBucket(ConstantProfile(max_rps)) if max_rps else None
+        self.in_flight = 0
+        self.connections = []
+        self.ack_latency = None
+        self.error_rate = 0.0
+        self.acks_count = 0
+        self.errors_count = 0
+        self.stolen_count = 0
+
+    def release(self, count=1):
+        self.in_flight -= count
+        for connection in self.connections:
+            connection.wakeup.set()
+
+    def on_ack(self, latency, error):
+        self.acks_count += 1
+        self.errors_count += error
+        self.ack_latency = latency if self.ack_latency is None else (1 - HEALTH_EWMA_ALPHA) * self.ack_latency + HEALTH_EWMA_ALPHA * latency
+        self.error_rate = (1 - HEALTH_EWMA_ALPHA) * self.error_rate + HEALTH_EWMA_ALPHA * error
+
+    def score(self):
+        # Lower is better: expected ack latency, inflated by errors (0 until the first ack)
+        return (self.ack_latency or 0.0) * (1 + ERROR_PENALTY * self.error_rate)
+
+
+class Connection:
+    # Queued txs are (trader, nonce, submitted_at), the raw tx is only encoded when it is written. Request ids
+    # are assigned at that point too, so the in-flight requests fit in a ring bounded by the window.
+    def __init__(self, endpoint, max_in_flight, batch_size=1, pool=None, metrics=None):
+        self.endpoint = endpoint
+        self.ws_url = endpoint.url
+        self.max_in_flight = max_in_flight
+        self.batch_size = batch_size
+        self.pool = pool
+        self.metrics = metrics
+        self.sent_batches = collections.deque()
+        self.ws = None
+        self.traders = []
+        self.requests = RequestRing(max_in_flight)
+        self.outbound = collections.deque()
+        self.in_flight = 0
+        self.wakeup = asyncio.Event()
+        self.connected = asyncio.Event()
+        self.tasks = []
+        endpoint.connections.append(self)
+
+    async def open(self):
+        self.ws = await self._connect()
+        self.connected.set()
+        self.tasks = [asyncio.create_task(self._reader()), asyncio.create_task(self._writer())]
+
+    async def close(self):
+        for task in self.tasks:
+            task.cancel()
+        if self.ws is not None:
+            await self.ws.close()
+
+    def submit(self, trader, nonce, retry=False):
+        request = (trader, nonce, time.monotonic())
+        if retry:
+            self.outbound.appendleft(request)
+        else:
+            self.outbound.append(request)
+        self.wakeup.set()
+
+    def _has_window(self):
+        return self.in_flight < self.max_in_flight and self.endpoint.in_flight < self.endpoint.max_in_flight
+
+    def _release(self, count=1):
+        self.in_flight -= count
+        self.endpoint.release(count)
+
+    async def _writer(self):
+        while not TERMINATION_REQUESTED:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            while self._has_window() and (self.outbound or (self.pool is not None and self.pool.steal_for(self))) and not TERMINATION_REQUESTED:
+                await self.connected.wait()
+                # Pack up to batch_size requests into a single JSON-RPC batch frame:
+                batch = []
+                while self.outbound and self._has_window() and len(batch) < self.batch_size:
+                    if self.endpoint.rate_limiter is not None:
+                        await self.endpoint.rate_limiter.acquire()
+                        if not self.outbound:
+                            break  # stolen meanwhile
+                    (trader, nonce, submitted_at) = self.outbound.popleft()
+                    if trader.slots.state(nonce) != PENDING:
+                        continue  # acknowledged meanwhile (a duplicate queued by a reconnect)
+                    request_id = self.requests.put(trader, nonce)
+                    self.in_flight += 1
+                    self.endpoint.in_flight += 1
+                    json_request = request_to_json("eth_sendRawTransaction", [trader.slots.raw_tx(nonce)], request_id=request_id)
+                    batch.append((trader, nonce, request_id, json_request, submitted_at))
+                if not batch:
+                    continue
+                started_at = time.monotonic()
+                if self.batch_size > 1:
+                    self.sent_batches.append([request_id for (_, _, request_id, _, _) in batch])
+                    frame = json.dumps([json_request for (_, _, _, json_request, _) in batch])
                 else:
-                    # Error: RPC didn't accept transaction, resedning...
-                    logger.info(f"[{self.account.address}] Recv: {message}")
-                    signed_tx = self.signed_txs_by_nonce[nonce]
-                    if "insufficient funds" in error_message or "transaction underpriced" in error_message:
-                        # No need to resend, tx will fail:
-                        logger.info(f"[{self.account.address}] Aborting tx: {signed_tx.hash.hex()} | nonce={nonce}")
-                        del self.signed_txs_by_nonce[nonce]
-                        continue
-                    await self._send_transaction(ws, signed_tx, nonce)
-
-    async def _send_transaction(self, ws, signed_tx, nonce):
-        json_request = request_to_json("eth_sendRawTransaction", [signed_tx.rawTransaction.hex()], request_id=self.request_id)
-        await ws.send(json.dumps(json_request))
-        tx_hash = signed_tx.hash.hex()
-        logger.info(f"[{self.account.address}] Tx request sent (swap): {tx_hash} | nonce={nonce} | id={self.request_id}")
-        self.nonce_by_request_id[self.request_id] = nonce
-        self.request_id += 1
-
-
-def run_in_parallel(objects):
-    def start_and_wait(obj):
-        obj.start()
+                    frame = json.dumps(batch[0][3])
+                serialized_at = time.monotonic()
+                try:
+                    await self.ws.send(frame)
+                except websockets.ConnectionClosed:
+                    # The reader re-establishes the connection and resends all pending txs:
+                    continue
+                sent_at = time.monotonic()
+                if self.metrics is not None:
+                    # Per tx, frame costs are shared by the txs of a batch:
+                    self.metrics.record(Stage.SERIALIZE, (serialized_at - started_at) / len(batch), endpoint=self.endpoint.name, count=len(batch))
+                    self.metrics.record(Stage.SEND, (sent_at - serialized_at) / len(batch), endpoint=self.endpoint.name, count=len(batch))
+                for (trader, nonce, request_id, _, submitted_at) in batch:
+                    self.requests.set_sent_at(request_id, sent_at)
+                    if self.metrics is not None:
+                        self.metrics.record(Stage.QUEUE, started_at - submitted_at, trader.account.address, self.endpoint.name)
+                    trader.on_request_sent(nonce, request_id, self.endpoint.name)
+
+    def _on_message(self, message):
+        json_response = json.loads(message)
+        if isinstance(json_response, list):
+            for item in json_response:
+                self._on_response(item)
+            # Forget batches that are fully acknowledged:
+            while self.sent_batches and not any(request_id in self.requests for request_id in self.sent_batches[0]):
+                self.sent_batches.popleft()
+        elif json_response.get("id") is None and "error" in json_response:
+            # An error that cannot be matched to its request (rate limit, parse error, batches not supported): it fails
+            # the oldest unanswered batch or, with single requests, the oldest unanswered request, which is resent.
+            # Dropping it would leak the in-flight slot and never resend the tx:
+            logger.info(f"[{self.endpoint.name}] Error without request id: {message}")
+            request_ids = []
+            while self.sent_batches and not request_ids:
+                request_ids = [request_id for request_id in self.sent_batches.popleft() if request_id in self.requests]
+            if not request_ids:
+                oldest_request_id = self.requests.oldest()
+                request_ids = [oldest_request_id] if oldest_request_id is not None else []
+            for request_id in request_ids:
+                self._on_response({"id": request_id, "error": json_response["error"] or {}})
+        else:
+            self._on_response(json_response)
+
+    def _on_response(self, json_response):
+        request = self.requests.pop(json_response.get("id"))
+        if request is not None:
+            (trader, nonce, sent_at) = request
+            self._release()
+            if sent_at > 0:
+                latency = time.monotonic() - sent_at
+                error_message = (json_response["error"].get("message") or "") if "error" in json_response else None
+                self.endpoint.on_ack(latency, error_message is not None and not any(error in error_message for error in TX_ERRORS))
+                if self.metrics is not None:
+                    self.metrics.record(Stage.ACK, latency, trader.account.address, self.endpoint.name)
+            trader.on_response(nonce, json_response, self.endpoint.name)
+
+    async def _reader(self):
+        while not TERMINATION_REQUESTED:
+            try:
+                async for message in self.ws:
+                    self._on_message(message)
+            except websockets.ConnectionClosed as e:
+                logger.info(f"[{self.endpoint.name}] Connection closed: {e}. Reconnecting...")
+            if TERMINATION_REQUESTED:
+                break
+            # Reconnect and resend everything that is not acknowledged yet (incl. requests stolen from other connections):
+            self.connected.clear()
+            affected_traders = set(self.traders) | self.requests.traders_in_flight() | {request[0] for request in self.outbound}
+            self.requests.clear()
+            self.sent_batches.clear()
+            self.outbound.clear()
+            self._release(self.in_flight)
+            try:
+                self.ws = await self._connect()
+            except Exception as e:
+                logger.info(f"[{self.endpoint.name}] Unable to reconnect: {e}")
+                for trader in self.traders:
+                    trader.done.set()
+                return
+            self.connected.set()
+            for trader in affected_traders:
+                trader.resend_pending()
+
+    async def _connect(self):
+        retry_secs = 0.1
+        max_retries = 8
+        retry_count = 0
+        while True:
+            try:
+                local_addr = (self.endpoint.local_addr, 0) if self.endpoint.local_addr else None
+                return await websockets.connect(self.ws_url, max_size=None, local_addr=local_addr)
+            except Exception as e:
+                retry_count += 1
+                if retry_count > max_retries or TERMINATION_REQUESTED:
+                    raise
+                logger.info(f"[{self.endpoint.name}] Failed to connect: {e}. Retry #{retry_count}")
+                await asyncio.sleep(retry_secs)
+                retry_secs *= 2
+
+
+class ConnectionPool:
+    # Connections to every endpoint (and source address). Traders are spread evenly across them, and
+    # connections with spare window take queued requests over from more backlogged connections of
+    # endpoints that are not healthier, so load shifts away from slow or failing endpoints.
+    def __init__(self, rpc_endpoints, config, traders_count, metrics=None):
+        self.endpoints = []
+        for rpc_endpoint in rpc_endpoints:
+            for local_addr in ([rpc_endpoint.local_addr] if rpc_endpoint.local_addr else config.source_addresses or [None]):
+                max_in_flight = rpc_endpoint.max_in_flight or config.max_in_flight_per_endpoint
+                self.endpoints.append(Endpoint(rpc_endpoint.ws_url, max_in_flight, rpc_endpoint.max_rps, local_addr))
+        connections_count = max(len(self.endpoints), min(config.connections_count, traders_count))
+        # Interleaved, so that assigning traders round-robin spreads them across endpoints:
+        self.connections = [
+            Connection(self.endpoints[i % len(self.endpoints)], config.max_in_flight, config.batch_size, pool=self, metrics=metrics)
+            for i in range(connections_count)
+        ]
+        self.nudge_task = None
+
+    async def open(self):
+        await asyncio.gather(*[connection.open() for connection in self.connections])
+        self.nudge_task = asyncio.create_task(self._nudge_idle())
+
+    async def close(self):
+        if self.nudge_task is not None:
+            self.nudge_task.cancel()
+        await asyncio.gather(*[connection.close() for connection in self.connections], return_exceptions=True)
+
+    def assign(self, traders):
+        for (i, trader) in enumerate(traders):
+            connection = self.connections[i % len(self.connections)]
+            trader.connection = connection
+            connection.traders.append(trader)
+
+    def steal_for(self, thief):
+        # Moves up to half of the backlog of the best victim (the largest queue) to the thief:
+        victims = [
+            connection for connection in self.connections
+            if connection is not thief and len(connection.outbound) > STEAL_MIN_BACKLOG + len(thief.outbound)
+            and connection.endpoint.score() >= thief.endpoint.score()
+        ]
+        if not victims:
+            return False
+        victim = max(victims, key=lambda connection: len(connection.outbound))
+        count = min(len(victim.outbound) // 2, thief.max_in_flight - thief.in_flight)
+        for _ in range(count):
+            thief.outbound.append(victim.outbound.pop())  # newest first, retries stay at the victim's head
+        thief.endpoint.stolen_count += count
+        return count > 0
+
+    async def _nudge_idle(self):
+        # Idle connections are not woken up by acks of other endpoints:
+        while True:
+            await asyncio.sleep(STEAL_INTERVAL_SECS)
+            for connection in self.connections:
+                if not connection.outbound:
+                    connection.wakeup.set()
+
+    def log_summary(self):
+        for endpoint in self.endpoints:
+            logger.info(
+                f"Endpoint {endpoint.name}: acks={endpoint.acks_count} errors={endpoint.errors_count} "
+                f"ack_latency={1000 * (endpoint.ack_latency or 0):.1f}ms error_rate={endpoint.error_rate:.3f} taken_over={endpoint.stolen_count}"
+            )
+
+
+async def run_traders_async(traders, rpc_endpoints, config, event_sink=None, metrics=None):
+    # All traders are driven by a single event loop, sharing a small number of websocket connections:
+    loop = asyncio.get_running_loop()
+    def request_termination():
+        signal_handler(signal.SIGINT, None)
+        for trader in traders:
+            trader.done.set()
+    loop.add_signal_handler(signal.SIGINT, request_termination)
+    pool = ConnectionPool(rpc_endpoints, config, len(traders), metrics)
+    await pool.open()
+    pool.assign(traders)
+    for trader in traders:
+        trader.event_sink = event_sink
+        trader.metrics = metrics
+    rate_limiter = None
+    if config.load_profile is not None:
+        logger.info(f"Load profile: {config.load_profile}")
+        rate_limiter = TokenBucket(config.load_profile)
+        rate_limiter.start()
+        for trader in traders:
+            trader.rate_limiter = rate_limiter
+    nonce_tracker = NonceTracker(rpc_endpoints[0].ws_url, traders, config.stuck_tx_secs) if config.stuck_tx_secs is not None else None
+    nonce_tracker_task = asyncio.create_task(nonce_tracker.run()) if nonce_tracker is not None else None
+    try:
+        await asyncio.gather(*[trader.run() for trader in traders])
+    finally:
+        if rate_limiter is not None:
+            rate_limiter.log_summary()
+        if nonce_tracker is not None:
+            nonce_tracker_task.cancel()
+            nonce_tracker.log_summary()
+        if len(pool.endpoints) > 1:
+            pool.log_summary()
+        await pool.close()
+        loop.remove_signal_handler(signal.SIGINT)
+
+
+async def fetch_start_state_async(ws_url, addresses):
+    async with RpcClient(ws_url) as client:
+        chunks = [addresses[i:i + NONCE_POLL_BATCH_SIZE] for i in range(0, len(addresses), NONCE_POLL_BATCH_SIZE)]
+        (gas_price, *nonce_chunks) = await asyncio.gather(
+            client.request("eth_gasPrice"),
+            *[client.batch([("eth_getTransactionCount", [address, 'latest']) for address in chunk]) for chunk in chunks],
+        )
+    nonces = [int(nonce, 16) for nonce_chunk in nonce_chunks for nonce in nonce_chunk]
+    return (int(gas_price, 16), dict(zip(addresses, nonces)))
+
+
+def fetch_start_state(ws_url, addresses):
+    # Gas price and the nonces of all accounts in one round trip: concurrent batches over a single connection
+    started_at = time.time()
+    (gas_price, nonce_by_address) = asyncio.run(fetch_start_state_async(ws_url, list(addresses)))
+    logger.info(f"Fetched gas price ({gas_price}) and {len(nonce_by_address)} nonces in {time.time() - started_at:.2f}s")
+    return (gas_price, nonce_by_address)
+
+
+def prefill_signed_txs(traders, signing_processes, cache=None, metrics=None):
+    # One signing job per (trader, workload), the txs of a workload only differ by nonce:
+    started_at = time.time()
+    jobs = []
+    job_templates = []  # (trader, template tx, nonces to sign) of every job, the jobs of a trader are adjacent
+    signed_txs_by_trader = {}  # trader -> {nonce: SignedTx}, until the trader's slots are built
+    cached_count = 0
+    for trader in traders:
+        nonces = range(trader.nonce, trader.nonce + trader.swap_txs_count)
+        signed_txs_by_trader[trader] = dict.fromkeys(nonces)  # in nonce order
+        nonces_by_workload = {}
+        for nonce in nonces:
+            nonces_by_workload.setdefault(trader.workload_index(nonce), []).append(nonce)
+        for (workload_index, workload_nonces) in nonces_by_workload.items():
+            template = trader.build_tx(None, workload_index)
+            cached = cache.load(trader.chain_id, trader.account.address, template) if cache else {}
+            missing_nonces = [nonce for nonce in workload_nonces if nonce not in cached]
+            signed_txs_by_trader[trader].update((nonce, cached[nonce]) for nonce in workload_nonces if nonce in cached)
+            jobs.append((trader.account.key, template, missing_nonces))
+            job_templates.append((trader, template, missing_nonces))
+            cached_count += len(workload_nonces) - len(missing_nonces)
+    (signed_txs, sign_secs) = sign_nonces_in_parallel(jobs, signing_processes)
+    for (job_index, (trader, template, nonces)) in enumerate(job_templates):
+        (job_signed_txs, signed_txs[job_index]) = (signed_txs[job_index], None)  # compacted as we go
+        if metrics is not None and len(nonces) > 0:
+            metrics.record(Stage.SIGN, sign_secs[job_index] / len(nonces), trader.account.address, count=len(nonces))
+        signed_txs_by_trader[trader].update(zip(nonces, job_signed_txs))
+        if cache and len(nonces) > 0:
+            cache.store(trader.chain_id, trader.account.address, template, dict(zip(nonces, job_signed_txs)))
+        if job_index + 1 == len(job_templates) or job_templates[job_index + 1][0] is not trader:
+            trader.slots = TxSlots.from_signed_txs(trader.nonce, signed_txs_by_trader.pop(trader).values())
+    for trader in traders:
+        trader.nonce += trader.swap_txs_count
+    signed_count = sum(len(nonces) for (_, _, nonces) in job_templates)
+    logger.info(f"Pre-signed {signed_count} txs ({cached_count} loaded from cache) in {time.time() - started_at:.2f}s")
+
+
+def run_traders(traders, rpc_endpoints, config, event_sink=None, metrics=None):
     global EXECUTION_STARTED
     EXECUTION_STARTED = True
     start_time = time.time()
     logger.info(f"Start time: {start_time}")
-    if len(objects) > 1:
-        with ThreadPoolExecutor() as executor:
-            futures = [executor.submit(start_and_wait, obj) for obj in objects]
-        for future in as_completed(futures):
-            future.result()
-    elif len(objects) == 1:
-        start_and_wait(objects[0])
+    if event_sink is not None:
+        event_sink.emit(Event.RUN_START)
+    if len(traders) > 0:
+        asyncio.run(run_traders_async(traders, rpc_endpoints, config, event_sink, metrics))
+    if event_sink is not None:
+        event_sink.emit(Event.RUN_END)
+        event_sink.close()
+    if metrics is not None:
+        metrics.close()
     end_time = time.time()
     logger.info(f"End time: {end_time}")
 
 
-def wait_until_target_time():
+def get_scheduled_time():
+    # Next 5-minute mark, so that instances on different servers start simultaneously:
     now = datetime.now()
     logger.info(f"Time now: {now.strftime('%Y-%m-%d %H:%M:%S')}")
     target = now.replace(minute=now.minute - (now.minute % 5), second=0, microsecond=0) + timedelta(minutes=5)
     wait_secs = (target - datetime.now()).total_seconds()
     if wait_secs < 60:
         logger.info("Launch is too soon. Aborting...")
-        sys.exit(0)
+        return None
     logger.info(f"Scheduled at: {target.strftime('%Y-%m-%d %H:%M:%S')}")
-    time.sleep(wait_secs)
+    return target.timestamp()
+
+
+def shard_accounts(accounts, shards_count, shard_index):
+    (quotient, remainder) = divmod(len(accounts), shards_count)
+    start = shard_index * quotient + min(shard_index, remainder)
+    end = start + quotient + (1 if shard_index < remainder else 0)
+    return accounts[start:end]
+
+
+def set_start_time(start_time, scheduled_start):
+    # Called by the last worker arriving at the barrier, i.e. once every worker has pre-signed its txs:
+    if scheduled_start:
+        scheduled_time = get_scheduled_time()
+        start_time.value = scheduled_time if scheduled_time is not None else -1.0
+    else:
+        start_time.value = time.time()
+
+
+def wait_for_start(ready, start_set):
+    # Barrier action with an external start time (start_time_fn of run_sharded), set by the parent:
+    ready.set()
+    start_set.wait()
+
+
+def run_worker(chain_id, accounts, swap_txs_count, config, rpc_endpoints, workloads, gas_price, nonce_by_address, signing_processes, cache_dir, events_path,
+               metrics_path, start_barrier, start_time):
+    signal.signal(signal.SIGINT, signal_handler)
+    # Stage timings are opt-in (--metrics-port), they cost a few us per tx:
+    metrics = Metrics(metrics_path) if metrics_path is not None else None
+    if metrics is not None:
+        metrics.start()
+    mix = WorkloadMix(workloads)
+    traders = [Trader(chain_id, account, nonce_by_address[account.address], gas_price, swap_txs_count=swap_txs_count, mix=mix) for account in accounts]
+    prefill_signed_txs(traders, signing_processes, SignedTxCache(cache_dir) if cache_dir else None, metrics)
+    try:
+        start_barrier.wait()
+    except threading.BrokenBarrierError:
+        logger.info("Another worker failed before start. Aborting...")
+        sys.exit(1)
+    if start_time.value < 0:
+        sys.exit(0)
+    time.sleep(max(0.0, start_time.value - time.time()))
+    run_traders(traders, rpc_endpoints, config, EventSink(events_path), metrics)
+
+
+def run_sharded(chain_id, accounts, swap_txs_count, config, processes_count, cache_dir=None, events_dir='logs', instance_index=0, scheduled_start=False,
+                track_inclusion=False, inclusion_timeout=INCLUSION_TIMEOUT_SECS, rpc_endpoints=None, metrics_port=None, workloads=None,
+                start_time_fn=None):
+    # Each worker process gets its own shard of accounts and event loop, all of them start together.
+    # start_time_fn (optional): called once every worker has pre-signed its txs, returns the wall clock start time (None aborts).
+    processes_count = max(1, min(processes_count, len(accounts)))
+    context = multiprocessing.get_context('fork')
+    start_time = context.Value('d', 0.0)
+    (ready, start_set) = (context.Event(), context.Event())
+    if start_time_fn is None:
+        start_barrier = context.Barrier(processes_count, action=functools.partial(set_start_time, start_time, scheduled_start))
+    else:
+        start_barrier = context.Barrier(processes_count, action=functools.partial(wait_for_start, ready, start_set))
+    worker_config = config.for_shard(processes_count)
+    # Rate and in-flight limits of every endpoint are split across the workers as well:
+    rpc_endpoints = rpc_endpoints or BlockchainData(chain_id).ws_endpoints()
+    worker_endpoints = [endpoint.scaled(1.0 / processes_count) for endpoint in rpc_endpoints]
+    workloads = workloads or BlockchainData(chain_id).workloads()
+    logger.info(f"Workload mix: {WorkloadMix(workloads).describe()}")
+    # Fetched once by the parent and inherited by the workers:
+    (gas_price, nonce_by_address) = fetch_start_state(rpc_endpoints[0].ws_url, [account.address for account in accounts])
+    # Cores left over by the workers are used for pre-signing:
+    signing_processes = max(1, (os.cpu_count() or 1) // processes_count)
+    workers = []
+    events_paths = []
+    metrics_paths = []
+    for shard_index in range(processes_count):
+        shard = shard_accounts(accounts, processes_count, shard_index)
+        events_path = os.path.join(events_dir, f"events-{instance_index:02}-{shard_index:02}.jsonl")
+        metrics_path = os.path.join(events_dir, f"metrics-{instance_index:02}-{shard_index:02}.json")
+        for path in (events_path, metrics_path):
+            if os.path.exists(path):
+                os.remove(path)  # a previous run's logs must not be tailed by the tracker or served as metrics
+        events_paths.append(events_path)
+        metrics_paths.append(metrics_path)
+        if metrics_port is None:
+            metrics_path = None
+        worker = context.Process(
+            target=run_worker,
+            args=(chain_id, shard, swap_txs_count, worker_config, worker_endpoints, workloads, gas_price, nonce_by_address, signing_processes, cache_dir,
+                  events_path, metrics_path, start_barrier, start_time),
+        )
+        worker.start()
+        workers.append(worker)
+    # Termination is handled by the workers themselves (SIGINT is delivered to the whole process group):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Inclusion is tracked on the node under test:
+    tracker = InclusionTracker(rpc_endpoints[0].ws_url, events_paths, timeout=inclusion_timeout) if track_inclusion else None
+    if tracker is not None:
+        tracker.start()
+    metrics_server = MetricsServer(os.path.join(events_dir, f"metrics-{instance_index:02}-*.json"), metrics_port) if metrics_port is not None else None
+    if metrics_server is not None:
+        metrics_server.start()
+    while any(worker.is_alive() for worker in workers):
+        if any(worker.exitcode not in (None, 0) for worker in workers) and not start_barrier.broken:
+            start_barrier.abort()
+        if ready.is_set() and not start_set.is_set():
+            start_at = start_time_fn()
+            start_time.value = start_at if start_at is not None else -1.0
+            start_set.set()
+        time.sleep(0.1)
+    for worker in workers:
+        worker.join()
+    if tracker is not None:
+        tracker.join()
+    if metrics_server is not None:
+        metrics_server.stop()
+        load_metrics(metrics_paths).log_summary()
 
 
 if __name__ == "__main__":
     signal.signal(signal.SIGINT, signal_handler)
-    # Parse -n argument:
+    # Parse arguments:
     parser = argparse.ArgumentParser()
-    parser.add_argument('-n', type=int, required=True, help='index of trader')
+    parser.add_argument('--chain', choices=[chain.name for chain in ChainId], default=ChainId.ZKSYNC_ERA_MAINNET.name)
+    parser.add_argument('-n', type=int, default=0, help='index of instance (when running on several servers)')
+    parser.add_argument('--accounts', type=int, default=10, help='number of accounts per instance')
+    parser.add_argument('--swaps', type=int, default=20, help='number of swaps per account')
+    parser.add_argument('--connections', type=int, default=10, help='number of websocket connections per instance')
+    parser.add_argument('--max-in-flight', type=int, default=100, help='max unacknowledged requests per connection')
+    parser.add_argument('--max-in-flight-per-endpoint', type=int, default=1000, help='max unacknowledged requests per RPC endpoint')
+    parser.add_argument('--batch-size', type=int, default=1, help='txs per JSON-RPC batch request (1 disables batching)')
+    parser.add_argument('--load-profile', type=parse_profile, default=None, help='open-loop target TPS: constant:<tps>, ramp:<start>:<end>:<secs> or step:<start>:<step>:<secs>[:<max>]')
+    parser.add_argument('--replace-stuck-after', type=float, default=None, help='secs without on-chain nonce progress before a tx is replaced with a higher gas price (polls nonces; waits for confirmation of all txs)')
+    parser.add_argument('--endpoint', action='append', type=parse_endpoint, help='RPC endpoint to send txs to, all of them are used at once (repeatable): <ws_url>[,max_rps=<n>][,max_in_flight=<n>][,local_addr=<ip>]')
+    parser.add_argument('--workload', action='append', type=parse_workload, help='tx kind of the mix sent by every account, default: the chain\'s WETH -> CAKE swap (repeatable): '
+                        '<swap|transfer>[,name=<name>][,weight=<w>][,router=<contract|0x..>][,path=<token|0x..>-<token|0x..>[-...]][,amount=<wei>][,to=<0x..>][,gas=<n>]')
+    parser.add_argument('--source-address', action='append', help='local IP to open connections from, connections are spread across all of them (repeatable)')
+    parser.add_argument('--processes', type=int, default=os.cpu_count(), help='number of worker processes per instance')
+    parser.add_argument('--signed-txs-cache', default='cache/signed_txs', help='directory of pre-signed txs cache ("" to disable)')
+    parser.add_argument('--events-dir', default='logs', help='directory of per-worker tx event logs (events-<n>-<shard>.jsonl)')
+    parser.add_argument('--scheduled-start', action='store_true', help='start at the next 5-minute mark (to sync several servers)')
+    parser.add_argument('--track-inclusion', action='store_true', help='log per-block TPS and inclusion latency live (newHeads subscription)')
+    parser.add_argument('--metrics-port', type=int, default=None, help='record per-stage latency histograms and serve them live on this local port (/metrics, /metrics.json)')
+    parser.add_argument('--inclusion-timeout', type=float, default=INCLUSION_TIMEOUT_SECS, help='secs to wait for the inclusion of the last txs')
     args = parser.parse_args()
-    trader_index = args.n
+    chain_id = ChainId[args.chain]
     # Initialize accounts:
     mnemonic = open("mnemonic.txt", "r").read()
-    start_index = 10 * trader_index
-    accounts = generate_ethereum_accounts(mnemonic, count=100)[start_index:start_index+10]
-    objects = [Trader(ChainId.ZKSYNC_ERA_MAINNET, account, swap_txs_count=20) for account in accounts]
-    # Execute in parallel:
-    wait_until_target_time()
-    run_in_parallel(objects)
+    start_index = args.accounts * args.n
+    accounts = AccountProvider(mnemonic).get_accounts(start_index, args.accounts)
+    config = SenderConfig(
+        connections_count=args.connections,
+        max_in_flight=args.max_in_flight,
+        max_in_flight_per_endpoint=args.max_in_flight_per_endpoint,
+        batch_size=args.batch_size,
+        load_profile=args.load_profile,
+        stuck_tx_secs=args.replace_stuck_after,
+        source_addresses=args.source_address,
+    )
+    # Pre-sign and execute in worker processes:
+    run_sharded(chain_id, accounts, args.swaps, config, args.processes, cache_dir=args.signed_txs_cache,
+                events_dir=args.events_dir, instance_index=args.n, scheduled_start=args.scheduled_start,
+                track_inclusion=args.track_inclusion, inclusion_timeout=args.inclusion_timeout, rpc_endpoints=args.endpoint,
+                metrics_port=args.metrics_port, workloads=args.workload)
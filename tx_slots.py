@@ -0,0 +1,141 @@
+import array
+
+
+DONE = 0  # acknowledged (and confirmed, with NonceTracker), aborted, or no tx at all
+PENDING = 1  # signed, not acknowledged by the RPC yet
+ACCEPTED = 2  # acknowledged, not confirmed on-chain yet (with NonceTracker only)
+
+
+class TxSlots:
+    # Signed txs of one account, one slot per nonce from first_nonce: raw txs back to back in a single buffer,
+    # 32-byte hashes computed once at signing time and one state byte per tx, i.e. ~the raw tx size plus
+    # 41 bytes per tx instead of dict entries and hex strings. Replacements (rare) are kept aside.
+    __slots__ = ('first_nonce', 'raw', 'ends', 'hashes', 'states', 'replacements', 'pending_count', 'accepted_count', 'settled_nonce')
+
+    def __init__(self, first_nonce=0):
+        self.first_nonce = first_nonce
+        self.raw = bytearray()
+        self.ends = array.array('Q')  # raw tx of slot i: raw[ends[i - 1]:ends[i]]
+        self.hashes = bytearray()
+        self.states = bytearray()
+        self.replacements = {}  # nonce -> (raw tx, tx hash)
+        self.pending_count = 0
+        self.accepted_count = 0
+        self.settled_nonce = first_nonce  # accepted txs below are done
+
+    @classmethod
+    def from_signed_txs(cls, first_nonce, signed_txs):
+        # SignedTx of consecutive nonces from first_nonce, all pending:
+        slots = cls(first_nonce)
+        for signed_tx in signed_txs:
+            slots.append(bytes.fromhex(signed_tx.raw_tx[2:]), bytes.fromhex(signed_tx.hash[2:]))
+        return slots
+
+    def __len__(self):
+        return len(self.states)
+
+    def append(self, raw_tx, tx_hash):
+        self.raw += raw_tx
+        self.ends.append(len(self.raw))
+        self.hashes += tx_hash
+        self.states.append(PENDING)
+        self.pending_count += 1
+
+    def state(self, nonce):
+        slot = nonce - self.first_nonce
+        return self.states[slot] if 0 <= slot < len(self.states) else DONE
+
+    def set_state(self, nonce, state):
+        slot = nonce - self.first_nonce
+        old_state = self.states[slot]
+        self.pending_count += (state == PENDING) - (old_state == PENDING)
+        self.accepted_count += (state == ACCEPTED) - (old_state == ACCEPTED)
+        self.states[slot] = state
+
+    def nonces(self, state):
+        # Current nonces in `state`, a slot is checked only when it is reached (callers may change states meanwhile):
+        for slot in range(len(self.states)):
+            if self.states[slot] == state:
+                yield self.first_nonce + slot
+
+    def raw_tx(self, nonce):
+        if self.replacements and nonce in self.replacements:
+            return '0x' + self.replacements[nonce][0].hex()
+        slot = nonce - self.first_nonce
+        return '0x' + self.raw[self.ends[slot - 1] if slot > 0 else 0:self.ends[slot]].hex()
+
+    def tx_hash(self, nonce):
+        if self.replacements and nonce in self.replacements:
+            return '0x' + self.replacements[nonce][1].hex()
+        slot = nonce - self.first_nonce
+        return '0x' + self.hashes[32 * slot:32 * (slot + 1)].hex()
+
+    def replace(self, nonce, raw_tx, tx_hash):
+        self.replacements[nonce] = (raw_tx, tx_hash)
+
+    def settle(self, below_nonce):
+        # Accepted txs below the on-chain nonce are done:
+        end_slot = min(below_nonce - self.first_nonce, len(self.states))
+        for slot in range(self.settled_nonce - self.first_nonce, end_slot):
+            if self.states[slot] == ACCEPTED:
+                self.set_state(self.first_nonce + slot, DONE)
+        self.settled_nonce = max(self.settled_nonce, self.first_nonce + end_slot)
+
+
+class RequestRing:
+    # In-flight requests of a connection, slot = request id & mask. Ids are consecutive per connection and the
+    # ring holds at least twice the window of the connection, so a slot is free by the time its id comes round
+    # again; ids of slots still taken (by a request whose response was lost) are skipped.
+    def __init__(self, capacity):
+        size = 1 << max(4, (2 * capacity - 1).bit_length())
+        self.mask = size - 1
+        self.request_ids = array.array('q', bytes(8 * size))  # 0: free
+        self.nonces = array.array('q', bytes(8 * size))
+        self.sent_at = array.array('d', bytes(8 * size))  # 0.0: not written to the websocket yet
+        self.traders = [None] * size
+        self.next_id = 1
+        self.count = 0
+
+    def __contains__(self, request_id):
+        return isinstance(request_id, int) and request_id > 0 and self.request_ids[request_id & self.mask] == request_id
+
+    def put(self, trader, nonce):
+        request_id = self.next_id
+        while self.request_ids[request_id & self.mask]:
+            request_id += 1
+        slot = request_id & self.mask
+        self.request_ids[slot] = request_id
+        self.nonces[slot] = nonce
+        self.sent_at[slot] = 0.0
+        self.traders[slot] = trader
+        self.next_id = request_id + 1
+        self.count += 1
+        return request_id
+
+    def set_sent_at(self, request_id, sent_at):
+        self.sent_at[request_id & self.mask] = sent_at
+
+    def pop(self, request_id):
+        # (trader, nonce, sent_at) or None for unknown ids:
+        if request_id not in self:
+            return None
+        slot = request_id & self.mask
+        entry = (self.traders[slot], self.nonces[slot], self.sent_at[slot])
+        self.request_ids[slot] = 0
+        self.traders[slot] = None
+        self.count -= 1
+        return entry
+
+    def oldest(self):
+        # Id of the first request written to the websocket among the unanswered ones, None if there is none:
+        request_ids = [self.request_ids[slot] for slot in range(len(self.traders)) if self.request_ids[slot] and self.sent_at[slot] > 0]
+        return min(request_ids) if request_ids else None
+
+    def traders_in_flight(self):
+        return {trader for trader in self.traders if trader is not None}
+
+    def clear(self):
+        for slot in range(len(self.traders)):
+            self.request_ids[slot] = 0
+            self.traders[slot] = None
+        self.count = 0
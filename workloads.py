@@ -0,0 +1,54 @@
+from blockchain import BlockchainData, Workload
+
+
+MIX_PERIOD = 100  # the mix of an account repeats every MIX_PERIOD nonces, i.e. weights have a 1% resolution
+SWAP_SELECTOR = '472b43f3'  # swapExactTokensForTokens(uint256,uint256,address[],address) of the V2 smart routers
+
+
+def swap_calldata(amount_in, path, recipient):
+    # amountOutMin is 0, path is a dynamic array (offset 0x80 after the 4 head words):
+    words = [f"{amount_in:064x}", f"{0:064x}", f"{0x80:064x}", recipient.lower()[2:].rjust(64, '0'), f"{len(path):064x}"]
+    words += [address.lower()[2:].rjust(64, '0') for address in path]
+    return '0x' + SWAP_SELECTOR + ''.join(words)
+
+
+def workload_tx_fields(blockchain: BlockchainData, workload: Workload, sender):
+    # (to, value, data, gas) of every tx of the workload sent by `sender`:
+    if workload.kind == Workload.TRANSFER:
+        return (workload.to or sender, workload.amount, '0x', workload.gas)
+    path = [blockchain.resolve_address(token) for token in workload.path]
+    return (blockchain.resolve_address(workload.router), 0, swap_calldata(workload.amount, path, sender), workload.gas)
+
+
+class WorkloadMix:
+    # Weighted interleaving of the workloads. The workload of a tx is a function of its account and nonce only,
+    # so replacements and the signed txs cache agree with the pre-signed txs without any per-tx state.
+    def __init__(self, workloads, period=MIX_PERIOD):
+        self.workloads = workloads
+        period = period if len(workloads) > 1 else 1
+        # Txs per period by the largest remainder method:
+        total_weight = sum(workload.weight for workload in workloads)
+        shares = [workload.weight * period / total_weight for workload in workloads]
+        counts = [int(share) for share in shares]
+        for i in sorted(range(len(workloads)), key=lambda i: counts[i] - shares[i])[:period - sum(counts)]:
+            counts[i] += 1
+        # Smooth weighted round-robin spreads the txs of every workload evenly over the period:
+        self.pattern = []
+        credits = [0] * len(workloads)
+        for _ in range(period):
+            for i in range(len(workloads)):
+                credits[i] += counts[i]
+            best = max(range(len(workloads)), key=credits.__getitem__)
+            credits[best] -= period
+            self.pattern.append(best)
+
+    def index(self, offset, nonce):
+        # offset: per account (see account_offset), so that accounts do not all send the same workload at once
+        return self.pattern[(offset + nonce) % len(self.pattern)]
+
+    @staticmethod
+    def account_offset(address):
+        return int(address[-8:], 16)
+
+    def describe(self):
+        return ', '.join(f"{workload.name} ({100 * self.pattern.count(i) / len(self.pattern):g}%)" for (i, workload) in enumerate(self.workloads))